@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""
+Measures the throughput and latency of the verification path against a
+SiteverifyServer on localhost, so that it runs offline and reproducibly.
+
+    python benchmarks/verification.py
+    python benchmarks/verification.py --concurrency 1,16 --latency exponential:0.04
+    python benchmarks/verification.py --scenario field --json
+
+Every scenario is run once per concurrency level and reports requests per
+second, p50/p95/p99 latency in milliseconds and the peak memory allocated
+while verifying 100 tokens one after another.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+
+def new_token():
+    return "03A" + uuid.uuid4().hex * 8
+
+
+def submit_once():
+    from django_recaptcha import client
+
+    client.submit(new_token(), settings.RECAPTCHA_PRIVATE_KEY, "127.0.0.1")
+
+
+def clean_once():
+    from django import forms
+
+    from django_recaptcha.fields import ReCaptchaField
+
+    class BenchmarkForm(forms.Form):
+        captcha = ReCaptchaField()
+
+    form = BenchmarkForm({"g-recaptcha-response": new_token()})
+    if not form.is_valid():
+        raise AssertionError(form.errors)
+
+
+async def asubmit_once():
+    from django_recaptcha import client
+
+    await client.asubmit(new_token(), settings.RECAPTCHA_PRIVATE_KEY, "127.0.0.1")
+
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def run_threads(func, concurrency, requests):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(lambda _: timed(func), range(requests)))
+
+
+def run_async(func, concurrency, requests):
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed_call():
+            async with semaphore:
+                started = time.perf_counter()
+                await func()
+                return time.perf_counter() - started
+
+        return await asyncio.gather(*(timed_call() for _ in range(requests)))
+
+    return asyncio.run(main())
+
+
+SCENARIOS = {
+    "submit": (run_threads, submit_once),
+    "field": (run_threads, clean_once),
+    "asubmit": (run_async, asubmit_once),
+}
+
+
+def measure_allocations(runner, func):
+    # Warm up first, so that connections and imports are not counted.
+    runner(func, 1, 10)
+    tracemalloc.start()
+    try:
+        runner(func, 1, 100)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def percentile(durations, percent):
+    return durations[min(len(durations) - 1, len(durations) * percent // 100)]
+
+
+def run_scenario(name, concurrency, requests):
+    runner, func = SCENARIOS[name]
+    # Warm up the connection pool at the concurrency level measured.
+    runner(func, concurrency, concurrency)
+    started = time.perf_counter()
+    durations = sorted(runner(func, concurrency, requests))
+    elapsed = time.perf_counter() - started
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "rps": requests / elapsed,
+        "mean_ms": statistics.mean(durations) * 1000,
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p95_ms": percentile(durations, 95) * 1000,
+        "p99_ms": percentile(durations, 99) * 1000,
+        "peak_kib": measure_allocations(runner, func) / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run, may be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        default="1,8,32",
+        help="comma separated concurrency levels (default: 1,8,32)",
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=500,
+        help="requests per scenario and concurrency level (default: 500)",
+    )
+    parser.add_argument(
+        "--latency",
+        default="0.002",
+        help="latency of the siteverify server, see parse_latency() (default: 0.002)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args(argv)
+
+    settings.configure(
+        INSTALLED_APPS=["django_recaptcha"],
+        RECAPTCHA_PRIVATE_KEY="benchmark-private-key",
+        RECAPTCHA_PUBLIC_KEY="benchmark-public-key",
+        RECAPTCHA_CONNECTION_POOL_SIZE=max(
+            int(level) for level in args.concurrency.split(",")
+        ),
+    )
+    django.setup()
+
+    from django_recaptcha.siteverify import SiteverifyServer
+
+    server = SiteverifyServer(latency=args.latency, seed=args.seed).start()
+    settings.RECAPTCHA_TRANSPORT_OPTIONS = {"base_url": server.url}
+
+    if not args.json:
+        print(
+            "%-8s %5s %9s %9s %9s %9s %9s %9s"
+            % (
+                "scenario",
+                "conc",
+                "req/s",
+                "mean ms",
+                "p50 ms",
+                "p95 ms",
+                "p99 ms",
+                "peak KiB",
+            )
+        )
+    try:
+        for name in args.scenario or sorted(SCENARIOS):
+            for level in args.concurrency.split(","):
+                result = run_scenario(name, int(level), args.requests)
+                if args.json:
+                    print(json.dumps(result))
+                else:
+                    print(
+                        "%(scenario)-8s %(concurrency)5d %(rps)9.1f %(mean_ms)9.2f"
+                        " %(p50_ms)9.2f %(p95_ms)9.2f %(p99_ms)9.2f"
+                        " %(peak_kib)9.1f" % result
+                    )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,45 @@ from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
 SETTINGS_TYPES = {
+    "RECAPTCHA_BREAKER_CACHE": str,
+    "RECAPTCHA_BREAKER_RESET_TIMEOUT": (int, float),
+    "RECAPTCHA_BREAKER_SLOW_CALL": (int, float),
+    "RECAPTCHA_BREAKER_THRESHOLD": int,
+    "RECAPTCHA_BREAKER_WINDOW": int,
+    "RECAPTCHA_CONNECT_TIMEOUT": (int, float),
+    "RECAPTCHA_CONNECTION_POOL_SIZE": int,
+    "RECAPTCHA_DEFERRED_BACKEND": str,
+    "RECAPTCHA_DEFERRED_MAX_QUEUED": int,
     "RECAPTCHA_DOMAIN": str,
+    "RECAPTCHA_FAILURE_VIEW": str,
+    "RECAPTCHA_FAST_RENDER": bool,
+    "RECAPTCHA_HEDGE": bool,
+    "RECAPTCHA_LOG_CAP": int,
+    "RECAPTCHA_LOG_FORMAT": str,
+    "RECAPTCHA_LOG_WINDOW": (int, float),
+    "RECAPTCHA_MAX_RESPONSE_LENGTH": int,
     "RECAPTCHA_PRIVATE_KEY": str,
     "RECAPTCHA_PROXY": dict,
     "RECAPTCHA_PUBLIC_KEY": str,
+    "RECAPTCHA_READ_TIMEOUT": (int, float),
+    "RECAPTCHA_REPLAY_CACHE": str,
+    "RECAPTCHA_REPLAY_TIMEOUT": int,
+    "RECAPTCHA_RETRIES": int,
+    "RECAPTCHA_RETRY_BACKOFF": (int, float),
+    "RECAPTCHA_RETRY_BUDGET": (int, float),
+    "RECAPTCHA_SHARED_LOADER": bool,
+    "RECAPTCHA_SINGLE_FLIGHT": bool,
+    "RECAPTCHA_SINGLE_FLIGHT_CACHE": str,
+    "RECAPTCHA_SINGLE_FLIGHT_TIMEOUT": (int, float),
+    "RECAPTCHA_TRANSPORT": str,
+    "RECAPTCHA_TRANSPORT_OPTIONS": dict,
+    "RECAPTCHA_TRUST_COOKIE_NAME": str,
+    "RECAPTCHA_TRUST_STORAGE": str,
+    "RECAPTCHA_TRUST_WINDOW": int,
+    "RECAPTCHA_VERIFICATION_POLICIES": dict,
+    "RECAPTCHA_VERIFY_DEADLINE": (int, float),
     "RECAPTCHA_VERIFY_REQUEST_TIMEOUT": int,
+    "RECAPTCHA_VERIFY_URLS": (list, tuple),
 }
 
 # Validate settings types.
@@ -0,0 +1,158 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from django_recaptcha.exceptions import CircuitOpenError
+
+CLOSED = "closed"
+# Closed, after failures that a success resets.
+FAILING = "failing"
+HALF_OPEN = "half-open"
+
+# Breaker state is kept in this process unless RECAPTCHA_BREAKER_CACHE names a
+# cache shared with other processes.
+_local_cache = LocMemCache("django_recaptcha_breaker", {})
+
+
+class CircuitBreaker:
+    """
+    Stops verification requests after repeated failures of the verify
+    endpoint.
+
+    threshold -- the number of consecutive failures within window that opens
+        the circuit
+    window -- seconds over which failures are counted, from the first one
+    reset_timeout -- seconds the circuit stays open before a single probe
+        request is let through to test the endpoint again
+    slow_call -- optional duration in seconds after which a request counts as
+        a failure even though it succeeded
+    cache -- the cache holding the breaker state
+
+    A request fails when it raises. A successful request starts the count of
+    failures over. A successful probe closes the circuit, a failed one opens
+    it again.
+    """
+
+    key_prefix = "django_recaptcha:breaker:"
+
+    def __init__(
+        self, threshold, window=60, reset_timeout=30, slow_call=None, cache=None
+    ):
+        self.threshold = threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.cache = cache if cache is not None else _local_cache
+
+    def make_key(self, name):
+        return self.key_prefix + name
+
+    def before_call(self):
+        """
+        Returns the state the request is made in. Raises CircuitOpenError if
+        no request may be made.
+        """
+        tripped, is_open = self.make_key("tripped"), self.make_key("open")
+        failures = self.make_key("failures")
+        state = self.cache.get_many([tripped, is_open, failures])
+        if tripped not in state:
+            return FAILING if state.get(failures) else CLOSED
+        # Once the circuit has been open for reset_timeout, only the first
+        # caller gets to probe the endpoint.
+        if is_open not in state and self.cache.add(
+            self.make_key("probe"), 1, self.reset_timeout
+        ):
+            return HALF_OPEN
+        raise CircuitOpenError("The reCAPTCHA verification circuit is open.")
+
+    def trip(self):
+        self.cache.delete_many([self.make_key("failures"), self.make_key("probe")])
+        self.cache.set(self.make_key("tripped"), 1, None)
+        self.cache.set(self.make_key("open"), 1, self.reset_timeout)
+
+    def record_failure(self, state):
+        if state == HALF_OPEN:
+            self.trip()
+            return
+        failures = self.make_key("failures")
+        self.cache.add(failures, 0, self.window)
+        try:
+            count = self.cache.incr(failures)
+        except ValueError:
+            # The count expired in between, start a new one.
+            self.cache.add(failures, 1, self.window)
+            count = 1
+        if count >= self.threshold:
+            self.trip()
+
+    def record_success(self, state):
+        if state == FAILING:
+            self.cache.delete(self.make_key("failures"))
+        elif state == HALF_OPEN:
+            self.cache.delete_many(
+                [
+                    self.make_key("tripped"),
+                    self.make_key("probe"),
+                    self.make_key("failures"),
+                ]
+            )
+
+    def record(self, state, started):
+        if self.slow_call is not None and time.monotonic() - started > self.slow_call:
+            self.record_failure(state)
+        else:
+            self.record_success(state)
+
+    def call(self, func, *args, **kwargs):
+        state = self.before_call()
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure(state)
+            raise
+        self.record(state, started)
+        return result
+
+    async def acall(self, func, *args, **kwargs):
+        """
+        Coroutine version of call(), for a coroutine function func. A shared
+        cache may block on network I/O, so it is only used from a thread.
+        """
+        shared = self.cache is not _local_cache
+
+        async def run(method, *method_args):
+            if shared:
+                return await sync_to_async(method)(*method_args)
+            return method(*method_args)
+
+        state = await run(self.before_call)
+        started = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            await run(self.record_failure, state)
+            raise
+        await run(self.record, state, started)
+        return result
+
+
+def get_circuit_breaker():
+    """
+    Returns the circuit breaker configured by the RECAPTCHA_BREAKER_* settings,
+    or None when RECAPTCHA_BREAKER_THRESHOLD is not set.
+    """
+    threshold = getattr(settings, "RECAPTCHA_BREAKER_THRESHOLD", None)
+    if not threshold:
+        return None
+    alias = getattr(settings, "RECAPTCHA_BREAKER_CACHE", None)
+    return CircuitBreaker(
+        threshold,
+        window=getattr(settings, "RECAPTCHA_BREAKER_WINDOW", 60),
+        reset_timeout=getattr(settings, "RECAPTCHA_BREAKER_RESET_TIMEOUT", 30),
+        slow_call=getattr(settings, "RECAPTCHA_BREAKER_SLOW_CALL", None),
+        cache=caches[alias] if alias else None,
+    )
@@ -1,10 +1,28 @@
+import asyncio
+import contextvars
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from urllib.parse import urlencode
-from urllib.request import ProxyHandler, Request, build_opener
 
 from django.conf import settings
 
-from django_recaptcha.constants import DEFAULT_RECAPTCHA_DOMAIN
+from django_recaptcha import deadline
+from django_recaptcha.breaker import get_circuit_breaker
+from django_recaptcha.exceptions import MalformedResponseError, translate
+from django_recaptcha.retry import (
+    InFlightCounter,
+    LatencyTracker,
+    ahedged_call,
+    get_retry_policy,
+    hedged_call,
+)
+from django_recaptcha.signals import verify_request_finished
+from django_recaptcha.transports import get_transport
+
+VERIFY_PATH = "/recaptcha/api/siteverify"
 
 
 class RecaptchaResponse:
@@ -15,40 +33,30 @@ class RecaptchaResponse:
         self.action = action
 
 
-def recaptcha_request(params):
-    request_object = Request(
-        url="https://%s/recaptcha/api/siteverify"
-        % getattr(settings, "RECAPTCHA_DOMAIN", DEFAULT_RECAPTCHA_DOMAIN),
-        data=params,
-        headers={
-            "Content-type": "application/x-www-form-urlencoded",
-            "User-agent": "reCAPTCHA Django",
-        },
-    )
+def get_request_headers():
+    return {
+        "Content-type": "application/x-www-form-urlencoded",
+        "User-agent": "reCAPTCHA Django",
+    }
 
-    # Add proxy values to opener if needed.
-    opener_args = []
-    proxies = getattr(settings, "RECAPTCHA_PROXY", {})
-    if proxies:
-        opener_args = [ProxyHandler(proxies)]
-    opener = build_opener(*opener_args)
 
+def recaptcha_request(params):
     # Get response from POST to Google endpoint.
-    return opener.open(
-        request_object,
-        timeout=getattr(settings, "RECAPTCHA_VERIFY_REQUEST_TIMEOUT", 10),
-    )
+    return get_transport().request(VERIFY_PATH, params, get_request_headers())
 
 
-def submit(recaptcha_response, private_key, remoteip):
+async def arecaptcha_request(params):
     """
-    Submits a reCAPTCHA request for verification. Returns RecaptchaResponse
-    for the request
-
-    recaptcha_response -- The value of reCAPTCHA response from the form
-    private_key -- your reCAPTCHA private key
-    remoteip -- the user's ip address
+    Coroutine version of recaptcha_request. With the default transport each
+    call uses its own non-blocking connection, so any number of
+    verifications can be in flight on one event loop. Like request(), the
+    transport applies its connect and read timeouts, shortened to the
+    deadline.
     """
+    return await get_transport().arequest(VERIFY_PATH, params, get_request_headers())
+
+
+def encode_params(recaptcha_response, private_key, remoteip):
     params = urlencode(
         {
             "secret": private_key,
@@ -57,14 +65,217 @@ def submit(recaptcha_response, private_key, remoteip):
         }
     )
 
-    params = params.encode("utf-8")
+    return params.encode("utf-8")
 
-    response = recaptcha_request(params)
-    data = json.loads(response.read().decode("utf-8"))
-    response.close()
+
+def decode_response(body):
+    try:
+        data = json.loads(body.decode("utf-8"))
+    except ValueError as error:
+        raise MalformedResponseError(
+            "The verify endpoint answered with invalid JSON: %s" % error
+        ) from error
+    if not isinstance(data, dict) or "success" not in data:
+        raise MalformedResponseError(
+            "The verify endpoint answered without a verification outcome."
+        )
     return RecaptchaResponse(
         is_valid=data.pop("success"),
         error_codes=data.pop("error-codes", None),
         extra_data=data,
         action=data.pop("action", None),
     )
+
+
+# Durations of recent verification requests, from which the delay before a
+# hedged request is taken.
+latencies = LatencyTracker()
+# Submissions being verified in this process, however many requests each
+# makes.
+in_flight = InFlightCounter()
+
+
+def get_hedge_delay():
+    """
+    Returns the number of seconds after which a verification request is
+    hedged with a second one, or None if it is not.
+    """
+    if getattr(settings, "RECAPTCHA_HEDGE", False):
+        return latencies.percentile(95)
+
+
+def is_not_duplicate(response):
+    # The token can be used only once, so the slower of two hedged requests
+    # is told it is a duplicate whenever the faster one was answered.
+    return "timeout-or-duplicate" not in response.error_codes
+
+
+def _finished(started, response=None, error=None):
+    duration = time.monotonic() - started
+    if error is None:
+        latencies.record(duration)
+    verify_request_finished.send(
+        sender=None, duration=duration, response=response, error=error
+    )
+
+
+@contextmanager
+def _typed_errors():
+    # Failures of the transport are raised as the errors of
+    # django_recaptcha.exceptions, with the original as their cause.
+    try:
+        yield
+    except Exception as error:
+        typed = translate(error, deadline_passed=deadline.passed())
+        if typed is None or typed is error:
+            raise
+        raise typed from error
+
+
+def _verify(params):
+    deadline.check()
+    started = time.monotonic()
+    try:
+        response = recaptcha_request(params)
+        body = response.read()
+        response.close()
+        result = decode_response(body)
+    except Exception as error:
+        _finished(started, error=error)
+        raise
+    _finished(started, response=result)
+    return result
+
+
+def _verify_hedged(params):
+    delay = get_hedge_delay()
+    if delay is None:
+        return _verify(params)
+    return hedged_call(_verify, (params,), delay, accept=is_not_duplicate)
+
+
+async def _averify(params):
+    deadline.check()
+    started = time.monotonic()
+    try:
+        response = await arecaptcha_request(params)
+        body = response.read()
+        response.close()
+        result = decode_response(body)
+    except Exception as error:
+        _finished(started, error=error)
+        raise
+    _finished(started, response=result)
+    return result
+
+
+async def _averify_hedged(params):
+    delay = get_hedge_delay()
+    if delay is None:
+        return await _averify(params)
+    return await ahedged_call(_averify, (params,), delay, accept=is_not_duplicate)
+
+
+def submit(recaptcha_response, private_key, remoteip):
+    """
+    Submits a reCAPTCHA request for verification. Returns RecaptchaResponse
+    for the request
+
+    recaptcha_response -- The value of reCAPTCHA response from the form
+    private_key -- your reCAPTCHA private key
+    remoteip -- the user's ip address
+
+    Raises one of the errors of django_recaptcha.exceptions if the token could
+    not be verified, at the latest once RECAPTCHA_VERIFY_DEADLINE or the
+    deadline of django_recaptcha.deadline.within() passed.
+    """
+    params = encode_params(recaptcha_response, private_key, remoteip)
+
+    verify = _verify_hedged
+    retry_policy = get_retry_policy()
+    if retry_policy is not None:
+        verify = partial(retry_policy.call, verify)
+    breaker = get_circuit_breaker()
+    with deadline.within(deadline.get_verify_deadline()), in_flight, _typed_errors():
+        # A deadline passed before any request is not the endpoint's fault,
+        # so it must not count against the circuit.
+        deadline.check()
+        if breaker is not None:
+            return breaker.call(verify, params)
+        return verify(params)
+
+
+async def asubmit(recaptcha_response, private_key, remoteip):
+    """
+    Coroutine version of submit(), for use from async views. The request is
+    made with non-blocking I/O, so the event loop is never blocked.
+    """
+    params = encode_params(recaptcha_response, private_key, remoteip)
+
+    verify = _averify_hedged
+    retry_policy = get_retry_policy()
+    if retry_policy is not None:
+        verify = partial(retry_policy.acall, verify)
+    breaker = get_circuit_breaker()
+    with deadline.within(deadline.get_verify_deadline()), in_flight, _typed_errors():
+        # A deadline passed before any request is not the endpoint's fault,
+        # so it must not count against the circuit.
+        deadline.check()
+        if breaker is not None:
+            return await breaker.acall(verify, params)
+        return await verify(params)
+
+
+def get_max_workers():
+    # One worker per pooled connection, so a batch reuses them all.
+    return getattr(settings, "RECAPTCHA_CONNECTION_POOL_SIZE", 10)
+
+
+def _submit_or_error(submission):
+    try:
+        return submit(*submission)
+    except Exception as error:
+        return error
+
+
+def submit_many(submissions, max_workers=None):
+    """
+    Submits several reCAPTCHA requests for verification concurrently. Returns
+    a list holding, in the order of submissions, the RecaptchaResponse for
+    each request or the exception it raised.
+
+    submissions -- iterable of (recaptcha_response, private_key, remoteip)
+    max_workers -- the maximum number of requests in flight, defaults to
+        RECAPTCHA_CONNECTION_POOL_SIZE
+    """
+    submissions = list(submissions)
+    if not submissions:
+        return []
+    max_workers = min(max_workers or get_max_workers(), len(submissions))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Each request runs in a copy of the caller's context, so that it
+        # keeps to the deadline; a context cannot be entered by two threads.
+        futures = [
+            executor.submit(contextvars.copy_context().run, _submit_or_error, item)
+            for item in submissions
+        ]
+        return [future.result() for future in futures]
+
+
+async def asubmit_many(submissions, max_workers=None):
+    """
+    Coroutine version of submit_many(). max_workers bounds the number of
+    requests in flight and defaults to no limit.
+    """
+    semaphore = asyncio.Semaphore(max_workers) if max_workers else None
+
+    async def asubmit_or_error(submission):
+        try:
+            if semaphore is None:
+                return await asubmit(*submission)
+            async with semaphore:
+                return await asubmit(*submission)
+        except Exception as error:
+            return error
+
+    return list(await asyncio.gather(*map(asubmit_or_error, submissions)))
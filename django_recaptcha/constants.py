@@ -4,3 +4,7 @@
 TEST_PUBLIC_KEY = "6LeIxAcTAAAAAJcZVRqyHh71UMIEGNQ_MXjiZKhI"
 TEST_PRIVATE_KEY = "6LeIxAcTAAAAAGG-vFI1TnRWxMZNFuojJ4WifJWe"
 DEFAULT_RECAPTCHA_DOMAIN = "www.google.com"
+# api.js loads the rest of reCAPTCHA from here.
+RECAPTCHA_STATIC_DOMAIN = "www.gstatic.com"
+# Tokens issued by Google are a couple of thousand characters long at most.
+DEFAULT_MAX_RESPONSE_LENGTH = 8192
@@ -0,0 +1,77 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from django_recaptcha.exceptions import DeadlineExceededError
+
+# The time.monotonic() by which verification must be done in the current
+# context, or None.
+_deadline = ContextVar("django_recaptcha_deadline", default=None)
+
+
+def get_verify_deadline():
+    """
+    Returns the number of seconds a verification may take in total, retries
+    included, set with RECAPTCHA_VERIFY_DEADLINE, or None.
+    """
+    return getattr(settings, "RECAPTCHA_VERIFY_DEADLINE", None)
+
+
+@contextmanager
+def within(seconds):
+    """
+    Runs the block with verification bound to be done within seconds, or
+    before an enclosing deadline if that is sooner. With None, only an
+    enclosing deadline applies.
+
+        with deadline.within(2):
+            form.is_valid()
+    """
+    if seconds is None:
+        yield
+        return
+    new = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """
+    Returns the number of seconds left before the deadline, or None if there
+    is none.
+    """
+    current = _deadline.get()
+    if current is None:
+        return None
+    return current - time.monotonic()
+
+
+def passed():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check():
+    """
+    Raises DeadlineExceededError if the deadline passed.
+    """
+    if passed():
+        raise DeadlineExceededError("The reCAPTCHA verification deadline passed.")
+
+
+def bound(timeout):
+    """
+    Returns timeout, or the time left before the deadline if that is shorter.
+    Raises DeadlineExceededError if the deadline passed.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    check()
+    return left if timeout is None else min(timeout, left)
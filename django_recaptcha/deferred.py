@@ -0,0 +1,262 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from django_recaptcha import client, logs, replay
+from django_recaptcha.exceptions import DeferredQueueFullError
+from django_recaptcha.signals import deferred_verification_finished
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEFERRED_BACKEND = "django_recaptcha.deferred.ThreadPoolBackend"
+# The number of jobs ThreadPoolBackend lets wait for a thread.
+DEFAULT_DEFERRED_MAX_QUEUED = 1000
+
+
+def make_job(token, private_key, remoteip, checks, form_class=None, field_name=None):
+    """
+    Returns the job verifying token in the background, a dict of plain
+    values, so that task queues can serialize it.
+
+    checks -- the arguments of fields.check_response() for the outcome
+    """
+    # The private key is left out when it is the configured one, so that it
+    # does not end up in task queues.
+    if private_key == getattr(settings, "RECAPTCHA_PRIVATE_KEY", None):
+        private_key = None
+    return {
+        "id": uuid.uuid4().hex,
+        "token": token,
+        "private_key": private_key,
+        "remoteip": remoteip,
+        "checks": checks,
+        "form": (
+            "%s.%s" % (form_class.__module__, form_class.__qualname__)
+            if form_class is not None
+            else None
+        ),
+        "field": field_name,
+    }
+
+
+def run(job):
+    """
+    Verifies the token of job and sends deferred_verification_finished with
+    the outcome. Task backends call it from their workers.
+    """
+    from django_recaptcha.fields import check_response
+
+    response = error = None
+    try:
+        if replay.claim(job["token"]):
+            response = client.submit(
+                recaptcha_response=job["token"],
+                private_key=job["private_key"] or settings.RECAPTCHA_PRIVATE_KEY,
+                remoteip=job["remoteip"],
+            )
+        else:
+            response = client.RecaptchaResponse(
+                is_valid=False, error_codes=["timeout-or-duplicate"]
+            )
+        outcome, message, args = check_response(response, **job["checks"])
+    except Exception as exc:
+        # Whatever went wrong, the application has to hear about the job.
+        error = exc
+        outcome = "error"
+        logger.warning("ReCAPTCHA deferred verification failed: %r", exc)
+    else:
+        if message:
+            logs.get_failure_log().log(
+                outcome,
+                message,
+                args,
+                error_codes=response.error_codes,
+                form=job["form"],
+                field=job["field"],
+                job_id=job["id"],
+            )
+    finish(job, outcome, response, error)
+    return outcome
+
+
+def finish(job, outcome, response=None, error=None):
+    deferred_verification_finished.send(
+        sender=None,
+        job_id=job["id"],
+        job=job,
+        outcome=outcome,
+        response=response,
+        error=error,
+    )
+
+
+def run_in_thread(job):
+    """
+    Runs job on a thread of this process, which has database connections of
+    its own: they are closed if unusable or too old, before and after, as
+    Django does around requests.
+    """
+    close_old_connections()
+    try:
+        return run(job)
+    finally:
+        close_old_connections()
+
+
+class ThreadPoolBackend:
+    """
+    Runs deferred verifications on a pool of threads of this process, as
+    many as RECAPTCHA_CONNECTION_POOL_SIZE. Jobs still queued are lost if
+    the process exits.
+
+    At most RECAPTCHA_DEFERRED_MAX_QUEUED jobs wait for a thread, so that a
+    flood of submissions cannot grow the queue without bound. Past that,
+    is_full() is true and enqueue() raises DeferredQueueFullError.
+    """
+
+    def __init__(self):
+        max_workers = getattr(settings, "RECAPTCHA_CONNECTION_POOL_SIZE", 10)
+        self.max_queued = getattr(
+            settings, "RECAPTCHA_DEFERRED_MAX_QUEUED", DEFAULT_DEFERRED_MAX_QUEUED
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="recaptcha-deferred",
+        )
+        # One slot per job running or waiting, given back once it finished.
+        self._slots = threading.BoundedSemaphore(max_workers + self.max_queued)
+
+    def is_full(self):
+        if not self._slots.acquire(blocking=False):
+            return True
+        self._slots.release()
+        return False
+
+    def enqueue(self, job):
+        if not self._slots.acquire(blocking=False):
+            raise DeferredQueueFullError(
+                "%d deferred verifications are waiting already." % self.max_queued
+            )
+        try:
+            future = self.executor.submit(run_in_thread, job)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda future: self._slots.release())
+        return future
+
+
+class ImmediateBackend:
+    """
+    Runs deferred verifications right away, for tests and development.
+    """
+
+    def enqueue(self, job):
+        run(job)
+
+
+# The backend of RECAPTCHA_DEFERRED_BACKEND, with the path it was created
+# from, created when first used.
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the process-wide backend configured by the
+    RECAPTCHA_DEFERRED_BACKEND setting: a class whose instances have an
+    enqueue(job) method arranging for run(job) to be called, and optionally
+    an is_full() method.
+    """
+    global _backend
+
+    path = getattr(settings, "RECAPTCHA_DEFERRED_BACKEND", DEFAULT_DEFERRED_BACKEND)
+    current = _backend
+    if current is not None and current[0] == path:
+        return current[1]
+    with _backend_lock:
+        if _backend is None or _backend[0] != path:
+            _backend = (path, import_string(path)())
+        return _backend[1]
+
+
+def is_full():
+    """
+    Returns whether the backend would refuse another job right now.
+    """
+    backend = get_backend()
+    return hasattr(backend, "is_full") and backend.is_full()
+
+
+def enqueue(job):
+    """
+    Hands job to the backend. If the backend refuses it as full, the
+    submission was accepted already, so deferred_verification_finished is
+    sent at once with the "error" outcome.
+    """
+    try:
+        get_backend().enqueue(job)
+    except DeferredQueueFullError as exc:
+        logger.warning("ReCAPTCHA deferred verification dropped: %s", exc)
+        finish(job, "error", error=exc)
+
+
+def enqueue_on_commit(job, request=None, using=None):
+    """
+    Queues job once the transaction in progress on database using commits,
+    or at once outside transactions, so that the job never runs before the
+    submission it verifies is saved.
+
+    request -- the request job was made in, which no longer holds it pending
+    """
+    if request is not None:
+        pending = getattr(request, "_recaptcha_deferred_jobs", [])
+        if job in pending:
+            pending.remove(job)
+    transaction.on_commit(partial(enqueue, job), using=using)
+
+
+def add_pending(request, job):
+    """
+    Holds job with request until the view queued it, or until
+    RecaptchaRequestMiddleware queues it after the response.
+    """
+    pending = getattr(request, "_recaptcha_deferred_jobs", None)
+    if pending is None:
+        pending = request._recaptcha_deferred_jobs = []
+    pending.append(job)
+
+
+def enqueue_pending(request):
+    """
+    Queues the jobs of request that its view did not queue itself.
+    """
+    pending = getattr(request, "_recaptcha_deferred_jobs", [])
+    request._recaptcha_deferred_jobs = []
+    for job in pending:
+        enqueue_on_commit(job)
+
+
+def discard_pending(request):
+    """
+    Drops the jobs of request that its view did not queue itself.
+    """
+    request._recaptcha_deferred_jobs = []
+
+
+def _reset_backend():
+    # A forked child has none of its parent's worker threads.
+    global _backend, _backend_lock
+    _backend = None
+    _backend_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_backend)
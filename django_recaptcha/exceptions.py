@@ -0,0 +1,114 @@
+import asyncio
+import socket
+from http.client import HTTPException
+from urllib.error import HTTPError, URLError
+
+# Errors raised when a connection or read timed out.
+TIMEOUT_ERRORS = (TimeoutError, socket.timeout, asyncio.TimeoutError)
+
+# Errors raised before a connection to the verify endpoint was established,
+# so the request never reached it.
+CONNECT_ERRORS = (socket.gaierror, ConnectionRefusedError)
+
+
+class RecaptchaError(Exception):
+    """
+    Base class of the errors raised when a token could not be verified.
+    """
+
+
+class CircuitOpenError(RecaptchaError):
+    """
+    Raised instead of making a verification request while the circuit breaker
+    is open.
+    """
+
+
+class DeferredQueueFullError(RecaptchaError):
+    """
+    Raised by a deferred verification backend that cannot take another job.
+    The field then verifies the value right away instead.
+    """
+
+
+class NetworkError(RecaptchaError, OSError):
+    """
+    Raised when the verify endpoint could not be reached or did not answer.
+    """
+
+
+class ConnectError(NetworkError):
+    """
+    Raised when no connection to the verify endpoint could be made, for
+    example because DNS resolution failed or the connection was refused. The
+    request never reached the endpoint, so the token is not used up.
+    """
+
+
+class RequestTimeoutError(NetworkError, TimeoutError):
+    """
+    Raised when a verification request timed out.
+    """
+
+
+class ConnectTimeoutError(RequestTimeoutError, ConnectError):
+    """
+    Raised when connecting to the verify endpoint took longer than the connect
+    timeout.
+    """
+
+
+class ReadTimeoutError(RequestTimeoutError):
+    """
+    Raised when the verify endpoint took longer than the read timeout to
+    answer.
+    """
+
+
+class DeadlineExceededError(RequestTimeoutError):
+    """
+    Raised when the deadline for verification passed before the verify
+    endpoint answered, see django_recaptcha.deadline.
+    """
+
+
+class HTTPStatusError(NetworkError, HTTPError):
+    """
+    Raised when the verify endpoint answered with an error status. Like
+    urllib's HTTPError, it has the status as its code.
+    """
+
+
+class MalformedResponseError(RecaptchaError, ValueError):
+    """
+    Raised when the verify endpoint answered with something else than the
+    JSON document of a verification.
+    """
+
+
+def translate(error, deadline_passed=False):
+    """
+    Returns the RecaptchaError standing for error, raised by a transport, or
+    None if it is not a failure to reach the verify endpoint.
+
+    deadline_passed -- whether the deadline for verification passed, making a
+        timeout a DeadlineExceededError
+    """
+    if isinstance(error, RecaptchaError):
+        return error
+    if isinstance(error, HTTPError):
+        return HTTPStatusError(error.url, error.code, error.msg, error.hdrs, error.fp)
+    if isinstance(error, URLError):
+        # urllib only wraps errors raised before the request was sent.
+        if isinstance(error.reason, TIMEOUT_ERRORS):
+            error_class = DeadlineExceededError if deadline_passed else None
+            return (error_class or ConnectTimeoutError)(str(error.reason))
+        return ConnectError(str(error.reason))
+    if isinstance(error, TIMEOUT_ERRORS):
+        error_class = DeadlineExceededError if deadline_passed else ReadTimeoutError
+        return error_class(str(error) or "The verification request timed out.")
+    if isinstance(error, CONNECT_ERRORS):
+        return ConnectError(str(error))
+    if isinstance(error, (OSError, HTTPException, EOFError)):
+        return NetworkError(str(error) or error.__class__.__name__)
+    return None
@@ -1,18 +1,95 @@
 import logging
+import re
 import sys
+import time
+import warnings
+from contextlib import contextmanager
 from urllib.error import HTTPError
 
+from asgiref.sync import sync_to_async
 from django import forms
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.utils.translation import gettext_lazy as _
 
-from django_recaptcha import client
-from django_recaptcha.constants import TEST_PRIVATE_KEY, TEST_PUBLIC_KEY
+from django_recaptcha import (
+    client,
+    deferred,
+    logs,
+    replay,
+    shedding,
+    singleflight,
+    trust,
+)
+from django_recaptcha.constants import (
+    DEFAULT_MAX_RESPONSE_LENGTH,
+    TEST_PRIVATE_KEY,
+    TEST_PUBLIC_KEY,
+)
+from django_recaptcha.exceptions import (
+    CircuitOpenError,
+    RecaptchaError,
+)
+from django_recaptcha.middleware import get_current_request
+from django_recaptcha.signals import field_validated
 from django_recaptcha.widgets import ReCaptchaBase, ReCaptchaV2Checkbox, ReCaptchaV3
 
 logger = logging.getLogger(__name__)
 
+# Stands for a request not looked up in advance, as None is what is found
+# without one.
+_NOT_LOOKED_UP = object()
+
+
+def check_response(response, action=None, required_score=None, check_action=False):
+    """
+    Returns the outcome of a verification answered with response, one of
+    "valid", "invalid", "action-mismatch" and "low-score", with the message
+    explaining why it failed, or None, and its %-format arguments. Messages
+    are left to be formatted by logging, if they are logged at all.
+
+    action -- the reCAPTCHA V3 action the token must have been issued for
+    required_score -- the minimum reCAPTCHA V3 score, if any
+    check_action -- whether to check the action
+    """
+    if not response.is_valid:
+        return (
+            "invalid",
+            "ReCAPTCHA validation failed due to: %s",
+            (response.error_codes,),
+        )
+
+    if check_action and response.action != action:
+        return (
+            "action-mismatch",
+            "ReCAPTCHA validation failed due to: mismatched action. Expected '%s' but received '%s' from captcha server.",
+            (action, response.action),
+        )
+
+    if required_score:
+        # Our score values need to be floats, as that is the expected
+        # response from the Google endpoint. Rather than ensure that on
+        # the widget, we do it on the field to better support user
+        # subclassing of the widgets.
+        required_score = float(required_score)
+
+        # If a score was expected but non was returned, default to a 0,
+        # which is the lowest score that it can return. This is to do our
+        # best to assure a failure here, we can not assume that a form
+        # that needed the threshold should be valid if we didn't get a
+        # value back.
+        score = float(response.extra_data.get("score", 0))
+
+        if required_score > score:
+            return (
+                "low-score",
+                "ReCAPTCHA validation failed due to its score of %s"
+                " being lower than the required amount.",
+                (score,),
+            )
+
+    return "valid", None, ()
+
 
 class ReCaptchaField(forms.CharField):
     widget = ReCaptchaV2Checkbox
@@ -20,17 +97,77 @@ class ReCaptchaField(forms.CharField):
         "captcha_invalid": _("Error verifying reCAPTCHA, please try again."),
         "captcha_error": _("Error verifying reCAPTCHA, please try again."),
     }
+    # reCAPTCHA tokens only hold URL-safe base64 characters.
+    response_pattern = re.compile(r"[A-Za-z0-9_-]+")
 
-    def __init__(self, public_key=None, private_key=None, *args, **kwargs):
+    def __init__(
+        self,
+        public_key=None,
+        private_key=None,
+        *args,
+        request=None,
+        fail_open=False,
+        trust_window=None,
+        trust_scope=None,
+        deferred=False,
+        policy=None,
+        **kwargs,
+    ):
         """
         ReCaptchaField can accepts attributes which is a dictionary of
         attributes to be passed to the ReCaptcha widget class. The widget will
         loop over any options added and create the RecaptchaOptions
         JavaScript variables as specified in
         https://developers.google.com/recaptcha/docs/display#render_param
+
+        request -- the request being handled, used for the user's IP address.
+            Needed only without RecaptchaRequestMiddleware, and usually set
+            on the form's copy of the field: form.fields["captcha"].request
+        fail_open -- whether to accept the value without verifying it while
+            the circuit breaker is open, instead of failing validation
+        trust_window -- seconds during which a user who passed this field
+            is not verified again, defaults to the RECAPTCHA_TRUST_WINDOW
+            setting; 0 or None disables it
+        trust_scope -- what passing this field trusts the user for: "any"
+            field, fields with the same V3 "action", or only this field
+            of this "form"; defaults to "action" for widgets with an action
+            and to "form" otherwise
+        deferred -- whether to accept well-formed values at once and verify
+            them in the background, see deferred_verification_finished
+        policy -- the shedding.VerificationPolicy deciding which values are
+            verified, defaults to the one RECAPTCHA_VERIFICATION_POLICIES
+            sets for the V3 action
         """
         super().__init__(*args, **kwargs)
+        self.request = request
+        self.fail_open = fail_open
+        self.trust_window = trust_window
+        action = getattr(self.widget, "action", None)
+        if trust_scope is None:
+            trust_scope = "action" if action else "form"
+        if trust_scope not in ("any", "action", "form"):
+            raise ImproperlyConfigured(
+                "trust_scope must be one of 'any', 'action' and 'form'."
+            )
+        if trust_scope == "action" and not action:
+            # Every such field would share one scope.
+            raise ImproperlyConfigured(
+                "trust_scope 'action' needs a reCAPTCHA V3 widget with an action."
+            )
+        self.trust_scope = trust_scope
+        self.deferred = deferred
+        self.deferred_id = None
+        self._deferred_job = None
+        self._found_request = _NOT_LOOKED_UP
+        self.policy = policy
+        # The shedding.Decision taken for the last value validated, if one
+        # was needed.
+        self.decision = None
+        self._decision = None
+        self.form_class = None
+        self.field_name = None
         self._recaptcha_response = None
+        self._responses = {}
 
         if not isinstance(self.widget, ReCaptchaBase):
             raise ImproperlyConfigured(
@@ -52,14 +189,59 @@ class ReCaptchaField(forms.CharField):
         # Update widget attrs with data-sitekey.
         self.widget.attrs["data-sitekey"] = self.public_key
 
+    def __deepcopy__(self, memo):
+        result = super().__deepcopy__(memo)
+        # Every form gets its own copy of the field, which must not see
+        # outcomes memoized for another form.
+        result._responses = {}
+        result._decision = None
+        result._deferred_job = None
+        result._found_request = _NOT_LOOKED_UP
+        return result
+
     def get_request(self):
+        """
+        Returns the request being handled: the one bound to this field with
+        its request attribute, or else the one recorded by
+        RecaptchaRequestMiddleware. During validation it is the one looked up
+        when validation started.
+        """
+        if self.request is not None:
+            return self.request
+        if self._found_request is not _NOT_LOOKED_UP:
+            return self._found_request
+        request = get_current_request()
+        if request is not None:
+            return request
+
+        # DeprecationWarning: remove this backwards compatibility code in the next major release.
         f = sys._getframe()
         while f:
             request = f.f_locals.get("request")
             if request:
+                warnings.warn(
+                    "Finding the request by inspecting the call stack is deprecated."
+                    " Add django_recaptcha.middleware.RecaptchaRequestMiddleware to"
+                    " MIDDLEWARE or set the request attribute of ReCaptchaField.",
+                    DeprecationWarning,
+                    stacklevel=2,
+                )
                 return request
             f = f.f_back
 
+    @contextmanager
+    def request_looked_up(self):
+        """
+        Looks the request up once for the block, in which get_request()
+        returns what was found, rather than searching on every call.
+        """
+        previous = self._found_request
+        self._found_request = self.get_request()
+        try:
+            yield
+        finally:
+            self._found_request = previous
+
     @property
     def recaptcha_response(self):
         return self._recaptcha_response
@@ -75,62 +257,376 @@ class ReCaptchaField(forms.CharField):
     def log_warning(self, message):
         logger.warning(message)
 
-    def validate(self, value):
-        super().validate(value)
+    def log_failure(self, outcome, message, args=(), response=None):
+        """
+        Logs why a value was rejected with outcome, message % args, through
+        the FailureLog of RECAPTCHA_LOG_WINDOW, which caps repeated
+        messages. Subclasses overriding log_warning() get the formatted
+        message instead.
+        """
+        if type(self).log_warning is not ReCaptchaField.log_warning:
+            self.log_warning(message % args if args else message)
+            return
+        details = {
+            "form": (
+                self.form_class.__qualname__ if self.form_class is not None else None
+            ),
+            "field": self.field_name,
+        }
+        checks = self.get_checks()
+        if checks["check_action"]:
+            details["action"] = checks["action"]
+        if response is not None:
+            details["response_action"] = response.action
+            details["score"] = response.extra_data.get("score")
+        if checks["required_score"]:
+            details["required_score"] = checks["required_score"]
+        logs.get_failure_log().log(
+            outcome,
+            message,
+            args,
+            error_codes=response.error_codes if response is not None else (),
+            **details,
+        )
 
-        try:
-            check_captcha = client.submit(
-                recaptcha_response=value,
-                private_key=self.private_key,
-                remoteip=self.get_remote_ip(),
-            )
-            self._recaptcha_response = check_captcha
+    def get_response_memo(self):
+        """
+        Returns the dict verification outcomes are memoized in, keyed by token
+        and private key. It lives on the current request, so a token is
+        verified at most once while handling it, however many times or forms
+        it is validated through. Without a request, outcomes are only kept
+        on this field.
+        """
+        request = self.get_request()
+        if request is None:
+            return self._responses
+        responses = getattr(request, "_recaptcha_responses", None)
+        if not isinstance(responses, dict):
+            responses = request._recaptcha_responses = {}
+        return responses
 
-        except HTTPError:  # Catch timeouts, etc
-            raise ValidationError(
-                self.error_messages["captcha_error"], code="captcha_error"
-            )
+    def get_trust_window(self):
+        if self.trust_window is not None:
+            return self.trust_window
+        return getattr(settings, "RECAPTCHA_TRUST_WINDOW", 0)
 
-        if not check_captcha.is_valid:
-            self.log_warning(
-                "ReCAPTCHA validation failed due to: %s" % check_captcha.error_codes
-            )
-            raise ValidationError(
-                self.error_messages["captcha_invalid"], code="captcha_invalid"
+    def get_trust_scope(self):
+        """
+        Returns the name of the scope passing this field grants trust for,
+        or None if it cannot be told.
+        """
+        if self.trust_scope == "form":
+            if self.form_class is None:
+                return None
+            return "form:%s.%s.%s" % (
+                self.form_class.__module__,
+                self.form_class.__qualname__,
+                self.field_name,
             )
+        if self.trust_scope == "action":
+            return "action:%s" % self.widget.action
+        return "any"
 
+    def is_trusted(self):
+        """
+        Returns whether the current user passed a field of the same trust
+        scope within its trust window, so that this one is not verified.
+        Anonymous visitors are never trusted. Templates may use it to leave
+        out the widget.
+        """
+        if not self.get_trust_window():
+            return False
+        request = self.get_request()
+        scope = self.get_trust_scope()
+        return (
+            request is not None
+            and scope is not None
+            and trust.is_trusted(request, scope)
+        )
+
+    def grant_trust(self):
+        window = self.get_trust_window()
+        request = self.get_request()
+        scope = self.get_trust_scope()
         if (
-            isinstance(self.widget, ReCaptchaV3)
-            and check_captcha.action != self.widget.action
+            window
+            and request is not None
+            and scope is not None
+            and trust.can_trust(request)
         ):
+            trust.grant(request, scope, window)
+
+    def get_replay_response(self):
+        # Rejected the way Google would reject the token, without asking.
+        return client.RecaptchaResponse(
+            is_valid=False, error_codes=["timeout-or-duplicate"]
+        )
+
+    def submit(self, value):
+        """
+        Returns the RecaptchaResponse of Google for value, unless the replay
+        guard rejects it first.
+        """
+        if not replay.claim(value):
+            return self.get_replay_response()
+        return client.submit(
+            recaptcha_response=value,
+            private_key=self.private_key,
+            remoteip=self.get_remote_ip(),
+        )
+
+    async def asubmit(self, value):
+        """
+        Coroutine version of submit().
+        """
+        if not await replay.aclaim(value):
+            return self.get_replay_response()
+        return await client.asubmit(
+            recaptcha_response=value,
+            private_key=self.private_key,
+            remoteip=self.get_remote_ip(),
+        )
+
+    def verify(self, value):
+        """
+        Returns the RecaptchaResponse for value, reusing the outcome of an
+        earlier verification of the same value in this request, or of one
+        in progress in another with RECAPTCHA_SINGLE_FLIGHT.
+        """
+        responses = self.get_response_memo()
+        key = (value, self.private_key)
+        if key not in responses:
+            responses[key] = singleflight.call(key, self.submit, value)
+        outcome = responses[key]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def averify(self, value):
+        """
+        Verifies value without blocking the event loop and memoizes the
+        outcome, so a following validate() (e.g. from form.is_valid()) makes
+        no request of its own.
+        """
+        with self.request_looked_up():
+            await self._averify(value)
+
+    async def _averify(self, value):
+        if not self.is_well_formed(value) or self.deferred:
+            return
+        # Loading the session may query the database, which is not allowed
+        # from the event loop. It is cached for validate() afterwards.
+        if self.get_trust_window() and await sync_to_async(self.is_trusted)():
+            return
+        responses = self.get_response_memo()
+        key = (value, self.private_key)
+        if key in responses or self.decide(value).action != shedding.VERIFY:
+            return
+        try:
+            outcome = await singleflight.acall(key, self.asubmit, value)
+        except (RecaptchaError, HTTPError) as error:
+            # Kept so validate() reports the error instead of retrying with a
+            # blocking request.
+            outcome = error
+        responses[key] = outcome
+
+    async def avalidate(self, value):
+        if value not in self.empty_values:
+            await self.averify(value)
+        self.validate(value)
+
+    def is_well_formed(self, value):
+        """
+        Returns whether value looks like a reCAPTCHA token at all. Values that
+        do not are rejected without asking Google.
+        """
+        # The length is checked first, so oversized values are never scanned.
+        max_length = getattr(
+            settings, "RECAPTCHA_MAX_RESPONSE_LENGTH", DEFAULT_MAX_RESPONSE_LENGTH
+        )
+        return (
+            len(value) <= max_length
+            and self.response_pattern.fullmatch(value) is not None
+        )
+
+    def get_checks(self):
+        """
+        Returns the arguments of check_response() for this field's widget.
+        """
+        return {
+            "action": getattr(self.widget, "action", None),
+            "required_score": getattr(self.widget, "required_score", None),
+            "check_action": isinstance(self.widget, ReCaptchaV3),
+        }
+
+    def get_policy(self):
+        if self.policy is not None:
+            return self.policy
+        return shedding.get_policy(getattr(self.widget, "action", None))
+
+    def decide(self, value):
+        """
+        Returns the shedding.Decision of the policy for value, taken once per
+        value, and records it as the decision attribute.
+        """
+        if self._decision is None or self._decision[0] != value:
+            policy = self.get_policy()
+            decision = policy.decide() if policy is not None else shedding.SAMPLED
+            self._decision = (value, decision)
+        self.decision = self._decision[1]
+        return self.decision
+
+    def defer(self, value):
+        """
+        Prepares the verification of value in the background and sets
+        deferred_id to the id of its job. The job is queued once the
+        submission is saved: by enqueue_deferred(), or else by
+        RecaptchaRequestMiddleware after the response. Returns whether it was
+        deferred: when the backend is full, it is to be verified right away.
+        """
+        if deferred.is_full():
             self.log_warning(
-                "ReCAPTCHA validation failed due to: mismatched action. Expected '%s' but received '%s' from captcha server."
-                % (self.widget.action, check_captcha.action)
+                "ReCAPTCHA verification not deferred: the queue is full."
+                " Verifying it now."
             )
-            raise ValidationError(
-                self.error_messages["captcha_invalid"], code="captcha_invalid"
+            self.deferred_id = None
+            self._deferred_job = None
+            return False
+        job = deferred.make_job(
+            value,
+            self.private_key,
+            self.get_remote_ip(),
+            self.get_checks(),
+            form_class=self.form_class,
+            field_name=self.field_name,
+        )
+        request = self.get_request()
+        if request is not None:
+            deferred.add_pending(request, job)
+        self.deferred_id = job["id"]
+        self._deferred_job = (job, request)
+        return True
+
+    def enqueue_deferred(self, using=None):
+        """
+        Queues the job of the value deferred last, once the transaction in
+        progress on database using commits. Views call it after saving the
+        submission, so that the job never runs before it exists.
+        """
+        if self._deferred_job is None:
+            return
+        (job, request), self._deferred_job = self._deferred_job, None
+        deferred.enqueue_on_commit(job, request, using)
+
+    def get_bound_field(self, form, field_name):
+        # Remembered to tell which form and field a validation was for.
+        self.form_class = form.__class__
+        self.field_name = field_name
+        return super().get_bound_field(form, field_name)
+
+    def send_validated(self, outcome, started, response=None):
+        field_validated.send(
+            sender=self.__class__,
+            field=self,
+            form_class=self.form_class,
+            field_name=self.field_name,
+            outcome=outcome,
+            response=response,
+            duration=time.monotonic() - started,
+        )
+
+    def reject(self, outcome, started, response=None, code="captcha_invalid"):
+        """
+        Reports the outcome of a failed validation and returns the
+        ValidationError to raise for it.
+        """
+        self.send_validated(outcome, started, response)
+        return ValidationError(self.error_messages[code], code=code)
+
+    def validate(self, value):
+        with self.request_looked_up():
+            self._validate(value)
+
+    def _validate(self, value):
+        started = time.monotonic()
+        if self.is_trusted():
+            # Even without a value, as templates may leave out the widget.
+            self.send_validated("trusted", started)
+            return
+        super().validate(value)
+
+        if not self.is_well_formed(value):
+            self.log_failure(
+                "malformed", "ReCAPTCHA validation failed due to: malformed response."
             )
+            raise self.reject("malformed", started)
 
-        required_score = getattr(self.widget, "required_score", None)
-        if required_score:
-            # Our score values need to be floats, as that is the expected
-            # response from the Google endpoint. Rather than ensure that on
-            # the widget, we do it on the field to better support user
-            # subclassing of the widgets.
-            required_score = float(required_score)
-
-            # If a score was expected but non was returned, default to a 0,
-            # which is the lowest score that it can return. This is to do our
-            # best to assure a failure here, we can not assume that a form
-            # that needed the threshold should be valid if we didn't get a
-            # value back.
-            score = float(check_captcha.extra_data.get("score", 0))
-
-            if required_score > score:
-                self.log_warning(
-                    "ReCAPTCHA validation failed due to its score of %s"
-                    " being lower than the required amount." % score
+        if (value, self.private_key) not in self.get_response_memo():
+            decision = self.decide(value)
+            # Shed submissions come in floods, so their warnings are capped
+            # with RECAPTCHA_LOG_WINDOW like rejected ones.
+            if decision.action == shedding.FAIL:
+                self.log_failure(
+                    "overloaded",
+                    "ReCAPTCHA validation failed due to: verification shed (%s).",
+                    (decision.reason,),
+                )
+                raise self.reject("overloaded", started, code="captcha_error")
+            if decision.action == shedding.SKIP:
+                if decision.reason != "unsampled":
+                    self.log_failure(
+                        "shed",
+                        "ReCAPTCHA validation skipped: verification shed (%s).",
+                        (decision.reason,),
+                    )
+                self.send_validated(
+                    "unsampled" if decision.reason == "unsampled" else "shed",
+                    started,
                 )
-                raise ValidationError(
-                    self.error_messages["captcha_invalid"], code="captcha_invalid"
+                return
+            if self.deferred and self.defer(value):
+                self.send_validated("deferred", started)
+                return
+
+        try:
+            check_captcha = self.verify(value)
+            self._recaptcha_response = check_captcha
+
+        except CircuitOpenError:
+            if self.fail_open:
+                self.log_warning(
+                    "ReCAPTCHA validation skipped: the verification circuit is open."
                 )
+                self.send_validated("skipped", started)
+                return
+            raise self.reject("circuit-open", started, code="captcha_error")
+
+        # Unreachable, slow or failing verify endpoint. HTTPError is still
+        # caught for submit() overrides raising it.
+        except (RecaptchaError, HTTPError) as error:
+            self.log_warning(
+                "ReCAPTCHA validation failed due to: %s (%s)"
+                % (error.__class__.__name__, error)
+            )
+            raise self.reject("error", started, code="captcha_error")
+
+        outcome, message, args = check_response(check_captcha, **self.get_checks())
+        if outcome != "valid":
+            self.log_failure(outcome, message, args, check_captcha)
+            raise self.reject(outcome, started, check_captcha)
+
+        self.grant_trust()
+        self.send_validated("valid", started, check_captcha)
+
+
+async def averify_form(form):
+    """
+    Verifies the submitted values of all ReCaptchaFields on a bound form
+    without blocking the event loop. Await it in async views before calling
+    form.is_valid(), which then reuses the results.
+    """
+    for name, field in form.fields.items():
+        if isinstance(field, ReCaptchaField):
+            value = form[name].data
+            if value not in field.empty_values:
+                await field.averify(value)
@@ -0,0 +1,215 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+TEXT = "text"
+STRUCTURED = "structured"
+
+
+def format_value(value):
+    """
+    Returns value as it appears in key=value logs.
+    """
+    if value is None:
+        return "-"
+    if isinstance(value, (list, tuple)):
+        value = ",".join(map(str, value)) or "-"
+    value = str(value)
+    if not value or any(char.isspace() or char in '"=' for char in value):
+        return json.dumps(value)
+    return value
+
+
+class FailureLog:
+    """
+    Logs why verifications failed. Within every window, only the first cap
+    failures for each reason and set of error codes are logged; the others
+    are counted and summed up once the window is over, so an attack does not
+    flood the logs with identical warnings. A timer closes the window on
+    time if any failure was left out, so the summary does not wait for the
+    next failure.
+
+    logger -- the logger messages are sent to
+    window -- seconds over which failures are counted, or None to log every
+        failure
+    cap -- the number of failures logged for each reason and set of error
+        codes within a window
+    log_format -- TEXT for messages, or STRUCTURED for key=value pairs
+
+    Messages are formatted only when the logger emits them. Either way, the
+    details are also passed as the "recaptcha" attribute of the log record,
+    for handlers formatting records themselves.
+    """
+
+    def __init__(self, logger, window=None, cap=10, log_format=TEXT):
+        if log_format not in (TEXT, STRUCTURED):
+            raise ImproperlyConfigured(
+                "log_format must be one of 'text' and 'structured'."
+            )
+        self.logger = logger
+        self.window = window
+        self.cap = cap
+        self.log_format = log_format
+        self._started = None
+        self._counts = Counter()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def log(self, reason, message, args=(), error_codes=(), **details):
+        """
+        Logs a failed verification.
+
+        reason -- why it failed, such as "invalid" or "low-score"
+        message, args -- the message explaining why, and its %-format
+            arguments
+        error_codes -- the error codes of Google's answer
+        details -- more values for structured logs, such as the score
+        """
+        key = (reason, tuple(error_codes))
+        if self.window is not None:
+            with self._lock:
+                summary = self.roll_window()
+                self._counts[key] += 1
+                count = self._counts[key]
+                if count > self.cap and self._timer is None:
+                    self.start_timer()
+            if summary:
+                self.log_summary(*summary)
+            if count > self.cap:
+                return
+        if not self.logger.isEnabledFor(logging.WARNING):
+            return
+        details = {"reason": reason, "error_codes": list(error_codes), **details}
+        if self.log_format == STRUCTURED:
+            self.log_structured("recaptcha_validation_failed", details)
+        else:
+            self.logger.warning(message, *args, extra={"recaptcha": details})
+
+    def roll_window(self):
+        """
+        Starts a new window once the current one is over. Returns the counts
+        of the window that ended and its duration, or None. Called with the
+        lock held.
+        """
+        now = time.monotonic()
+        if self._started is None:
+            self._started = now
+            return None
+        if now - self._started < self.window:
+            return None
+        return self.close_window(now)
+
+    def close_window(self, now):
+        # The window ended window seconds after it started, however long
+        # the quiet spell before the next failure.
+        counts, self._counts = self._counts, Counter()
+        self._started = now
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return counts, self.window
+
+    def start_timer(self):
+        """
+        Arranges for the current window to be closed when it is over. Called
+        with the lock held.
+        """
+        delay = self._started + self.window - time.monotonic()
+        self._timer = threading.Timer(delay, self.on_timer, (self._started,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def on_timer(self, started):
+        with self._lock:
+            # Unless a failure or flush() closed the window in between.
+            if self._started != started:
+                return
+            summary = self.close_window(time.monotonic())
+        self.log_summary(*summary)
+
+    def flush(self):
+        """
+        Logs the summary of the current window and starts a new one.
+        """
+        with self._lock:
+            started = self._started
+            now = time.monotonic()
+            counts, _ = self.close_window(now)
+        if started is not None:
+            self.log_summary(counts, now - started)
+
+    def log_summary(self, counts, duration):
+        if not self.logger.isEnabledFor(logging.WARNING):
+            return
+        for (reason, error_codes), count in sorted(counts.items()):
+            if count <= self.cap:
+                continue
+            details = {
+                "reason": reason,
+                "error_codes": list(error_codes),
+                "count": count,
+                "suppressed": count - self.cap,
+                "window": round(duration, 3),
+            }
+            if self.log_format == STRUCTURED:
+                self.log_structured("recaptcha_validation_failures", details)
+            else:
+                self.logger.warning(
+                    "ReCAPTCHA validation failed %d times in %.0f seconds due to:"
+                    " %s %s (%d not logged).",
+                    count,
+                    duration,
+                    reason,
+                    list(error_codes),
+                    count - self.cap,
+                    extra={"recaptcha": details},
+                )
+
+    def log_structured(self, event, details):
+        pairs = [("event", event)] + list(details.items())
+        self.logger.warning(
+            " ".join("%s=%%s" % name for name, _ in pairs),
+            *(format_value(value) for _, value in pairs),
+            extra={"recaptcha": details},
+        )
+
+
+# A (settings key, FailureLog) tuple, replaced when the settings change.
+_failure_log = None
+_failure_log_lock = threading.Lock()
+
+
+def get_failure_log():
+    """
+    Returns the process-wide FailureLog configured by the RECAPTCHA_LOG_WINDOW,
+    RECAPTCHA_LOG_CAP and RECAPTCHA_LOG_FORMAT settings, logging to the
+    django_recaptcha.fields logger.
+    """
+    global _failure_log
+
+    key = (
+        getattr(settings, "RECAPTCHA_LOG_WINDOW", None),
+        getattr(settings, "RECAPTCHA_LOG_CAP", 10),
+        getattr(settings, "RECAPTCHA_LOG_FORMAT", TEXT),
+    )
+    current = _failure_log
+    if current is not None and current[0] == key:
+        return current[1]
+    with _failure_log_lock:
+        if _failure_log is None or _failure_log[0] != key:
+            window, cap, log_format = key
+            _failure_log = (
+                key,
+                FailureLog(
+                    logging.getLogger("django_recaptcha.fields"),
+                    window=window,
+                    cap=cap,
+                    log_format=log_format,
+                ),
+            )
+        return _failure_log[1]
@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_recaptcha.siteverify import SiteverifyServer, parse_latency
+
+
+def score(value):
+    if "," in value:
+        return tuple(float(bound) for bound in value.split(","))
+    return float(value)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a local stand-in for the reCAPTCHA siteverify endpoint, with "
+        "configurable latency and injected faults."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "addrport",
+            nargs="?",
+            default="127.0.0.1:8001",
+            help="Address and port to listen on (default: 127.0.0.1:8001).",
+        )
+        parser.add_argument(
+            "--latency",
+            type=parse_latency,
+            default="0",
+            help=(
+                "Delay before every answer: seconds, or one of "
+                "uniform:LOW,HIGH, lognormal:MEDIAN,SIGMA and exponential:MEAN."
+            ),
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="Fraction of requests answered with --error-status.",
+        )
+        parser.add_argument("--error-status", type=int, default=503)
+        parser.add_argument(
+            "--drop-rate",
+            type=float,
+            default=0,
+            help="Fraction of requests closed without a response.",
+        )
+        parser.add_argument(
+            "--invalid-rate",
+            type=float,
+            default=0,
+            help="Fraction of tokens answered as invalid.",
+        )
+        parser.add_argument(
+            "--error-code",
+            action="append",
+            dest="error_codes",
+            help="Error code of invalid tokens, may be repeated.",
+        )
+        parser.add_argument(
+            "--score",
+            type=score,
+            help="Score of valid tokens, or LOW,HIGH to draw it at random.",
+        )
+        parser.add_argument("--action", help="Action of valid tokens.")
+        parser.add_argument(
+            "--secret", help="Answer requests with another secret as invalid."
+        )
+        parser.add_argument("--seed", type=int, help="Seed of the random numbers.")
+
+    def handle(self, *args, **options):
+        host, _, port = options["addrport"].rpartition(":")
+        if not port.isdigit():
+            raise CommandError('"%s" is not a valid port.' % port)
+
+        server = SiteverifyServer(
+            (host or "127.0.0.1", int(port)),
+            latency=options["latency"],
+            error_rate=options["error_rate"],
+            error_status=options["error_status"],
+            drop_rate=options["drop_rate"],
+            invalid_rate=options["invalid_rate"],
+            error_codes=options["error_codes"] or ["invalid-input-response"],
+            score=options["score"],
+            action=options["action"],
+            secret=options["secret"],
+            seed=options["seed"],
+            verbose=options["verbosity"] > 1,
+        )
+        self.stdout.write(
+            "Serving siteverify at %s/recaptcha/api/siteverify\n"
+            "Send verification requests to it with:\n"
+            "    RECAPTCHA_TRANSPORT_OPTIONS = {'base_url': '%s'}\n"
+            "Quit with CONTROL-C." % (server.url, server.url)
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write("Answers given: %s" % dict(server.stats))
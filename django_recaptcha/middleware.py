@@ -0,0 +1,67 @@
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django_recaptcha import deferred, trust
+
+_current_request = ContextVar("django_recaptcha_current_request", default=None)
+
+
+def get_current_request():
+    """
+    Returns the request being handled in the current context, as recorded by
+    RecaptchaRequestMiddleware, or None.
+    """
+    return _current_request.get()
+
+
+class RecaptchaRequestMiddleware:
+    """
+    Makes the request being handled available to ReCaptchaField, which uses
+    it for the user's IP address and to memoize verifications, and sets the
+    trust cookie on the response if the field granted trust.
+
+    Deferred verifications the view did not queue itself are queued after a
+    successful response, once the view's transaction committed, and dropped
+    after an error response, whose submission was not saved.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        trust.set_cookie(request, response)
+        if getattr(request, "_recaptcha_deferred_jobs", None):
+            self.queue_deferred(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = _current_request.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        trust.set_cookie(request, response)
+        if getattr(request, "_recaptcha_deferred_jobs", None):
+            # Queueing uses the database connection, not allowed from the
+            # event loop.
+            await sync_to_async(self.queue_deferred)(request, response)
+        return response
+
+    def queue_deferred(self, request, response):
+        if response.status_code < 400:
+            deferred.enqueue_pending(request)
+        else:
+            deferred.discard_pending(request)
@@ -0,0 +1,55 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Google only accepts a token within two minutes of it being issued, so a
+# token only has to be remembered for a little longer than that.
+DEFAULT_REPLAY_TIMEOUT = 180
+
+
+def get_replay_cache():
+    """
+    Returns the cache used to remember verified tokens, or None when the
+    replay guard is disabled (the default).
+    """
+    alias = getattr(settings, "RECAPTCHA_REPLAY_CACHE", None)
+    if alias:
+        return caches[alias]
+
+
+def get_cache_key(token):
+    # Only a fingerprint of the token is stored: entries stay small whatever
+    # the size of the submitted value, and the cache never holds a usable
+    # token.
+    digest = hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+    return "django_recaptcha:replay:%s" % digest
+
+
+def claim(token):
+    """
+    Records token as used. Returns False if it was already used within the
+    replay timeout, True otherwise or when the replay guard is disabled.
+    """
+    cache = get_replay_cache()
+    if cache is None:
+        return True
+    return cache.add(
+        get_cache_key(token),
+        1,
+        getattr(settings, "RECAPTCHA_REPLAY_TIMEOUT", DEFAULT_REPLAY_TIMEOUT),
+    )
+
+
+async def aclaim(token):
+    """
+    Coroutine version of claim().
+    """
+    cache = get_replay_cache()
+    if cache is None:
+        return True
+    return await cache.aadd(
+        get_cache_key(token),
+        1,
+        getattr(settings, "RECAPTCHA_REPLAY_TIMEOUT", DEFAULT_REPLAY_TIMEOUT),
+    )
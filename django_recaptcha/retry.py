@@ -0,0 +1,286 @@
+import asyncio
+import contextvars
+import os
+import queue
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from http.client import RemoteDisconnected
+from urllib.error import HTTPError
+
+from django.conf import settings
+
+from django_recaptcha import deadline
+from django_recaptcha.exceptions import ConnectError
+
+# Responses with these statuses are usually transient. 429 and 503 are sent
+# before the token is looked at, but a 500, 502 or 504 may come after Google
+# used it up, in which case the retry is answered with timeout-or-duplicate
+# and fails the verification, as the error would have.
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Errors raised before the request could reach the verify endpoint, except
+# for RemoteDisconnected: the connection may have been dropped after the
+# request was answered, with the same consequence as a 500 above.
+RETRY_ERRORS = (
+    ConnectError,
+    ConnectionRefusedError,
+    RemoteDisconnected,
+    socket.gaierror,
+)
+
+
+def is_retryable(error):
+    if isinstance(error, HTTPError):
+        return error.code in RETRY_STATUS_CODES
+    return isinstance(error, RETRY_ERRORS)
+
+
+class RetryPolicy:
+    """
+    Repeats verification requests that failed without using up the token.
+
+    retries -- the maximum number of times a request is repeated
+    backoff -- the base delay in seconds before a retry, which doubles with
+        every attempt and is randomized ("full jitter")
+    budget -- the total number of seconds a request and its retries may take;
+        no retry is made that would start after it is spent, or after the
+        deadline for verification
+    """
+
+    def __init__(self, retries, backoff=0.1, budget=10):
+        self.retries = retries
+        self.backoff = backoff
+        self.budget = budget
+
+    def get_delay(self, attempt, started, error):
+        """
+        Returns the number of seconds to wait before retrying after error, or
+        None if the request must not be retried.
+        """
+        if attempt >= self.retries or not is_retryable(error):
+            return None
+        delay = random.uniform(0, self.backoff * 2**attempt)
+        if time.monotonic() - started + delay > self.budget:
+            return None
+        left = deadline.remaining()
+        if left is not None and delay >= left:
+            return None
+        return delay
+
+    def call(self, func, *args):
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return func(*args)
+            except Exception as error:
+                delay = self.get_delay(attempt, started, error)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, func, *args):
+        """
+        Coroutine version of call(), for a coroutine function func.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return await func(*args)
+            except Exception as error:
+                delay = self.get_delay(attempt, started, error)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def get_retry_policy():
+    """
+    Returns the retry policy configured by the RECAPTCHA_RETRY_* settings, or
+    None when RECAPTCHA_RETRIES is not set.
+    """
+    retries = getattr(settings, "RECAPTCHA_RETRIES", 0)
+    if not retries:
+        return None
+    return RetryPolicy(
+        retries,
+        backoff=getattr(settings, "RECAPTCHA_RETRY_BACKOFF", 0.1),
+        budget=getattr(
+            settings,
+            "RECAPTCHA_RETRY_BUDGET",
+            getattr(settings, "RECAPTCHA_VERIFY_REQUEST_TIMEOUT", 10),
+        ),
+    )
+
+
+class LatencyTracker:
+    """
+    Keeps the durations of the most recent requests to estimate percentiles.
+
+    size -- the number of durations kept
+    min_samples -- the number of durations needed for an estimate
+    """
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        # (time.monotonic() when recorded, duration) pairs.
+        self._durations = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, duration):
+        with self._lock:
+            self._durations.append((time.monotonic(), duration))
+
+    def percentile(self, percent, max_age=None):
+        """
+        Returns the given percentile of the recorded durations, or None if
+        fewer than min_samples have been recorded, within the last max_age
+        seconds if given.
+        """
+        since = time.monotonic() - max_age if max_age is not None else None
+        with self._lock:
+            durations = sorted(
+                duration
+                for recorded, duration in self._durations
+                if since is None or recorded >= since
+            )
+        if len(durations) < self.min_samples:
+            return None
+        return durations[min(len(durations) - 1, len(durations) * percent // 100)]
+
+
+class InFlightCounter:
+    """
+    Counts the calls in progress, entered as a context manager around each.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.count += 1
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.count -= 1
+
+
+class ElasticExecutor:
+    """
+    Runs calls on threads kept for reuse, starting a new thread only when none
+    is idle, so that calls never wait for one another. Threads left idle for
+    idle_timeout seconds exit.
+
+    idle_timeout -- the number of seconds an idle thread is kept
+    """
+
+    def __init__(self, idle_timeout=60):
+        self.idle_timeout = idle_timeout
+        # The inboxes of the idle threads, the most recently idle last.
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        """
+        Runs func(*args) in a copy of the current context, so the deadline
+        applies, and returns a Future of its outcome.
+        """
+        future = Future()
+        work = (future, contextvars.copy_context(), func, args)
+        with self._lock:
+            inbox = self._idle.pop() if self._idle else None
+        if inbox is None:
+            inbox = queue.SimpleQueue()
+            threading.Thread(target=self._work, args=(inbox,), daemon=True).start()
+        inbox.put(work)
+        return future
+
+    def _work(self, inbox):
+        while True:
+            try:
+                future, context, func, args = inbox.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    if inbox in self._idle:
+                        self._idle.remove(inbox)
+                        return
+                # Work was handed to this thread meanwhile.
+                continue
+            try:
+                future.set_result(context.run(func, *args))
+            except BaseException as error:
+                future.set_exception(error)
+            del future, context, func, args
+            with self._lock:
+                self._idle.append(inbox)
+
+
+_executor = ElasticExecutor()
+
+
+def _reset_executor():
+    # The threads of the parent are gone in a forked child, so its idle
+    # inboxes would never be served.
+    global _executor
+    _executor = ElasticExecutor()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor)
+
+
+def hedged_call(func, args, delay, accept):
+    """
+    Calls func(*args) and, if it has not returned after delay seconds, calls
+    it a second time concurrently. Returns the first result accept() is true
+    for, or else the outcome of the call that finished last.
+
+    Both calls run on threads of a shared ElasticExecutor, so the calls that
+    are not hedged do not pay for starting a thread. The slower call is not
+    cancelled; it finishes in the background.
+    """
+    pending = {_executor.submit(func, *args)}
+    if not wait(pending, timeout=delay).done:
+        pending.add(_executor.submit(func, *args))
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None and accept(future.result()):
+                return future.result()
+            outcome = future
+    return outcome.result()
+
+
+async def ahedged_call(func, args, delay, accept):
+    """
+    Coroutine version of hedged_call(), for a coroutine function func. The
+    slower call is cancelled.
+    """
+    pending = {asyncio.ensure_future(func(*args))}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if not done:
+            pending.add(asyncio.ensure_future(func(*args)))
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None and accept(task.result()):
+                    return task.result()
+                outcome = task
+        return outcome.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,107 @@
+import random
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from django_recaptcha import client
+
+VERIFY = "verify"
+SKIP = "skip"
+FAIL = "fail"
+
+# What to do with a submission, and why:
+#   action -- VERIFY, SKIP (accept it without verification) or FAIL (reject
+#       it without verification)
+#   reason -- "sampled" or "unsampled" when sampling decided, "in-flight" or
+#       "latency" when the submission was shed under load, "probe" when it is
+#       verified to find out whether latency recovered
+Decision = namedtuple("Decision", ["action", "reason"])
+
+SAMPLED = Decision(VERIFY, "sampled")
+PROBE = Decision(VERIFY, "probe")
+
+# The key of RECAPTCHA_VERIFICATION_POLICIES applying to fields without a
+# policy of their own.
+DEFAULT_POLICY = "*"
+
+
+class VerificationPolicy:
+    """
+    Decides for each submission whether to verify it or to skip or fail it
+    without a verification request, to keep the cost of low-value forms down
+    during traffic spikes.
+
+    sample_rate -- the fraction of submissions verified, from 0 to 1; the
+        others are skipped
+    max_in_flight -- the number of submissions being verified in this
+        process from which further ones are shed
+    max_latency -- the median duration in seconds of recent verification
+        requests from which submissions are shed
+    shed -- what happens to shed submissions: SKIP to accept them, or FAIL
+        to reject them
+    latency_window -- the number of seconds over which the median duration
+        is taken, so that shedding ends once slow requests are old enough
+    probe_rate -- the fraction of submissions verified anyway while shed
+        for latency, whose durations tell when latency recovered
+    """
+
+    def __init__(
+        self,
+        sample_rate=1,
+        max_in_flight=None,
+        max_latency=None,
+        shed=SKIP,
+        latency_window=60,
+        probe_rate=0.05,
+    ):
+        if not 0 <= sample_rate <= 1:
+            raise ImproperlyConfigured("sample_rate must be between 0 and 1.")
+        if not 0 <= probe_rate <= 1:
+            raise ImproperlyConfigured("probe_rate must be between 0 and 1.")
+        if shed not in (SKIP, FAIL):
+            raise ImproperlyConfigured("shed must be one of 'skip' and 'fail'.")
+        self.sample_rate = sample_rate
+        self.max_in_flight = max_in_flight
+        self.max_latency = max_latency
+        self.shed = shed
+        self.latency_window = latency_window
+        self.probe_rate = probe_rate
+
+    def get_latency(self):
+        return client.latencies.percentile(50, max_age=self.latency_window)
+
+    def decide(self):
+        """
+        Returns the Decision for the next submission.
+        """
+        if (
+            self.max_in_flight is not None
+            and client.in_flight.count >= self.max_in_flight
+        ):
+            return Decision(self.shed, "in-flight")
+        if self.max_latency is not None:
+            latency = self.get_latency()
+            if latency is not None and latency >= self.max_latency:
+                if random.random() < self.probe_rate:
+                    return PROBE
+                return Decision(self.shed, "latency")
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return Decision(SKIP, "unsampled")
+        return SAMPLED
+
+
+def get_policy(action=None):
+    """
+    Returns the VerificationPolicy configured for the reCAPTCHA V3 action in
+    the RECAPTCHA_VERIFICATION_POLICIES setting, a dict of VerificationPolicy
+    arguments by action, or with the "*" key for any other field. Returns
+    None if there is none.
+    """
+    policies = getattr(settings, "RECAPTCHA_VERIFICATION_POLICIES", {})
+    options = policies.get(action) if action is not None else None
+    if options is None:
+        options = policies.get(DEFAULT_POLICY)
+    if options is None:
+        return None
+    return VerificationPolicy(**options)
@@ -0,0 +1,32 @@
+from django.dispatch import Signal
+
+# Sent after every request to the verify endpoint, with the arguments:
+#   duration -- wall-clock seconds the request took
+#   response -- the RecaptchaResponse, or None if the request failed
+#   error -- the exception the request raised, or None
+verify_request_finished = Signal()
+
+# Sent by ReCaptchaField after validating a value, with the arguments:
+#   field -- the ReCaptchaField
+#   form_class -- the class of the form being validated, if known
+#   field_name -- the name of the field in that form, if known
+#   outcome -- one of "valid", "skipped" (accepted without verification),
+#       "trusted" (accepted within a trust window, see ReCaptchaField),
+#       "deferred" (accepted, with the verification left to the background),
+#       "unsampled" and "shed" (accepted without verification by the
+#       field's shedding.VerificationPolicy), "overloaded" (rejected without
+#       verification by that policy), "malformed", "error", "circuit-open",
+#       "invalid", "action-mismatch" and "low-score"
+#   response -- the RecaptchaResponse, or None if there is none
+#   duration -- wall-clock seconds the validation took
+field_validated = Signal()
+
+# Sent once a deferred verification finished, from the thread or worker that
+# ran it, with the arguments:
+#   job_id -- the id of the job, as the deferred_id of the field validated
+#   job -- the job, with the "form" and "field" it came from, if known
+#   outcome -- one of "valid", "error", "invalid", "action-mismatch" and
+#       "low-score"
+#   response -- the RecaptchaResponse, or None if there is none
+#   error -- the exception the verification raised, or None
+deferred_verification_finished = Signal()
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+
+# How long a verification may hold the cache lock, and how long the others
+# wait on it.
+DEFAULT_SINGLE_FLIGHT_TIMEOUT = 15
+# Seconds between checks for the outcome of a verification in another
+# process.
+POLL_INTERVAL = 0.05
+# How long the outcome of a verification is kept for the verifications that
+# waited on it, in whole seconds, as some cache backends round timeouts down.
+RESULT_TIMEOUT = 1
+
+
+def is_enabled():
+    return getattr(settings, "RECAPTCHA_SINGLE_FLIGHT", False) or bool(
+        get_flight_cache()
+    )
+
+
+def get_flight_cache():
+    """
+    Returns the cache used to coalesce verifications across processes, or
+    None to only coalesce them within this one.
+    """
+    alias = getattr(settings, "RECAPTCHA_SINGLE_FLIGHT_CACHE", None)
+    if alias:
+        return caches[alias]
+
+
+def get_timeout():
+    return getattr(
+        settings, "RECAPTCHA_SINGLE_FLIGHT_TIMEOUT", DEFAULT_SINGLE_FLIGHT_TIMEOUT
+    )
+
+
+def get_cache_keys(key):
+    # Like the replay guard, only a fingerprint of the token is stored.
+    digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:32]
+    return (
+        "django_recaptcha:flight:lock:%s" % digest,
+        "django_recaptcha:flight:result:%s:%%s" % digest,
+    )
+
+
+class Flight:
+    """
+    A call in progress, whose outcome the calls for the same key share.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Calls made for a key while one
+    is in progress wait for it and share its result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        # Coroutines wait on futures of their own event loop.
+        self._aflights = weakref.WeakKeyDictionary()
+
+    def call(self, key, func, *args):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            flight.done.wait()
+            return flight.outcome()
+        try:
+            flight.result = func(*args)
+            return flight.result
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def acall(self, key, func, *args):
+        flights = self._aflights.setdefault(asyncio.get_running_loop(), {})
+        future = flights.get(key)
+        if future is not None:
+            # Shielded, so a cancelled waiter does not cancel the others.
+            return await asyncio.shield(future)
+        future = flights[key] = asyncio.ensure_future(func(*args))
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                del flights[key]
+            else:
+                # Left running for the others when this waiter is cancelled.
+                future.add_done_callback(lambda future: flights.pop(key, None))
+
+
+flights = SingleFlight()
+
+
+def call_locked(cache, key, func, args):
+    """
+    Runs func(*args) if no other process verifies the same token, and shares
+    its result through cache with the callers waiting on it. Otherwise waits
+    for the result of the process that does, or runs func itself once that
+    one failed or the wait timed out.
+
+    The lock holds the id of the call in progress, and its result is kept
+    under that id only briefly. A result is only handed to callers that
+    found that call in progress, so a token verified earlier is verified
+    again (and rejected by Google or the replay guard).
+    """
+    lock_key, result_key = get_cache_keys(key)
+    flight_id = uuid.uuid4().hex
+    timeout = get_timeout()
+    deadline = time.monotonic() + timeout
+    while True:
+        if cache.add(lock_key, flight_id, timeout):
+            try:
+                result = func(*args)
+                # Stored before the lock goes, for the callers waiting on it.
+                cache.set(result_key % flight_id, result, RESULT_TIMEOUT)
+                return result
+            finally:
+                cache.delete(lock_key)
+        leader = cache.get(lock_key)
+        while leader is not None:
+            result = cache.get(result_key % leader)
+            if result is not None:
+                return result
+            if time.monotonic() > deadline:
+                return func(*args)
+            time.sleep(POLL_INTERVAL)
+            if cache.get(lock_key) != leader:
+                # Done, but the result may have been stored meanwhile.
+                result = cache.get(result_key % leader)
+                if result is not None:
+                    return result
+                # Failed, so this caller tries to take the lock itself.
+                break
+
+
+async def acall_locked(cache, key, func, args):
+    """
+    Coroutine version of call_locked().
+    """
+    lock_key, result_key = get_cache_keys(key)
+    flight_id = uuid.uuid4().hex
+    timeout = get_timeout()
+    deadline = time.monotonic() + timeout
+    while True:
+        if await cache.aadd(lock_key, flight_id, timeout):
+            try:
+                result = await func(*args)
+                await cache.aset(result_key % flight_id, result, RESULT_TIMEOUT)
+                return result
+            finally:
+                await cache.adelete(lock_key)
+        leader = await cache.aget(lock_key)
+        while leader is not None:
+            result = await cache.aget(result_key % leader)
+            if result is not None:
+                return result
+            if time.monotonic() > deadline:
+                return await func(*args)
+            await asyncio.sleep(POLL_INTERVAL)
+            if await cache.aget(lock_key) != leader:
+                result = await cache.aget(result_key % leader)
+                if result is not None:
+                    return result
+                break
+
+
+def call(key, func, *args):
+    """
+    Returns func(*args), sharing one call between the callers with the same
+    key at the same time when RECAPTCHA_SINGLE_FLIGHT is enabled. With
+    RECAPTCHA_SINGLE_FLIGHT_CACHE, callers in other processes share it too.
+    """
+    if not is_enabled():
+        return func(*args)
+    cache = get_flight_cache()
+    if cache is None:
+        return flights.call(key, func, *args)
+    return flights.call(key, call_locked, cache, key, func, args)
+
+
+async def acall(key, func, *args):
+    """
+    Coroutine version of call(), for a coroutine function func.
+    """
+    if not is_enabled():
+        return await func(*args)
+    cache = get_flight_cache()
+    if cache is None:
+        return await flights.acall(key, func, *args)
+    return await flights.acall(key, acall_locked, cache, key, func, args)
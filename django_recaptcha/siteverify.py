@@ -0,0 +1,230 @@
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Latency distributions, by name, as functions of a random.Random and the
+# distribution's parameters returning a delay in seconds.
+LATENCY_DISTRIBUTIONS = {
+    "fixed": lambda rng, delay: delay,
+    "uniform": lambda rng, low, high: rng.uniform(low, high),
+    "lognormal": lambda rng, median, sigma: median * rng.lognormvariate(0, sigma),
+    "exponential": lambda rng, mean: rng.expovariate(1 / mean),
+}
+
+
+def parse_latency(spec):
+    """
+    Returns a function of a random.Random returning a delay in seconds, for a
+    latency specification of the form "<distribution>:<parameters>", such as
+    "uniform:0.01,0.05", "lognormal:0.04,0.3" (median and sigma) or
+    "exponential:0.04" (mean). A plain number is a fixed delay.
+    """
+    name, _, parameters = str(spec).rpartition(":")
+    name = name or "fixed"
+    if name not in LATENCY_DISTRIBUTIONS:
+        raise ValueError("Unknown latency distribution %r." % name)
+    parameters = [float(parameter) for parameter in parameters.split(",")]
+    distribution = LATENCY_DISTRIBUTIONS[name]
+    return lambda rng: max(0, distribution(rng, *parameters))
+
+
+class SiteverifyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which Nagle's algorithm would
+    # otherwise hold back until the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        params = parse_qs(self.rfile.read(length).decode("utf-8"))
+        outcome, delay = self.server.decide(params)
+        if delay:
+            time.sleep(delay)
+
+        if outcome == "drop":
+            # Closed without a response, like a connection reset midway.
+            self.close_connection = True
+            return
+        if outcome == "error":
+            self.send_body(self.server.error_status, b"")
+            return
+        self.send_body(200, json.dumps(self.server.answer(outcome)).encode())
+
+    def send_body(self, status, body):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting, as clients with timeouts do.
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class SiteverifyServer(ThreadingHTTPServer):
+    """
+    A local stand-in for the siteverify endpoint, to test and load-test
+    forms without reaching Google.
+
+    address -- the (host, port) to listen on, port 0 picks a free one
+    latency -- delay before every answer, a number of seconds or a
+        specification understood by parse_latency()
+    error_rate -- the fraction of requests answered with error_status
+    error_status -- the HTTP status of error responses
+    drop_rate -- the fraction of requests the connection is closed for
+        without a response
+    invalid_rate -- the fraction of tokens answered as invalid
+    error_codes -- the error codes of invalid tokens
+    score -- the score of valid tokens, None to leave it out as for reCAPTCHA
+        V2, or a (low, high) range to draw it from
+    action -- the action of valid tokens, if any
+    secret -- if set, requests with another secret are answered with
+        "invalid-input-secret"
+    seed -- seed of the random numbers, for reproducible runs
+    verbose -- whether to log every request
+
+    Like the real endpoint, a token can be verified only once; repeated
+    tokens are answered with "timeout-or-duplicate". The number of answers
+    given, by outcome, is counted in stats.
+    """
+
+    daemon_threads = True
+    # Recently verified tokens are remembered to detect duplicates.
+    max_seen_tokens = 100000
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        latency=0,
+        error_rate=0,
+        error_status=503,
+        drop_rate=0,
+        invalid_rate=0,
+        error_codes=("invalid-input-response",),
+        score=None,
+        action=None,
+        secret=None,
+        seed=None,
+        verbose=False,
+    ):
+        super().__init__(address, SiteverifyHandler)
+        self.latency = latency if callable(latency) else parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.drop_rate = drop_rate
+        self.invalid_rate = invalid_rate
+        self.error_codes = list(error_codes)
+        self.score = score
+        self.action = action
+        self.secret = secret
+        self.verbose = verbose
+        self.stats = Counter()
+        self._rng = random.Random(seed)
+        self._seen = set()
+        self._seen_order = deque()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def get_settings(self):
+        """
+        Returns the settings that send verification requests to this server,
+        for use with override_settings().
+        """
+        return {"RECAPTCHA_TRANSPORT_OPTIONS": {"base_url": self.url}}
+
+    def is_duplicate(self, token):
+        if token in self._seen:
+            return True
+        self._seen.add(token)
+        self._seen_order.append(token)
+        if len(self._seen_order) > self.max_seen_tokens:
+            self._seen.discard(self._seen_order.popleft())
+        return False
+
+    def decide(self, params):
+        """
+        Returns the outcome for a request with params and the delay before it
+        is answered.
+        """
+        token = params.get("response", [""])[0]
+        secret = params.get("secret", [""])[0]
+        with self._lock:
+            delay = self.latency(self._rng)
+            chance = self._rng.random()
+            if chance < self.drop_rate:
+                outcome = "drop"
+            elif chance < self.drop_rate + self.error_rate:
+                outcome = "error"
+            elif self.secret is not None and secret != self.secret:
+                outcome = "invalid-secret"
+            elif not token:
+                outcome = "missing"
+            elif self.is_duplicate(token):
+                outcome = "duplicate"
+            elif self._rng.random() < self.invalid_rate:
+                outcome = "invalid"
+            else:
+                outcome = "valid"
+            self.stats[outcome] += 1
+        return outcome, delay
+
+    def answer(self, outcome):
+        error_codes = {
+            "invalid-secret": ["invalid-input-secret"],
+            "missing": ["missing-input-response"],
+            "duplicate": ["timeout-or-duplicate"],
+            "invalid": self.error_codes,
+        }
+        if outcome != "valid":
+            return {"success": False, "error-codes": error_codes[outcome]}
+
+        data = {
+            "success": True,
+            "challenge_ts": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "hostname": "localhost",
+        }
+        if isinstance(self.score, (list, tuple)):
+            with self._lock:
+                data["score"] = round(self._rng.uniform(*self.score), 1)
+        elif self.score is not None:
+            data["score"] = self.score
+        if self.action is not None:
+            data["action"] = self.action
+        return data
+
+    def start(self):
+        """
+        Serves requests from a background thread until stop() is called.
+        """
+        # Poll often, so that stopping the server does not hold up tests.
+        self._thread = threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,54 @@
+from django import forms, template
+
+from django_recaptcha.middleware import get_current_request
+from django_recaptcha.widgets import (
+    ReCaptchaBase,
+    render_loader,
+    render_resource_hints,
+)
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def recaptcha_loader(context, **api_params):
+    """
+    Renders the script loading api.js for all widgets on the page, with
+    api_params appended to its URL. Widgets rendered later in the same
+    response then leave it out.
+
+        {% load django_recaptcha %}
+        {% recaptcha_loader hl="fr" %}
+    """
+    request = context.get("request") or get_current_request()
+    return render_loader(request, api_params)
+
+
+def find_widgets(objects):
+    """
+    Returns the reCAPTCHA widgets of objects, which may be forms, bound
+    fields or widgets.
+    """
+    found = []
+    for obj in objects:
+        if isinstance(obj, forms.BaseForm):
+            found.extend(find_widgets(field.widget for field in obj.fields.values()))
+        elif isinstance(obj, forms.BoundField):
+            found.extend(find_widgets([obj.field.widget]))
+        elif isinstance(obj, ReCaptchaBase):
+            found.append(obj)
+    return found
+
+
+@register.simple_tag
+def recaptcha_resource_hints(*objects):
+    """
+    Renders <link> tags letting the browser connect to the hosts api.js is
+    loaded from before it reaches the script. Given the forms, bound fields
+    or widgets on the page, it renders nothing if there is no reCAPTCHA
+    among them, and only DNS lookups if every widget loads api.js lazily.
+
+        {% load django_recaptcha %}
+        {% recaptcha_resource_hints form %}
+    """
+    return render_resource_hints(find_widgets(objects) if objects else None)
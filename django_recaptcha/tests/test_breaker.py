@@ -0,0 +1,157 @@
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError
+
+from django import forms
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from django_recaptcha import breaker, client, deadline, fields
+from django_recaptcha.breaker import get_circuit_breaker
+from django_recaptcha.exceptions import DeadlineExceededError
+
+
+def fail():
+    raise OSError("Connection refused")
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self):
+        breaker._local_cache.clear()
+        self.breaker = breaker.CircuitBreaker(threshold=2, reset_timeout=30)
+
+    def trip(self):
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                self.breaker.call(fail)
+
+    def elapse_reset_timeout(self):
+        self.breaker.cache.delete(self.breaker.make_key("open"))
+
+    def test_opens_after_threshold(self):
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        self.trip()
+        func = MagicMock()
+        with self.assertRaises(breaker.CircuitOpenError):
+            self.breaker.call(func)
+        func.assert_not_called()
+
+    def test_success_resets_failure_count(self):
+        with self.assertRaises(OSError):
+            self.breaker.call(fail)
+        self.assertEqual(self.breaker.before_call(), breaker.FAILING)
+        self.breaker.call(lambda: "ok")
+        self.assertEqual(self.breaker.before_call(), breaker.CLOSED)
+        # Occasional failures among successes never open the circuit.
+        for _ in range(5):
+            with self.assertRaises(OSError):
+                self.breaker.call(fail)
+            self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+
+    def test_single_probe_when_half_open(self):
+        self.trip()
+        self.elapse_reset_timeout()
+        self.assertEqual(self.breaker.before_call(), breaker.HALF_OPEN)
+        with self.assertRaises(breaker.CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_successful_probe_closes(self):
+        self.trip()
+        self.elapse_reset_timeout()
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(self.breaker.before_call(), breaker.CLOSED)
+
+    def test_failed_probe_opens_again(self):
+        self.trip()
+        self.elapse_reset_timeout()
+        with self.assertRaises(OSError):
+            self.breaker.call(fail)
+        with self.assertRaises(breaker.CircuitOpenError):
+            self.breaker.call(lambda: "ok")
+
+    @patch("django_recaptcha.breaker.time.monotonic")
+    def test_slow_call_counts_as_failure(self, mocked_monotonic):
+        mocked_monotonic.side_effect = [0, 5, 10, 15]
+        slow_breaker = breaker.CircuitBreaker(threshold=2, slow_call=1)
+        self.assertEqual(slow_breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(slow_breaker.call(lambda: "ok"), "ok")
+        with self.assertRaises(breaker.CircuitOpenError):
+            slow_breaker.call(lambda: "ok")
+
+    async def test_acall(self):
+        async def afail():
+            fail()
+
+        async def aok():
+            return "ok"
+
+        self.assertEqual(await self.breaker.acall(aok), "ok")
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                await self.breaker.acall(afail)
+        with self.assertRaises(breaker.CircuitOpenError):
+            await self.breaker.acall(aok)
+
+    def test_get_circuit_breaker(self):
+        self.assertIsNone(breaker.get_circuit_breaker())
+        with override_settings(
+            RECAPTCHA_BREAKER_THRESHOLD=5,
+            RECAPTCHA_BREAKER_RESET_TIMEOUT=10,
+            RECAPTCHA_BREAKER_CACHE="default",
+        ):
+            circuit_breaker = breaker.get_circuit_breaker()
+        self.assertEqual(circuit_breaker.threshold, 5)
+        self.assertEqual(circuit_breaker.reset_timeout, 10)
+        self.assertIs(circuit_breaker.cache, caches["default"])
+
+
+class DefaultForm(forms.Form):
+    captcha = fields.ReCaptchaField()
+
+
+class FailOpenForm(forms.Form):
+    captcha = fields.ReCaptchaField(fail_open=True)
+
+
+@override_settings(RECAPTCHA_BREAKER_THRESHOLD=1)
+class TestFieldCircuitBreaker(TestCase):
+    def setUp(self):
+        breaker._local_cache.clear()
+
+    @patch("django_recaptcha.client.recaptcha_request")
+    def test_submit_fails_fast_when_open(self, mocked_request):
+        mocked_request.side_effect = HTTPError(
+            url="https://www.google.com/recaptcha/api/siteverify",
+            code=503,
+            fp=None,
+            msg="Oops",
+            hdrs="",
+        )
+        form_params = {"g-recaptcha-response": "PASSED"}
+        self.assertFalse(DefaultForm(form_params).is_valid())
+
+        form = DefaultForm(form_params)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()["captcha"][0].code, "captcha_error")
+        with self.assertRaises(breaker.CircuitOpenError):
+            client.submit("PASSED", "privkey", None)
+        mocked_request.assert_called_once()
+
+    @patch("django_recaptcha.client.recaptcha_request")
+    def test_fail_open_accepts_when_open(self, mocked_request):
+        mocked_request.side_effect = OSError("Connection refused")
+        form_params = {"g-recaptcha-response": "PASSED"}
+        with self.assertRaises(OSError):
+            client.submit("PASSED", "privkey", None)
+
+        form = FailOpenForm(form_params)
+        self.assertTrue(form.is_valid())
+        self.assertIsNone(form.fields["captcha"].recaptcha_response)
+        mocked_request.assert_called_once()
+
+    @patch("django_recaptcha.client.recaptcha_request")
+    def test_passed_deadline_not_counted(self, mocked_request):
+        with deadline.within(0):
+            with self.assertRaises(DeadlineExceededError):
+                client.submit("PASSED", "privkey", None)
+        mocked_request.assert_not_called()
+        self.assertEqual(get_circuit_breaker().before_call(), breaker.CLOSED)
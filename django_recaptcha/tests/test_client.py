@@ -1,10 +1,15 @@
+import asyncio
+import threading
 import uuid
-from unittest.mock import MagicMock, patch
+from contextlib import asynccontextmanager
+from unittest.mock import ANY, MagicMock, patch
+from urllib.error import HTTPError
 
 from django import forms
 from django.test import TestCase, override_settings
 
-from django_recaptcha import client, fields
+from django_recaptcha import client, deadline, fields, transports
+from django_recaptcha.exceptions import NetworkError
 
 
 class DefaultForm(forms.Form):
@@ -12,6 +17,9 @@ class DefaultForm(forms.Form):
 
 
 class TestClient(TestCase):
+    def setUp(self):
+        transports.get_transport().close()
+
     @patch("django_recaptcha.client.recaptcha_request")
     def test_client_success(self, mocked_response):
         read_mock = MagicMock()
@@ -60,79 +68,266 @@ class TestClient(TestCase):
             ["invalid-input-response", "invalid-input-secret"].sort(),
         )
 
-    @patch("django_recaptcha.client.Request")
-    @patch("django_recaptcha.client.build_opener")
-    def test_client_request(self, mocked_builder, mocked_request):
-        mock_read = MagicMock()
-        mock_read.read.return_value = (
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_client_request(self, mocked_connection):
+        mock_response = mocked_connection.return_value.getresponse.return_value
+        mock_response.status = 200
+        mock_response.read.return_value = (
             b'{"success": false, "error-codes":'
             b'["invalid-input-response", "invalid-input-secret"]}'
         )
-        mock_opener = MagicMock()
-        mock_opener.open.return_value = mock_read
-        mocked_builder.return_value = mock_opener
         form_params = {"g-recaptcha-response": "PASSED"}
         form = DefaultForm(form_params)
         form.is_valid()
 
-        # Quick way to test method call without needing to worry about Python 2
-        # dicts not being ordered by default.
-        self.assertIn("data=", mocked_request.call_args.__str__())
-        self.assertIn("remoteip=None", mocked_request.call_args.__str__())
-        self.assertIn("response=PASSED", mocked_request.call_args.__str__())
-        self.assertIn("secret=privkey", mocked_request.call_args.__str__())
-        self.assertIn("headers=", mocked_request.call_args.__str__())
-        self.assertIn(
-            "'Content-type': 'application/x-www-form-urlencoded'",
-            mocked_request.call_args.__str__(),
-        )
-        self.assertIn(
-            "'User-agent': 'reCAPTCHA Django'", mocked_request.call_args.__str__()
-        )
-        self.assertIn(
-            "url='https://www.google.com/recaptcha/api/siteverify'",
-            mocked_request.call_args.__str__(),
-        )
-        mock_opener.open.assert_called_with(mocked_request(), timeout=10)
-        mocked_builder.assert_called_with()
-
-    @patch("django_recaptcha.client.ProxyHandler")
-    @patch("django_recaptcha.client.Request")
-    @patch("django_recaptcha.client.build_opener")
-    @override_settings(RECAPTCHA_PROXY={"http": "aaaa.com"})
-    def test_client_request_with_proxy_builder(
-        self, mocked_builder, mocked_request, mocked_handler
-    ):
-        mock_read = MagicMock()
-        mock_read.read.return_value = (
-            b'{"success": false, "error-codes":'
-            b'["invalid-input-response", "invalid-input-secret"]}'
+        mocked_connection.assert_called_with("www.google.com", timeout=10, context=ANY)
+        request_call = mocked_connection.return_value.request.call_args
+        self.assertEqual(request_call.args, ("POST", "/recaptcha/api/siteverify"))
+        body = request_call.kwargs["body"].decode("utf-8")
+        self.assertIn("remoteip=None", body)
+        self.assertIn("response=PASSED", body)
+        self.assertIn("secret=privkey", body)
+        self.assertEqual(
+            request_call.kwargs["headers"],
+            {
+                "Content-type": "application/x-www-form-urlencoded",
+                "User-agent": "reCAPTCHA Django",
+            },
         )
-        mock_opener = MagicMock()
-        mock_opener.open.return_value = mock_read
-        mocked_builder.return_value = mock_opener
+        mocked_connection.return_value.set_tunnel.assert_not_called()
+
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    @override_settings(
+        RECAPTCHA_PROXY={"http": "aaaa.com", "https": "http://user:pw@bbbb.com:3128"}
+    )
+    def test_client_request_with_proxy(self, mocked_connection):
+        mock_response = mocked_connection.return_value.getresponse.return_value
+        mock_response.status = 200
+        mock_response.read.return_value = b'{"success": true}'
         form_params = {"g-recaptcha-response": "PASSED"}
         form = DefaultForm(form_params)
         form.is_valid()
 
-        # Quick way to test method call without needing to worry about Python 2
-        # dicts not being ordered by default.
-        self.assertIn("data=", mocked_request.call_args.__str__())
-        self.assertIn("remoteip=None", mocked_request.call_args.__str__())
-        self.assertIn("response=PASSED", mocked_request.call_args.__str__())
-        self.assertIn("secret=privkey", mocked_request.call_args.__str__())
-        self.assertIn("headers=", mocked_request.call_args.__str__())
-        self.assertIn(
-            "'Content-type': 'application/x-www-form-urlencoded'",
-            mocked_request.call_args.__str__(),
+        mocked_connection.assert_called_with("bbbb.com", 3128, timeout=10, context=ANY)
+        mocked_connection.return_value.set_tunnel.assert_called_with(
+            "www.google.com",
+            headers={"Proxy-Authorization": "Basic dXNlcjpwdw=="},
+        )
+
+
+class TestAsyncClient(TestCase):
+    def setUp(self):
+        transports.get_transport().close()
+        self.addCleanup(transports.get_transport().close)
+
+    @asynccontextmanager
+    async def serve(self, response, keep_alive=False, delay=0):
+        """
+        Runs a plain TCP server answering every request with response, after
+        delay seconds, and
+        routes the client's connections to it, recording the SSL contexts
+        they would use. Yields the received requests.
+        """
+        requests = []
+        self.ssl_contexts = []
+        handlers = []
+
+        async def handle(reader, writer):
+            handlers.append(asyncio.current_task())
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+                requests.append(head + await reader.readexactly(length))
+                await asyncio.sleep(delay)
+                writer.write(response)
+                await writer.drain()
+                if not keep_alive:
+                    break
+            writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        async def open_connection(host, proxy=None, secure=True, ssl_context=None):
+            self.ssl_contexts.append(ssl_context)
+            return await asyncio.open_connection("127.0.0.1", port)
+
+        try:
+            with patch(
+                "django_recaptcha.transports._aopen_connection", open_connection
+            ):
+                yield requests
+        finally:
+            # Idle connections are closed before the event loop of the test.
+            transports.get_transport().get_async_pool().clear()
+            # Which ends the handlers of kept-alive connections.
+            await asyncio.gather(*handlers)
+            server.close()
+            await server.wait_closed()
+
+    async def test_asubmit_success(self):
+        async with self.serve(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            b"Content-Length: 40\r\n\r\n"
+            b'{"success": true, "hostname": "testkey"}'
+        ) as requests:
+            response = await client.asubmit("token", "somekey", "0.0.0.0")
+        self.assertTrue(response.is_valid)
+        self.assertEqual(response.extra_data, {"hostname": "testkey"})
+
+        request = requests[0].decode("utf-8")
+        self.assertTrue(request.startswith("POST /recaptcha/api/siteverify HTTP/1.1"))
+        self.assertIn("Host: www.google.com\r\n", request)
+        self.assertIn("Content-type: application/x-www-form-urlencoded\r\n", request)
+        self.assertIn("User-agent: reCAPTCHA Django\r\n", request)
+        self.assertTrue(
+            request.endswith("secret=somekey&response=token&remoteip=0.0.0.0")
         )
-        self.assertIn(
-            "'User-agent': 'reCAPTCHA Django'", mocked_request.call_args.__str__()
+
+    async def test_connection_reused(self):
+        async with self.serve(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 17\r\n\r\n" b'{"success": true}',
+            keep_alive=True,
+        ) as requests:
+            for _ in range(3):
+                response = await client.asubmit("token", "somekey", "0.0.0.0")
+                self.assertTrue(response.is_valid)
+        self.assertEqual(len(requests), 3)
+        self.assertEqual(len(self.ssl_contexts), 1)
+        self.assertIs(self.ssl_contexts[0], transports.get_transport().ssl_context)
+
+    async def test_closed_connection_not_reused(self):
+        async with self.serve(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 17\r\n\r\n" b'{"success": true}'
+        ) as requests:
+            for _ in range(2):
+                response = await client.asubmit("token", "somekey", "0.0.0.0")
+                self.assertTrue(response.is_valid)
+        self.assertEqual(len(requests), 2)
+        # Each connection shares the context of the transport.
+        self.assertEqual(len(self.ssl_contexts), 2)
+        self.assertIs(self.ssl_contexts[0], self.ssl_contexts[1])
+
+    async def test_asubmit_chunked_failure(self):
+        async with self.serve(
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"12\r\n" + b'{"success": false,' + b"\r\n"
+            b'23\r\n "error-codes": ["invalid-input"]}\r\n'
+            b"0\r\n\r\n"
+        ):
+            response = await client.asubmit("token", "somekey", "0.0.0.0")
+        self.assertFalse(response.is_valid)
+        self.assertEqual(response.error_codes, ["invalid-input"])
+
+    async def test_asubmit_http_error(self):
+        async with self.serve(
+            b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n"
+        ):
+            with self.assertRaises(HTTPError) as error:
+                await client.asubmit("token", "somekey", "0.0.0.0")
+        self.assertEqual(error.exception.code, 503)
+
+    async def test_asubmit_malformed_head(self):
+        for response in (
+            b"HTTP/1.1 OK\r\nContent-Length: 0\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nContent-Length: many\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nContent-Length: -1\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n",
+        ):
+            with self.subTest(response=response):
+                async with self.serve(response):
+                    with self.assertRaises(NetworkError):
+                        await client.asubmit("token", "somekey", "0.0.0.0")
+
+    @override_settings(RECAPTCHA_VERIFY_REQUEST_TIMEOUT=0.05, RECAPTCHA_READ_TIMEOUT=5)
+    async def test_read_timeout_not_cut_short(self):
+        async with self.serve(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 17\r\n\r\n" b'{"success": true}',
+            delay=0.2,
+        ):
+            response = await client.asubmit("token", "somekey", "0.0.0.0")
+        self.assertTrue(response.is_valid)
+
+
+class TestSubmitMany(TestCase):
+    def fake_submit(self, recaptcha_response, private_key, remoteip):
+        if recaptcha_response == "error":
+            raise HTTPError(
+                url="https://www.google.com/recaptcha/api/siteverify",
+                code=500,
+                fp=None,
+                msg="Oops",
+                hdrs="",
+            )
+        return client.RecaptchaResponse(
+            is_valid=recaptcha_response == "valid",
+            extra_data={"token": recaptcha_response},
         )
-        self.assertIn(
-            "url='https://www.google.com/recaptcha/api/siteverify'",
-            mocked_request.call_args.__str__(),
+
+    def assert_results(self, results):
+        self.assertEqual(len(results), 3)
+        self.assertTrue(results[0].is_valid)
+        self.assertIsInstance(results[1], HTTPError)
+        self.assertFalse(results[2].is_valid)
+
+    def test_submit_many(self):
+        with patch("django_recaptcha.client.submit", self.fake_submit):
+            results = client.submit_many(
+                [
+                    ("valid", "somekey", "0.0.0.0"),
+                    ("error", "somekey", "0.0.0.0"),
+                    ("invalid", "somekey", "0.0.0.0"),
+                ]
+            )
+        self.assert_results(results)
+
+    def test_submit_many_concurrent(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def blocking_submit(*args):
+            # Only returns once all three requests are in flight.
+            barrier.wait()
+            return self.fake_submit(*args)
+
+        with patch("django_recaptcha.client.submit", blocking_submit):
+            results = client.submit_many(
+                [(token, "somekey", None) for token in ("valid", "a", "b")]
+            )
+        self.assertEqual(
+            [result.extra_data["token"] for result in results], ["valid", "a", "b"]
         )
-        mock_opener.open.assert_called_with(mocked_request(), timeout=10)
-        mocked_handler.assert_called_with({"http": "aaaa.com"})
-        mocked_builder.assert_called_with(mocked_handler())
+
+    def test_submit_many_keeps_deadline(self):
+        def remaining_submit(*args):
+            return client.RecaptchaResponse(
+                is_valid=True, extra_data={"remaining": deadline.remaining()}
+            )
+
+        with patch("django_recaptcha.client.submit", remaining_submit):
+            with deadline.within(5):
+                results = client.submit_many([("a", "somekey", None)] * 3)
+        for result in results:
+            self.assertIsNotNone(result.extra_data["remaining"])
+            self.assertLessEqual(result.extra_data["remaining"], 5)
+
+    def test_submit_many_empty(self):
+        self.assertEqual(client.submit_many([]), [])
+
+    async def test_asubmit_many(self):
+        async def fake_asubmit(*args):
+            await asyncio.sleep(0)
+            return self.fake_submit(*args)
+
+        with patch("django_recaptcha.client.asubmit", fake_asubmit):
+            results = await client.asubmit_many(
+                [
+                    ("valid", "somekey", "0.0.0.0"),
+                    ("error", "somekey", "0.0.0.0"),
+                    ("invalid", "somekey", "0.0.0.0"),
+                ],
+                max_workers=2,
+            )
+        self.assert_results(results)
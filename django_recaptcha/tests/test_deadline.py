@@ -0,0 +1,84 @@
+import time
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+
+from django_recaptcha import client, deadline, exceptions, retry, transports
+from django_recaptcha.siteverify import SiteverifyServer
+
+
+class TestDeadline(TestCase):
+    def test_within(self):
+        self.assertIsNone(deadline.remaining())
+        self.assertEqual(deadline.bound(5), 5)
+        with deadline.within(10):
+            self.assertAlmostEqual(deadline.bound(None), 10, delta=0.5)
+            with deadline.within(1):
+                self.assertLessEqual(deadline.bound(5), 1)
+            with deadline.within(60):
+                # An enclosing deadline that is sooner still applies.
+                self.assertLessEqual(deadline.remaining(), 10)
+            with deadline.within(None):
+                self.assertLessEqual(deadline.remaining(), 10)
+        self.assertIsNone(deadline.remaining())
+
+    def test_passed(self):
+        with deadline.within(0):
+            self.assertTrue(deadline.passed())
+            with self.assertRaises(exceptions.DeadlineExceededError):
+                deadline.bound(5)
+
+    @patch("django_recaptcha.client.recaptcha_request")
+    def test_submit_after_deadline(self, mocked_request):
+        with deadline.within(0):
+            with self.assertRaises(exceptions.DeadlineExceededError):
+                client.submit("token", "somekey", "0.0.0.0")
+        mocked_request.assert_not_called()
+
+    def test_no_retry_past_deadline(self):
+        policy = retry.RetryPolicy(3, backoff=1, budget=10)
+        error = ConnectionRefusedError()
+        with patch("django_recaptcha.retry.random.uniform", return_value=0.5):
+            self.assertEqual(policy.get_delay(0, time.monotonic(), error), 0.5)
+            with deadline.within(0.2):
+                self.assertIsNone(policy.get_delay(0, time.monotonic(), error))
+
+
+class TestVerifyDeadline(TestCase):
+    def setUp(self):
+        transports.get_transport().close()
+        self.addCleanup(transports.get_transport().close)
+
+    @override_settings(RECAPTCHA_VERIFY_DEADLINE=1)
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_timeouts_shortened(self, mocked_connection):
+        connection = mocked_connection.return_value
+        connection.sock = None
+        connection.connect.side_effect = lambda: setattr(
+            connection, "sock", MagicMock()
+        )
+        response = connection.getresponse.return_value
+        response.status = 200
+        response.will_close = False
+        response.read.return_value = b'{"success": true}'
+        client.submit("token", "somekey", "0.0.0.0")
+        self.assertLessEqual(connection.timeout, 1)
+        (read_timeout,) = connection.sock.settimeout.call_args.args
+        self.assertLessEqual(read_timeout, 1)
+
+    def test_slow_endpoint(self):
+        with SiteverifyServer(latency=0.5) as server, override_settings(
+            RECAPTCHA_VERIFY_DEADLINE=0.05, **server.get_settings()
+        ):
+            started = time.monotonic()
+            with self.assertRaises(exceptions.DeadlineExceededError):
+                client.submit("token", "somekey", "0.0.0.0")
+            self.assertLess(time.monotonic() - started, 0.4)
+
+    async def test_slow_endpoint_async(self):
+        with SiteverifyServer(latency=0.5) as server, override_settings(
+            **server.get_settings()
+        ):
+            with deadline.within(0.05):
+                with self.assertRaises(exceptions.DeadlineExceededError):
+                    await client.asubmit("token", "somekey", "0.0.0.0")
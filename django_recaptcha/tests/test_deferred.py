@@ -0,0 +1,305 @@
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django import forms
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseServerError
+from django.test import RequestFactory, TestCase, override_settings
+
+from django_recaptcha import deferred, fields, widgets
+from django_recaptcha.client import RecaptchaResponse
+from django_recaptcha.exceptions import DeferredQueueFullError
+from django_recaptcha.middleware import RecaptchaRequestMiddleware
+from django_recaptcha.signals import deferred_verification_finished, field_validated
+
+
+class DeferredForm(forms.Form):
+    captcha = fields.ReCaptchaField(deferred=True)
+
+
+class DeferredV3Form(forms.Form):
+    captcha = fields.ReCaptchaField(
+        widget=widgets.ReCaptchaV3(action="comment", required_score=0.5),
+        deferred=True,
+    )
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.jobs = []
+
+    def enqueue(self, job):
+        self.jobs.append(job)
+
+
+class FullBackend:
+    def is_full(self):
+        return True
+
+    def enqueue(self, job):
+        raise DeferredQueueFullError("Full.")
+
+
+class SignalRecorder:
+    def __init__(self, test, signal):
+        self.calls = []
+        signal.connect(self.receive)
+        test.addCleanup(signal.disconnect, self.receive)
+
+    def receive(self, sender, **kwargs):
+        self.calls.append(kwargs)
+
+
+@override_settings(
+    RECAPTCHA_DEFERRED_BACKEND="django_recaptcha.tests.test_deferred.RecordingBackend"
+)
+class TestDeferredField(TestCase):
+    def setUp(self):
+        self.addCleanup(deferred._reset_backend)
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_accepted_without_verification(self, mocked_submit):
+        validated = SignalRecorder(self, field_validated)
+        form = DeferredForm({"g-recaptcha-response": "token"})
+        self.assertTrue(form.is_valid())
+        mocked_submit.assert_not_called()
+        self.assertEqual(validated.calls[0]["outcome"], "deferred")
+        # Not before the view saved the submission.
+        self.assertEqual(deferred.get_backend().jobs, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            form.fields["captcha"].enqueue_deferred()
+        (job,) = deferred.get_backend().jobs
+        self.assertEqual(job["id"], form.fields["captcha"].deferred_id)
+        self.assertEqual(job["token"], "token")
+        self.assertEqual(
+            job["form"], "django_recaptcha.tests.test_deferred.DeferredForm"
+        )
+        self.assertEqual(job["field"], "captcha")
+        # The configured private key is not copied to the job.
+        self.assertIsNone(job["private_key"])
+
+    def test_queued_once_committed(self):
+        form = DeferredForm({"g-recaptcha-response": "token"})
+        self.assertTrue(form.is_valid())
+        field = form.fields["captcha"]
+        with self.captureOnCommitCallbacks() as callbacks:
+            field.enqueue_deferred()
+            field.enqueue_deferred()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(deferred.get_backend().jobs, [])
+        callbacks[0]()
+        self.assertEqual(len(deferred.get_backend().jobs), 1)
+
+    def test_middleware_queues_pending(self):
+        def view(request):
+            form = DeferredForm({"g-recaptcha-response": "token"})
+            self.assertTrue(form.is_valid())
+            self.assertEqual(deferred.get_backend().jobs, [])
+            view.job_id = form.fields["captcha"].deferred_id
+            return HttpResponse()
+
+        middleware = RecaptchaRequestMiddleware(view)
+        with self.captureOnCommitCallbacks(execute=True):
+            middleware(RequestFactory().post("/"))
+        (job,) = deferred.get_backend().jobs
+        self.assertEqual(job["id"], view.job_id)
+
+    def test_async_middleware_queues_pending(self):
+        async def view(request):
+            form = DeferredForm({"g-recaptcha-response": "token"})
+            self.assertTrue(form.is_valid())
+            return HttpResponse()
+
+        middleware = RecaptchaRequestMiddleware(view)
+        with self.captureOnCommitCallbacks(execute=True):
+            async_to_sync(middleware)(RequestFactory().post("/"))
+        self.assertEqual(len(deferred.get_backend().jobs), 1)
+
+    def test_middleware_skips_queued(self):
+        def view(request):
+            form = DeferredForm({"g-recaptcha-response": "token"})
+            self.assertTrue(form.is_valid())
+            form.fields["captcha"].enqueue_deferred()
+            return HttpResponse()
+
+        middleware = RecaptchaRequestMiddleware(view)
+        with self.captureOnCommitCallbacks(execute=True):
+            middleware(RequestFactory().post("/"))
+        self.assertEqual(len(deferred.get_backend().jobs), 1)
+
+    def test_middleware_drops_pending_on_error(self):
+        def view(request):
+            form = DeferredForm({"g-recaptcha-response": "token"})
+            self.assertTrue(form.is_valid())
+            return HttpResponseServerError()
+
+        middleware = RecaptchaRequestMiddleware(view)
+        with self.captureOnCommitCallbacks(execute=True):
+            middleware(RequestFactory().post("/"))
+        self.assertEqual(deferred.get_backend().jobs, [])
+
+    def test_malformed_rejected_at_once(self):
+        form = DeferredForm({"g-recaptcha-response": "<script>"})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(deferred.get_backend().jobs, [])
+
+    def test_memoized_outcome_not_deferred(self):
+        # As verified by RecaptchaVerificationMiddleware earlier.
+        request = RequestFactory().post("/")
+        form = DeferredForm({"g-recaptcha-response": "token"})
+        field = form.fields["captcha"]
+        field.request = request
+        request._recaptcha_responses = {
+            ("token", field.private_key): RecaptchaResponse(is_valid=False)
+        }
+        self.assertFalse(form.is_valid())
+        self.assertIsNone(field.deferred_id)
+        self.assertEqual(deferred.get_backend().jobs, [])
+
+    @override_settings(
+        RECAPTCHA_DEFERRED_BACKEND="django_recaptcha.tests.test_deferred.FullBackend"
+    )
+    @patch("django_recaptcha.fields.client.submit")
+    def test_verified_when_backend_full(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=False)
+        validated = SignalRecorder(self, field_validated)
+        form = DeferredForm({"g-recaptcha-response": "token"})
+        with self.assertLogs("django_recaptcha.fields") as logged:
+            self.assertFalse(form.is_valid())
+        self.assertIn("not deferred", logged.output[0])
+        mocked_submit.assert_called_once()
+        self.assertIsNone(form.fields["captcha"].deferred_id)
+        self.assertEqual(validated.calls[0]["outcome"], "invalid")
+
+    @override_settings(
+        RECAPTCHA_DEFERRED_BACKEND="django_recaptcha.tests.test_deferred.FullBackend"
+    )
+    def test_refused_after_validation(self):
+        finished = SignalRecorder(self, deferred_verification_finished)
+        job = deferred.make_job("token", "privkey", "1.2.3.4", {})
+        with self.assertLogs("django_recaptcha.deferred") as logged:
+            deferred.enqueue(job)
+        self.assertIn("dropped", logged.output[0])
+        (call,) = finished.calls
+        self.assertEqual(call["job_id"], job["id"])
+        self.assertEqual(call["outcome"], "error")
+        self.assertIsInstance(call["error"], DeferredQueueFullError)
+
+    @patch("django_recaptcha.fields.client.asubmit")
+    async def test_averify_form_skips_deferred(self, mocked_asubmit):
+        form = DeferredForm({"g-recaptcha-response": "token"})
+        await fields.averify_form(form)
+        mocked_asubmit.assert_not_called()
+
+
+class TestRun(TestCase):
+    def setUp(self):
+        self.finished = SignalRecorder(self, deferred_verification_finished)
+
+    def make_job(self, **checks):
+        return deferred.make_job("token", "privkey", "1.2.3.4", checks)
+
+    @patch("django_recaptcha.deferred.client.submit")
+    def test_outcomes(self, mocked_submit):
+        response = RecaptchaResponse(
+            is_valid=True, action="comment", extra_data={"score": 0.1}
+        )
+        mocked_submit.return_value = response
+        job = self.make_job(action="comment", required_score=0.5, check_action=True)
+        self.assertEqual(deferred.run(job), "low-score")
+        self.assertEqual(
+            mocked_submit.call_args.kwargs,
+            {
+                "recaptcha_response": "token",
+                "private_key": "privkey",
+                "remoteip": "1.2.3.4",
+            },
+        )
+        (call,) = self.finished.calls
+        self.assertEqual(call["job_id"], job["id"])
+        self.assertEqual(call["outcome"], "low-score")
+        self.assertIs(call["response"], response)
+        self.assertIsNone(call["error"])
+
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        self.assertEqual(deferred.run(self.make_job()), "valid")
+
+    @patch("django_recaptcha.deferred.client.submit")
+    def test_error(self, mocked_submit):
+        mocked_submit.side_effect = OSError("unreachable")
+        self.assertEqual(deferred.run(self.make_job()), "error")
+        (call,) = self.finished.calls
+        self.assertIsNone(call["response"])
+        self.assertIsInstance(call["error"], OSError)
+
+    @override_settings(RECAPTCHA_REPLAY_CACHE="default")
+    @patch("django_recaptcha.deferred.client.submit")
+    def test_replayed_token(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        self.addCleanup(caches["default"].clear)
+        self.assertEqual(deferred.run(self.make_job()), "valid")
+        self.assertEqual(deferred.run(self.make_job()), "invalid")
+        self.assertEqual(mocked_submit.call_count, 1)
+
+
+@override_settings(
+    RECAPTCHA_DEFERRED_BACKEND="django_recaptcha.deferred.ThreadPoolBackend"
+)
+class TestThreadPoolBackend(TestCase):
+    def setUp(self):
+        self.addCleanup(deferred._reset_backend)
+
+    @patch("django_recaptcha.deferred.client.submit")
+    def test_runs_in_background(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(
+            is_valid=True, action="comment", extra_data={"score": 0.9}
+        )
+        finished = SignalRecorder(self, deferred_verification_finished)
+        form = DeferredV3Form({"captcha": "token"})
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            form.fields["captcha"].enqueue_deferred()
+        deferred.get_backend().executor.shutdown(wait=True)
+        (call,) = finished.calls
+        self.assertEqual(call["job_id"], form.fields["captcha"].deferred_id)
+        self.assertEqual(call["outcome"], "valid")
+        self.assertEqual(call["job"]["checks"]["action"], "comment")
+
+    @override_settings(
+        RECAPTCHA_CONNECTION_POOL_SIZE=1, RECAPTCHA_DEFERRED_MAX_QUEUED=1
+    )
+    def test_queue_bounded(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def run(job):
+            started.set()
+            release.wait(5)
+
+        backend = deferred.ThreadPoolBackend()
+        self.addCleanup(backend.executor.shutdown)
+        with patch("django_recaptcha.deferred.run", run):
+            running = backend.enqueue({"id": "running"})
+            started.wait(5)
+            queued = backend.enqueue({"id": "queued"})
+            with self.assertRaises(DeferredQueueFullError):
+                backend.enqueue({"id": "dropped"})
+            self.assertTrue(backend.is_full())
+            release.set()
+            running.result(5)
+            queued.result(5)
+            # Slots are given back as jobs finish.
+            backend.enqueue({"id": "later"}).result(5)
+
+    @patch("django_recaptcha.deferred.close_old_connections")
+    def test_database_connections_closed(self, mocked_close):
+        backend = deferred.ThreadPoolBackend()
+        self.addCleanup(backend.executor.shutdown)
+        with patch("django_recaptcha.deferred.run") as mocked_run:
+            mocked_run.side_effect = lambda job: mocked_close.call_count
+            # Closed once before the job ran.
+            self.assertEqual(backend.enqueue({"id": "job"}).result(5), 1)
+        self.assertEqual(mocked_run.call_args.args, ({"id": "job"},))
+        self.assertEqual(mocked_close.call_count, 2)
@@ -0,0 +1,145 @@
+import socket
+from http.client import RemoteDisconnected
+from io import BytesIO
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError, URLError
+
+from django import forms
+from django.test import TestCase, override_settings
+
+from django_recaptcha import breaker, client, exceptions, fields, transports
+from django_recaptcha.siteverify import SiteverifyServer
+
+
+class DefaultForm(forms.Form):
+    captcha = fields.ReCaptchaField()
+
+
+class TestTranslate(TestCase):
+    def test_errors(self):
+        for error, error_class in (
+            (socket.gaierror(), exceptions.ConnectError),
+            (ConnectionRefusedError(), exceptions.ConnectError),
+            (URLError(socket.gaierror()), exceptions.ConnectError),
+            (URLError(socket.timeout()), exceptions.ConnectTimeoutError),
+            (socket.timeout(), exceptions.ReadTimeoutError),
+            (RemoteDisconnected(), exceptions.NetworkError),
+            (ConnectionResetError(), exceptions.NetworkError),
+        ):
+            with self.subTest(error=error):
+                self.assertIs(type(exceptions.translate(error)), error_class)
+
+        self.assertIsInstance(
+            exceptions.translate(socket.timeout(), deadline_passed=True),
+            exceptions.DeadlineExceededError,
+        )
+        self.assertIsNone(exceptions.translate(KeyError()))
+
+    def test_http_error(self):
+        error = exceptions.translate(HTTPError("url", 503, "Oops", {}, None))
+        self.assertIsInstance(error, exceptions.HTTPStatusError)
+        # Still caught as before.
+        self.assertIsInstance(error, HTTPError)
+        self.assertEqual(error.code, 503)
+
+    def test_circuit_open_error(self):
+        self.assertIs(breaker.CircuitOpenError, exceptions.CircuitOpenError)
+        self.assertTrue(issubclass(breaker.CircuitOpenError, exceptions.RecaptchaError))
+
+
+class TestSubmitErrors(TestCase):
+    def setUp(self):
+        transports.get_transport().close()
+        self.addCleanup(transports.get_transport().close)
+
+    def mock_connection(self, body=b'{"success": true}'):
+        connection = MagicMock()
+        connection.sock = None
+        connection.connect.side_effect = lambda: setattr(
+            connection, "sock", MagicMock()
+        )
+        response = connection.getresponse.return_value
+        response.status = 200
+        response.will_close = False
+        response.read.return_value = body
+        return connection
+
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_malformed_response(self, mocked_connection):
+        for body in (b"<html>", b"[]", b'{"hostname": "example.com"}'):
+            mocked_connection.return_value = self.mock_connection(body)
+            with self.assertRaises(exceptions.MalformedResponseError):
+                client.submit("token", "somekey", "0.0.0.0")
+
+    @override_settings(RECAPTCHA_CONNECT_TIMEOUT=2, RECAPTCHA_READ_TIMEOUT=5)
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_connect_and_read_timeouts(self, mocked_connection):
+        connection = mocked_connection.return_value = self.mock_connection()
+        client.submit("token", "somekey", "0.0.0.0")
+        self.assertEqual(connection.timeout, 2)
+        connection.sock.settimeout.assert_called_with(5)
+
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_connect_timeout(self, mocked_connection):
+        connection = mocked_connection.return_value = self.mock_connection()
+        connection.connect.side_effect = socket.timeout()
+        with self.assertRaises(exceptions.ConnectTimeoutError):
+            client.submit("token", "somekey", "0.0.0.0")
+        connection.request.assert_not_called()
+
+        connection.connect.side_effect = socket.gaierror()
+        with self.assertRaises(exceptions.ConnectError):
+            client.submit("token", "somekey", "0.0.0.0")
+
+    @override_settings(RECAPTCHA_RETRIES=1, RECAPTCHA_RETRY_BACKOFF=0)
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_connect_error_retried(self, mocked_connection):
+        failing, working = self.mock_connection(), self.mock_connection()
+        failing.connect.side_effect = ConnectionRefusedError()
+        mocked_connection.side_effect = [failing, working]
+        self.assertTrue(client.submit("token", "somekey", "0.0.0.0").is_valid)
+
+    @override_settings(
+        RECAPTCHA_TRANSPORT="django_recaptcha.transports.UrllibTransport"
+    )
+    @patch("django_recaptcha.transports.build_opener")
+    def test_urllib_errors(self, mocked_opener):
+        mocked_opener.return_value.open.side_effect = URLError(socket.gaierror())
+        with self.assertRaises(exceptions.ConnectError):
+            client.submit("token", "somekey", "0.0.0.0")
+        mocked_opener.return_value.open.side_effect = None
+        mocked_opener.return_value.open.return_value = BytesIO(b"not json")
+        with self.assertRaises(exceptions.MalformedResponseError):
+            client.submit("token", "somekey", "0.0.0.0")
+
+    @patch("django_recaptcha.client.recaptcha_request")
+    def test_field_rejects_network_errors(self, mocked_request):
+        for error in (socket.timeout(), URLError(socket.gaierror())):
+            mocked_request.side_effect = error
+            form = DefaultForm({"g-recaptcha-response": "token"})
+            self.assertFalse(form.is_valid())
+            self.assertEqual(
+                form.errors["captcha"],
+                ["Error verifying reCAPTCHA, please try again."],
+            )
+
+        mocked_request.side_effect = None
+        mocked_request.return_value = BytesIO(b"<html>")
+        self.assertFalse(DefaultForm({"g-recaptcha-response": "token"}).is_valid())
+
+
+class TestAsyncSubmitErrors(TestCase):
+    async def test_read_timeout(self):
+        with SiteverifyServer(latency=0.5) as server, override_settings(
+            RECAPTCHA_READ_TIMEOUT=0.05, **server.get_settings()
+        ):
+            with self.assertRaises(exceptions.ReadTimeoutError):
+                await client.asubmit("token", "somekey", "0.0.0.0")
+
+    async def test_connect_error(self):
+        async def refuse(host, proxy=None, secure=True, ssl_context=None):
+            raise ConnectionRefusedError()
+
+        with patch("django_recaptcha.transports._aopen_connection", refuse):
+            with self.assertRaises(exceptions.ConnectError):
+                await client.asubmit("token", "somekey", "0.0.0.0")
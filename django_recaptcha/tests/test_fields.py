@@ -1,12 +1,16 @@
+import copy
+import warnings
 from unittest.mock import MagicMock, Mock, PropertyMock, patch
 from urllib.error import HTTPError
 
 from django import forms
-from django.core.exceptions import ImproperlyConfigured
-from django.test import TestCase, override_settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.template import Context, Engine
+from django.test import RequestFactory, TestCase, override_settings
 
 from django_recaptcha import fields, widgets
 from django_recaptcha.client import RecaptchaResponse
+from django_recaptcha.middleware import RecaptchaRequestMiddleware
 
 
 class DefaultForm(forms.Form):
@@ -30,6 +34,28 @@ class TestFields(TestCase):
         form = DefaultForm(form_params)
         self.assertFalse(form.is_valid())
 
+    @patch("django_recaptcha.fields.client.submit")
+    def test_malformed_response_rejected_locally(self, mocked_submit):
+        for value in ("not a token", "token<script>", "x" * 8193):
+            form = DefaultForm({"g-recaptcha-response": value})
+            self.assertFalse(form.is_valid())
+            self.assertEqual(
+                form.errors.as_data()["captcha"][0].code, "captcha_invalid"
+            )
+        mocked_submit.assert_not_called()
+
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        form = DefaultForm({"g-recaptcha-response": "03AGdBq2-4_" + "x" * 8181})
+        self.assertTrue(form.is_valid())
+
+    @patch("django_recaptcha.fields.client.submit")
+    @override_settings(RECAPTCHA_MAX_RESPONSE_LENGTH=10)
+    def test_max_response_length_setting(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        self.assertTrue(DefaultForm({"g-recaptcha-response": "x" * 10}).is_valid())
+        self.assertFalse(DefaultForm({"g-recaptcha-response": "x" * 11}).is_valid())
+        mocked_submit.assert_called_once()
+
     def test_widget_check(self):
         with self.assertRaises(ImproperlyConfigured):
 
@@ -86,6 +112,39 @@ class TestFields(TestCase):
             remote_ip = form.fields["captcha"].get_remote_ip()
             self.assertEqual(remote_ip, "192.0.2.2")
 
+    def test_get_request_bound_to_field(self):
+        form = DefaultForm()
+        request = RequestFactory().post("/", REMOTE_ADDR="192.0.2.1")
+        form.fields["captcha"].request = request
+        self.assertIs(form.fields["captcha"].get_request(), request)
+        self.assertEqual(form.fields["captcha"].get_remote_ip(), "192.0.2.1")
+
+    # TODO: DeprecationWarning: remove backwards compatibility test
+    def test_get_request_from_stack_deprecated(self):
+        form = DefaultForm()
+        self.assertIsNone(form.fields["captcha"].get_request())
+
+        request = RequestFactory().post("/")
+        with self.assertWarnsMessage(DeprecationWarning, "RecaptchaRequestMiddleware"):
+            self.assertIs(form.fields["captcha"].get_request(), request)
+
+    # TODO: DeprecationWarning: remove backwards compatibility test
+    @patch("django_recaptcha.fields.client.submit")
+    def test_request_looked_up_once_per_validation(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        form = DefaultForm({"g-recaptcha-response": "PASSED"})
+        request = RequestFactory().post("/", REMOTE_ADDR="192.0.2.1")
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            self.assertTrue(form.is_valid())
+        self.assertEqual([warning.category for warning in caught], [DeprecationWarning])
+        self.assertEqual(mocked_submit.call_args.kwargs["remoteip"], "192.0.2.1")
+        field = form.fields["captcha"]
+        self.assertIn(("PASSED", field.private_key), request._recaptcha_responses)
+        # Looked up afresh once validation is done.
+        with self.assertWarnsMessage(DeprecationWarning, "RecaptchaRequestMiddleware"):
+            self.assertIs(field.get_request(), request)
+
     @patch("django_recaptcha.client.recaptcha_request")
     def test_field_captcha_errors(self, mocked_response):
         read_mock = MagicMock()
@@ -114,6 +173,91 @@ class TestFields(TestCase):
             form.errors["captcha"], ["Error verifying reCAPTCHA, please try again."]
         )
 
+    @patch("django_recaptcha.fields.client.submit")
+    @patch("django_recaptcha.fields.client.asubmit")
+    async def test_averify_form(self, mocked_asubmit, mocked_submit):
+        mocked_asubmit.return_value = RecaptchaResponse(is_valid=True)
+        form = DefaultForm({"g-recaptcha-response": "PASSED"})
+        await fields.averify_form(form)
+        self.assertTrue(form.is_valid())
+        mocked_asubmit.assert_called_once_with(
+            recaptcha_response="PASSED", private_key="privkey", remoteip=None
+        )
+        mocked_submit.assert_not_called()
+
+    @patch("django_recaptcha.fields.client.submit")
+    @patch("django_recaptcha.fields.client.asubmit")
+    async def test_averify_form_http_error(self, mocked_asubmit, mocked_submit):
+        mocked_asubmit.side_effect = HTTPError(
+            url="https://www.google.com/recaptcha/api/siteverify",
+            code=410,
+            fp=None,
+            msg="Oops",
+            hdrs="",
+        )
+        form = DefaultForm({"g-recaptcha-response": "PASSED"})
+        await fields.averify_form(form)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors["captcha"][0], "Error verifying reCAPTCHA, please try again."
+        )
+        mocked_submit.assert_not_called()
+
+    @patch("django_recaptcha.fields.client.submit")
+    @patch("django_recaptcha.fields.client.asubmit")
+    async def test_avalidate(self, mocked_asubmit, mocked_submit):
+        mocked_asubmit.return_value = RecaptchaResponse(
+            is_valid=False, error_codes=["410"]
+        )
+        field = fields.ReCaptchaField()
+        with self.assertRaises(ValidationError):
+            await field.avalidate("PASSED")
+        mocked_asubmit.assert_called_once()
+        mocked_submit.assert_not_called()
+
+        # A different value is not answered from the earlier verification.
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        field.validate("OTHER")
+        mocked_submit.assert_called_once()
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_verification_memoized_per_request(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        form_params = {"g-recaptcha-response": "PASSED"}
+
+        def view(request):
+            first_form = DefaultForm(request.POST)
+            self.assertTrue(first_form.is_valid())
+            first_form.full_clean()
+            second_form = DefaultForm(request.POST)
+            self.assertTrue(second_form.is_valid())
+            self.assertIs(
+                first_form.fields["captcha"].recaptcha_response,
+                second_form.fields["captcha"].recaptcha_response,
+            )
+
+        middleware = RecaptchaRequestMiddleware(view)
+        middleware(RequestFactory().post("/", form_params))
+        mocked_submit.assert_called_once()
+
+        middleware(RequestFactory().post("/", form_params))
+        self.assertEqual(mocked_submit.call_count, 2)
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_verification_memoized_per_form_without_request(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(
+            is_valid=False, error_codes=["timeout-or-duplicate"]
+        )
+        form_params = {"g-recaptcha-response": "PASSED"}
+        form = DefaultForm(form_params)
+        self.assertFalse(form.is_valid())
+        form.full_clean()
+        self.assertFalse(form.is_valid())
+        mocked_submit.assert_called_once()
+
+        self.assertFalse(DefaultForm(form_params).is_valid())
+        self.assertEqual(mocked_submit.call_count, 2)
+
 
 class TestWidgets(TestCase):
     @patch("django_recaptcha.widgets.uuid.UUID.hex", new_callable=PropertyMock)
@@ -372,6 +516,118 @@ class TestWidgets(TestCase):
             html,
         )
 
+    def test_fast_render_matches_templates(self):
+        for widget in (
+            widgets.ReCaptchaV2Checkbox(attrs={"data-theme": "dark"}),
+            widgets.ReCaptchaV2Invisible(api_params={"hl": "cl"}),
+            widgets.ReCaptchaV3(action="<signup>", attrs={"data-flag": True}),
+        ):
+
+            class FastForm(forms.Form):
+                captcha = fields.ReCaptchaField(widget=widget)
+
+            html = FastForm().as_p()
+            with override_settings(RECAPTCHA_FAST_RENDER=True):
+                self.assertEqual(FastForm().as_p(), html)
+                # The second render uses the cached JavaScript.
+                self.assertEqual(FastForm().as_p(), html)
+
+    def test_lazy_html(self):
+        for widget in (
+            widgets.ReCaptchaV2Checkbox(lazy=True),
+            widgets.ReCaptchaV2Invisible(lazy=True, api_params={"hl": "cl"}),
+            widgets.ReCaptchaV3(lazy=True, action="signup"),
+        ):
+            widget.attrs["data-sitekey"] = "pubkey"
+            html = widget.render("captcha", None)
+            self.assertNotIn("<script src=", html)
+            self.assertIn("window.djangoRecaptchaLazy = ", html)
+            self.assertIn("djangoRecaptchaLazy.watch(", html)
+            self.assertIn('data-widget-uuid="%s"' % widget.uuid, html)
+
+        self.assertIn(
+            'djangoRecaptchaLazy.ready("https://www.google.com/recaptcha/api.js?hl\\u003Dcl"',
+            widgets.ReCaptchaV2Invisible(
+                lazy=True, api_params={"hl": "cl"}, attrs={"data-sitekey": "pubkey"}
+            ).render("captcha", None),
+        )
+        html = widgets.ReCaptchaV3(
+            lazy=True, action="signup", attrs={"data-sitekey": "pubkey"}
+        ).render("captcha", None)
+        self.assertIn("api.js?render\\u003Dpubkey", html)
+        self.assertIn("{action: 'signup'}", html)
+
+    def test_v3_prefetch_html(self):
+        widget = widgets.ReCaptchaV3(
+            prefetch=True, action="signup", attrs={"data-sitekey": "pubkey"}
+        )
+        html = widget.render("captcha", None)
+        self.assertIn("setTimeout(tick, 90000);", html)
+        self.assertIn("idleRefreshes < 5;", html)
+        self.assertIn("document.hidden", html)
+        self.assertIn("grecaptcha.ready(start);", html)
+        self.assertIn("{action: 'signup'}", html)
+        with override_settings(RECAPTCHA_FAST_RENDER=True):
+            self.assertEqual(widget.render("captcha", None), html)
+
+        widget = widgets.ReCaptchaV3(
+            prefetch=True, lazy=True, attrs={"data-sitekey": "pubkey"}
+        )
+        widget.token_refresh_interval = 60
+        widget.max_token_refreshes = 2
+        html = widget.render("captcha", None)
+        self.assertIn("setTimeout(tick, 60000);", html)
+        self.assertIn("idleRefreshes < 2;", html)
+        self.assertIn("djangoRecaptchaLazy.watch(", html)
+        self.assertIn(", element, start);", html)
+
+        html = widgets.ReCaptchaV3(attrs={"data-sitekey": "pubkey"}).render(
+            "captcha", None
+        )
+        self.assertNotIn("refreshToken", html)
+
+    def test_lazy_fast_render_matches_templates(self):
+        for widget_class in (
+            widgets.ReCaptchaV2Checkbox,
+            widgets.ReCaptchaV2Invisible,
+            widgets.ReCaptchaV3,
+        ):
+            widget = widget_class(lazy=True, attrs={"data-sitekey": "pubkey"})
+            html = widget.render("captcha", None)
+            with override_settings(RECAPTCHA_FAST_RENDER=True):
+                self.assertEqual(widget.render("captcha", None), html)
+
+    @override_settings(RECAPTCHA_FAST_RENDER=True)
+    def test_fast_render_skips_custom_template(self):
+        class CustomWidget(widgets.ReCaptchaV2Checkbox):
+            template_name = "django_recaptcha/includes/js_v2_invisible.html"
+
+        widget = CustomWidget(attrs={"data-sitekey": "pubkey"})
+        with patch.object(
+            widgets.ReCaptchaBase, "render_js", side_effect=AssertionError
+        ):
+            html = widget.render("captcha", None)
+        self.assertIn("Bind the helper function to the form submit action", html)
+
+    def test_static_context_cached(self):
+        widget = widgets.ReCaptchaV2Checkbox(
+            attrs={"data-sitekey": "pubkey"}, api_params={"hl": "cl"}
+        )
+        context = widget.get_static_context()
+        self.assertIs(widget.get_static_context(), context)
+        # Copies made for form instances share the cache.
+        self.assertIs(copy.deepcopy(widget).get_static_context(), context)
+
+        widget.api_params["hl"] = "af"
+        self.assertEqual(widget.get_static_context()["api_params"], "hl=af")
+        with override_settings(RECAPTCHA_DOMAIN="www.recaptcha.net"):
+            self.assertEqual(
+                widget.get_static_context()["recaptcha_domain"], "www.recaptcha.net"
+            )
+        self.assertEqual(
+            widget.get_static_context()["recaptcha_domain"], "www.google.com"
+        )
+
     # TODO: DeprecationWarning: remove backwards compatibility test
     def test_field_required_score_attribute_html(self):
         with self.assertWarnsMessage(DeprecationWarning, "required_score"):
@@ -478,3 +734,132 @@ class TestWidgets(TestCase):
         form_params = {"captcha": "PASSED"}
         form = VThreeDomainForm(form_params)
         self.assertFalse(form.is_valid())
+
+
+@override_settings(RECAPTCHA_SHARED_LOADER=True)
+class TestSharedLoader(TestCase):
+    class MultiForm(forms.Form):
+        checkbox = fields.ReCaptchaField()
+        invisible = fields.ReCaptchaField(widget=widgets.ReCaptchaV2Invisible())
+        score = fields.ReCaptchaField(widget=widgets.ReCaptchaV3(action="signup"))
+
+    def render_in_request(self, render):
+        rendered = []
+        middleware = RecaptchaRequestMiddleware(
+            lambda request: rendered.append(render())
+        )
+        middleware(RequestFactory().get("/"))
+        return rendered[0]
+
+    def test_loader_rendered_once_per_request(self):
+        html = self.render_in_request(
+            lambda: self.MultiForm().as_p() + self.MultiForm().as_p()
+        )
+        self.assertEqual(html.count("window.djangoRecaptcha = "), 1)
+        self.assertNotIn("<script src=", html)
+        self.assertNotIn("var onSubmit_", html)
+        self.assertEqual(html.count('class="g-recaptcha"'), 6)
+        self.assertIn('data-action="signup"', html)
+
+    def test_loader_rendered_by_every_widget_without_request(self):
+        html = self.MultiForm().as_p()
+        # The loader itself makes sure api.js is only loaded once.
+        self.assertEqual(html.count("if (window.djangoRecaptcha)"), 3)
+
+    def test_template_tag(self):
+        engine = Engine(
+            libraries={
+                "django_recaptcha": "django_recaptcha.templatetags.django_recaptcha"
+            }
+        )
+        template = engine.from_string(
+            '{% load django_recaptcha %}{% recaptcha_loader hl="fr" %}{{ form }}'
+        )
+        html = self.render_in_request(
+            lambda: template.render(Context({"form": self.MultiForm()}))
+        )
+        self.assertEqual(html.count("window.djangoRecaptcha = "), 1)
+        self.assertIn('var apiParams = "hl\\u003Dfr";', html)
+        self.assertTrue(html.startswith("<script>"))
+
+    def test_v3_prefetch_attribute(self):
+        class PrefetchForm(forms.Form):
+            captcha = fields.ReCaptchaField(widget=widgets.ReCaptchaV3(prefetch=True))
+
+        html = self.render_in_request(PrefetchForm().as_p)
+        self.assertIn('data-prefetch="90000"', html)
+        self.assertIn('data-prefetch-limit="5"', html)
+        self.assertNotIn('data-prefetch="', self.MultiForm().as_p())
+
+    def test_lazy_loading_needs_every_widget(self):
+        class LazyForm(forms.Form):
+            checkbox = fields.ReCaptchaField(
+                widget=widgets.ReCaptchaV2Checkbox(lazy=True)
+            )
+            score = fields.ReCaptchaField(widget=widgets.ReCaptchaV3(lazy=True))
+
+        html = self.render_in_request(LazyForm().as_p)
+        self.assertEqual(html.count(" data-lazy"), 2)
+        self.assertNotIn("djangoRecaptchaLazy", html)
+        # Without the attribute on every widget, api.js is loaded right away.
+        self.assertNotIn(" data-lazy", self.MultiForm().as_p())
+
+    @override_settings(RECAPTCHA_FAST_RENDER=True)
+    def test_fast_render_matches_templates(self):
+        def render_twice():
+            return self.MultiForm().as_p() + self.MultiForm().as_p()
+
+        html = self.render_in_request(render_twice)
+        with override_settings(RECAPTCHA_FAST_RENDER=False):
+            self.assertEqual(self.render_in_request(render_twice), html)
+
+
+class TestResourceHints(TestCase):
+    def render(self, source, **context):
+        engine = Engine(
+            libraries={
+                "django_recaptcha": "django_recaptcha.templatetags.django_recaptcha"
+            }
+        )
+        template = engine.from_string("{% load django_recaptcha %}" + source)
+        return template.render(Context(context))
+
+    def test_preconnect_without_forms(self):
+        html = self.render("{% recaptcha_resource_hints %}")
+        self.assertIn('<link rel="preconnect" href="https://www.google.com">', html)
+        self.assertIn('<link rel="preconnect" href="https://www.gstatic.com">', html)
+        self.assertIn('<link rel="dns-prefetch" href="https://www.google.com">', html)
+
+    @override_settings(RECAPTCHA_DOMAIN="www.recaptcha.net")
+    def test_domain_setting(self):
+        html = self.render("{% recaptcha_resource_hints %}")
+        self.assertIn('<link rel="preconnect" href="https://www.recaptcha.net">', html)
+        self.assertNotIn("www.google.com", html)
+
+    def test_forms_without_recaptcha(self):
+        class PlainForm(forms.Form):
+            name = forms.CharField()
+
+        html = self.render("{% recaptcha_resource_hints form %}", form=PlainForm())
+        self.assertEqual(html, "")
+
+    def test_lazy_widgets_only_prefetch_dns(self):
+        class LazyForm(forms.Form):
+            captcha = fields.ReCaptchaField(
+                widget=widgets.ReCaptchaV3(lazy=True, action="signup")
+            )
+
+        class EagerForm(forms.Form):
+            captcha = fields.ReCaptchaField()
+
+        html = self.render("{% recaptcha_resource_hints form %}", form=LazyForm())
+        self.assertIn('rel="dns-prefetch"', html)
+        self.assertNotIn('rel="preconnect"', html)
+
+        # One widget loading api.js with the page is enough to preconnect.
+        html = self.render(
+            "{% recaptcha_resource_hints form.captcha other %}",
+            form=LazyForm(),
+            other=EagerForm(),
+        )
+        self.assertEqual(html.count('rel="preconnect"'), 2)
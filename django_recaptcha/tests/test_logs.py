@@ -0,0 +1,209 @@
+import logging
+from unittest.mock import patch
+
+from django import forms
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+
+from django_recaptcha import fields, logs, widgets
+from django_recaptcha.client import RecaptchaResponse
+
+
+class LoginForm(forms.Form):
+    captcha = fields.ReCaptchaField(
+        widget=widgets.ReCaptchaV3(action="login", required_score=0.5)
+    )
+
+
+class TestFailureLog(TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("django_recaptcha.tests.failures")
+        self.now = 100.0
+        patcher = patch("django_recaptcha.logs.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("django_recaptcha.logs.threading.Timer")
+        self.timer = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def log_invalid(self, failure_log, error_code="timeout-or-duplicate"):
+        failure_log.log(
+            "invalid",
+            "ReCAPTCHA validation failed due to: %s",
+            ([error_code],),
+            error_codes=[error_code],
+        )
+
+    def test_every_failure_logged_without_window(self):
+        failure_log = logs.FailureLog(self.logger)
+        with self.assertLogs(self.logger) as logged:
+            for _ in range(20):
+                self.log_invalid(failure_log)
+        self.assertEqual(len(logged.records), 20)
+        record = logged.records[0]
+        self.assertEqual(
+            record.getMessage(),
+            "ReCAPTCHA validation failed due to: ['timeout-or-duplicate']",
+        )
+        self.assertEqual(record.recaptcha["reason"], "invalid")
+
+    def test_capped_per_window(self):
+        failure_log = logs.FailureLog(self.logger, window=60, cap=2)
+        with self.assertLogs(self.logger) as logged:
+            for _ in range(5):
+                self.log_invalid(failure_log)
+            # Grouped by error code as well.
+            self.log_invalid(failure_log, "invalid-input-response")
+        self.assertEqual(len(logged.records), 3)
+
+        # Long after the window is over: it is reported as it was.
+        self.now += 600
+        with self.assertLogs(self.logger) as logged:
+            self.log_invalid(failure_log)
+        summary, message = logged.records
+        self.assertEqual(
+            summary.getMessage(),
+            "ReCAPTCHA validation failed 5 times in 60 seconds due to: invalid"
+            " ['timeout-or-duplicate'] (3 not logged).",
+        )
+        self.assertEqual(summary.recaptcha["suppressed"], 3)
+        # A new window has started.
+        self.assertIn("due to: ['timeout-or-duplicate']", message.getMessage())
+
+    def test_closed_on_time(self):
+        failure_log = logs.FailureLog(self.logger, window=60, cap=1)
+        with self.assertLogs(self.logger):
+            self.log_invalid(failure_log)
+        self.timer.assert_not_called()
+        self.now += 20
+        self.log_invalid(failure_log)
+        self.log_invalid(failure_log)
+        # Started once, for the end of the window.
+        self.timer.assert_called_once_with(40, failure_log.on_timer, (100.0,))
+        self.timer.return_value.start.assert_called_once_with()
+
+        self.now += 40
+        with self.assertLogs(self.logger) as logged:
+            failure_log.on_timer(100.0)
+        (summary,) = logged.records
+        self.assertEqual(summary.recaptcha["count"], 3)
+        self.assertEqual(summary.recaptcha["window"], 60)
+
+    def test_stale_timer(self):
+        failure_log = logs.FailureLog(self.logger, window=60, cap=0)
+        self.log_invalid(failure_log)
+        self.now += 60
+        with self.assertLogs(self.logger):
+            self.log_invalid(failure_log)
+        self.timer.return_value.cancel.assert_called_once_with()
+        # Fired all the same, after the failure closed its window.
+        with patch.object(failure_log, "log_summary") as log_summary:
+            failure_log.on_timer(100.0)
+        log_summary.assert_not_called()
+
+    def test_flush(self):
+        failure_log = logs.FailureLog(self.logger, window=60, cap=0)
+        with self.assertLogs(self.logger) as logged:
+            self.log_invalid(failure_log)
+            failure_log.flush()
+        (summary,) = logged.records
+        self.assertEqual(summary.recaptcha["count"], 1)
+
+    def test_lazy_formatting(self):
+        class Unformattable:
+            def __str__(self):
+                raise AssertionError("formatted")
+
+            __repr__ = __str__
+
+        failure_log = logs.FailureLog(self.logger)
+        self.logger.setLevel(logging.ERROR)
+        self.addCleanup(self.logger.setLevel, logging.NOTSET)
+        failure_log.log("invalid", "%s", (Unformattable(),))
+
+    def test_structured(self):
+        failure_log = logs.FailureLog(self.logger, log_format=logs.STRUCTURED)
+        with self.assertLogs(self.logger) as logged:
+            failure_log.log(
+                "low-score",
+                "score of %s",
+                (0.1,),
+                score=0.1,
+                form="Login Form",
+                field=None,
+            )
+        self.assertEqual(
+            logged.records[0].getMessage(),
+            "event=recaptcha_validation_failed reason=low-score error_codes=-"
+            ' score=0.1 form="Login Form" field=-',
+        )
+
+    def test_invalid_format(self):
+        with self.assertRaises(ImproperlyConfigured):
+            logs.FailureLog(self.logger, log_format="json")
+
+
+class TestFieldFailureLog(TestCase):
+    def setUp(self):
+        # Failures are counted by a process-wide log.
+        logs._failure_log = None
+        self.addCleanup(setattr, logs, "_failure_log", None)
+
+    @override_settings(
+        RECAPTCHA_LOG_WINDOW=60, RECAPTCHA_LOG_CAP=1, RECAPTCHA_LOG_FORMAT="structured"
+    )
+    @patch("django_recaptcha.fields.client.submit")
+    def test_low_score(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(
+            is_valid=True, action="login", extra_data={"score": 0.1}
+        )
+        with self.assertLogs("django_recaptcha.fields") as logged:
+            for token in ("first", "second"):
+                self.assertFalse(LoginForm({"captcha": token}).is_valid())
+        (record,) = logged.records
+        self.assertEqual(
+            record.getMessage(),
+            "event=recaptcha_validation_failed reason=low-score error_codes=-"
+            " form=LoginForm field=captcha action=login response_action=login"
+            " score=0.1 required_score=0.5",
+        )
+
+    def test_get_failure_log_follows_settings(self):
+        failure_log = logs.get_failure_log()
+        self.assertIs(logs.get_failure_log(), failure_log)
+        self.assertIsNone(failure_log.window)
+        with override_settings(RECAPTCHA_LOG_WINDOW=30):
+            self.assertEqual(logs.get_failure_log().window, 30)
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_log_warning_override(self, mocked_submit):
+        messages = []
+
+        class CustomField(fields.ReCaptchaField):
+            def log_warning(self, message):
+                messages.append(message)
+
+        class CustomForm(forms.Form):
+            captcha = CustomField(
+                widget=widgets.ReCaptchaV3(action="login", required_score=0.5)
+            )
+
+        for response in (
+            RecaptchaResponse(is_valid=False, error_codes=["invalid-input-response"]),
+            RecaptchaResponse(is_valid=True, action="signup"),
+            RecaptchaResponse(is_valid=True, action="login", extra_data={"score": 0.1}),
+        ):
+            mocked_submit.return_value = response
+            self.assertFalse(CustomForm({"captcha": "token"}).is_valid())
+        self.assertFalse(CustomForm({"captcha": "<script>"}).is_valid())
+        self.assertEqual(
+            messages,
+            [
+                "ReCAPTCHA validation failed due to: ['invalid-input-response']",
+                "ReCAPTCHA validation failed due to: mismatched action. Expected"
+                " 'login' but received 'signup' from captcha server.",
+                "ReCAPTCHA validation failed due to its score of 0.1 being lower"
+                " than the required amount.",
+                "ReCAPTCHA validation failed due to: malformed response.",
+            ],
+        )
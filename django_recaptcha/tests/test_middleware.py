@@ -0,0 +1,64 @@
+from unittest.mock import patch
+
+from django import forms
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from django_recaptcha import fields
+from django_recaptcha.client import RecaptchaResponse
+from django_recaptcha.middleware import RecaptchaRequestMiddleware, get_current_request
+
+
+class DefaultForm(forms.Form):
+    captcha = fields.ReCaptchaField()
+
+
+class TestRecaptchaRequestMiddleware(TestCase):
+    def test_current_request(self):
+        seen = []
+
+        def view(request):
+            seen.append(get_current_request())
+            return HttpResponse()
+
+        incoming = RequestFactory().get("/")
+        RecaptchaRequestMiddleware(view)(incoming)
+        self.assertEqual(seen, [incoming])
+        self.assertIsNone(get_current_request())
+
+    def test_current_request_reset_on_error(self):
+        def view(request):
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            RecaptchaRequestMiddleware(view)(RequestFactory().get("/"))
+        self.assertIsNone(get_current_request())
+
+    async def test_current_request_async(self):
+        seen = []
+
+        async def view(request):
+            seen.append(get_current_request())
+            return HttpResponse()
+
+        incoming = RequestFactory().get("/")
+        await RecaptchaRequestMiddleware(view)(incoming)
+        self.assertEqual(seen, [incoming])
+        self.assertIsNone(get_current_request())
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_field_remote_ip(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+
+        def view(request):
+            DefaultForm(request.POST).is_valid()
+            return HttpResponse()
+
+        RecaptchaRequestMiddleware(view)(
+            RequestFactory().post(
+                "/", {"g-recaptcha-response": "PASSED"}, REMOTE_ADDR="192.0.2.1"
+            )
+        )
+        mocked_submit.assert_called_once_with(
+            recaptcha_response="PASSED", private_key="privkey", remoteip="192.0.2.1"
+        )
@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+from django import forms
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from django_recaptcha import fields, replay
+from django_recaptcha.client import RecaptchaResponse
+
+REPLAY_SETTINGS = {"RECAPTCHA_REPLAY_CACHE": "default"}
+
+
+class DefaultForm(forms.Form):
+    captcha = fields.ReCaptchaField()
+
+
+class TestReplay(TestCase):
+    def tearDown(self):
+        caches["default"].clear()
+
+    def test_claim_disabled(self):
+        self.assertTrue(replay.claim("token"))
+        self.assertTrue(replay.claim("token"))
+
+    @override_settings(**REPLAY_SETTINGS)
+    def test_claim(self):
+        self.assertTrue(replay.claim("token"))
+        self.assertFalse(replay.claim("token"))
+        self.assertTrue(replay.claim("other-token"))
+
+    @override_settings(**REPLAY_SETTINGS)
+    def test_cache_key_is_fingerprint(self):
+        key = replay.get_cache_key("x" * 10000)
+        self.assertEqual(key, replay.get_cache_key("x" * 10000))
+        self.assertNotIn("xxxx", key)
+        self.assertLess(len(key), 64)
+
+    @override_settings(RECAPTCHA_REPLAY_TIMEOUT=30, **REPLAY_SETTINGS)
+    @patch("django_recaptcha.replay.caches")
+    def test_claim_timeout(self, mocked_caches):
+        replay.claim("token")
+        mocked_caches["default"].add.assert_called_with(
+            replay.get_cache_key("token"), 1, 30
+        )
+
+    @override_settings(**REPLAY_SETTINGS)
+    async def test_aclaim(self):
+        self.assertTrue(await replay.aclaim("token"))
+        self.assertFalse(await replay.aclaim("token"))
+
+    @override_settings(**REPLAY_SETTINGS)
+    @patch("django_recaptcha.fields.client.submit")
+    def test_field_rejects_replayed_token(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        form_params = {"g-recaptcha-response": "PASSED"}
+        self.assertTrue(DefaultForm(form_params).is_valid())
+
+        form = DefaultForm(form_params)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()["captcha"][0].code, "captcha_invalid")
+        self.assertEqual(
+            form.fields["captcha"].recaptcha_response.error_codes,
+            ["timeout-or-duplicate"],
+        )
+        mocked_submit.assert_called_once()
@@ -0,0 +1,185 @@
+import asyncio
+import socket
+import threading
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError
+
+from django.test import TestCase, override_settings
+
+from django_recaptcha import client, deadline, retry
+from django_recaptcha.client import RecaptchaResponse
+
+
+def http_error(code):
+    return HTTPError(
+        url="https://www.google.com/recaptcha/api/siteverify",
+        code=code,
+        fp=None,
+        msg="Oops",
+        hdrs="",
+    )
+
+
+@patch("django_recaptcha.retry.time.sleep")
+class TestRetryPolicy(TestCase):
+    def test_is_retryable(self, mocked_sleep):
+        self.assertTrue(retry.is_retryable(http_error(503)))
+        self.assertTrue(retry.is_retryable(ConnectionRefusedError()))
+        self.assertTrue(retry.is_retryable(socket.gaierror()))
+        self.assertFalse(retry.is_retryable(http_error(400)))
+        # The request may have reached Google and used the token up.
+        self.assertFalse(retry.is_retryable(socket.timeout()))
+        self.assertFalse(retry.is_retryable(ValueError()))
+
+    def test_retries_with_jittered_backoff(self, mocked_sleep):
+        func = MagicMock(side_effect=[http_error(503), http_error(502), "ok"])
+        policy = retry.RetryPolicy(retries=2, backoff=0.1)
+        with patch("django_recaptcha.retry.random.uniform") as mocked_uniform:
+            mocked_uniform.side_effect = lambda low, high: high
+            self.assertEqual(policy.call(func, "params"), "ok")
+        func.assert_called_with("params")
+        self.assertEqual(
+            [call.args for call in mocked_uniform.call_args_list],
+            [(0, 0.1), (0, 0.2)],
+        )
+        self.assertEqual(mocked_sleep.call_count, 2)
+
+    def test_gives_up_after_retries(self, mocked_sleep):
+        func = MagicMock(side_effect=http_error(503))
+        with self.assertRaises(HTTPError):
+            retry.RetryPolicy(retries=2).call(func)
+        self.assertEqual(func.call_count, 3)
+
+    def test_does_not_retry_other_errors(self, mocked_sleep):
+        func = MagicMock(side_effect=socket.timeout())
+        with self.assertRaises(socket.timeout):
+            retry.RetryPolicy(retries=2).call(func)
+        func.assert_called_once()
+
+    def test_budget(self, mocked_sleep):
+        func = MagicMock(side_effect=http_error(503))
+        with self.assertRaises(HTTPError):
+            retry.RetryPolicy(retries=5, backoff=1, budget=0).call(func)
+        func.assert_called_once()
+
+    async def test_acall(self, mocked_sleep):
+        attempts = []
+
+        async def func():
+            attempts.append(None)
+            if len(attempts) == 1:
+                raise ConnectionRefusedError()
+            return "ok"
+
+        policy = retry.RetryPolicy(retries=1, backoff=0)
+        self.assertEqual(await policy.acall(func), "ok")
+        self.assertEqual(len(attempts), 2)
+
+    def test_get_retry_policy(self, mocked_sleep):
+        self.assertIsNone(retry.get_retry_policy())
+        with override_settings(RECAPTCHA_RETRIES=3, RECAPTCHA_VERIFY_REQUEST_TIMEOUT=4):
+            policy = retry.get_retry_policy()
+        self.assertEqual(policy.retries, 3)
+        self.assertEqual(policy.budget, 4)
+
+    @override_settings(RECAPTCHA_RETRIES=1)
+    @patch("django_recaptcha.client.recaptcha_request")
+    def test_submit_retries(self, mocked_request, mocked_sleep):
+        read_mock = MagicMock()
+        read_mock.read.return_value = b'{"success": true}'
+        mocked_request.side_effect = [http_error(503), read_mock]
+        self.assertTrue(client.submit("token", "somekey", None).is_valid)
+        self.assertEqual(mocked_request.call_count, 2)
+
+
+class TestHedging(TestCase):
+    def test_latency_tracker(self):
+        tracker = retry.LatencyTracker(size=100, min_samples=10)
+        for duration in range(9):
+            tracker.record(duration)
+        self.assertIsNone(tracker.percentile(95))
+        for duration in range(9, 200):
+            tracker.record(duration)
+        self.assertEqual(tracker.percentile(95), 195)
+
+    def make_calls(self, *outcomes):
+        """
+        Returns a function returning the given (delay, result) outcomes, one
+        per call.
+        """
+        outcomes = iter(outcomes)
+        lock = threading.Lock()
+
+        def func():
+            with lock:
+                delay, result = next(outcomes)
+            threading.Event().wait(delay)
+            return result
+
+        return func
+
+    def test_fast_call_not_hedged(self):
+        func = MagicMock(return_value="ok")
+        self.assertEqual(retry.hedged_call(func, (), 1, bool), "ok")
+        func.assert_called_once()
+
+    def test_threads_reused(self):
+        executor = retry.ElasticExecutor()
+        first = executor.submit(threading.get_ident).result()
+        # Given back to the executor right after the result is set.
+        threading.Event().wait(0.05)
+        self.assertEqual(executor.submit(threading.get_ident).result(), first)
+
+        # A busy thread is not waited for.
+        release = threading.Event()
+        busy = executor.submit(release.wait, 5)
+        self.assertNotEqual(executor.submit(threading.get_ident).result(), first)
+        release.set()
+        self.assertTrue(busy.result())
+
+    def test_idle_threads_exit(self):
+        executor = retry.ElasticExecutor(idle_timeout=0.01)
+        executor.submit(int).result()
+        threading.Event().wait(0.1)
+        self.assertEqual(executor._idle, [])
+
+    def test_executor_outcome(self):
+        executor = retry.ElasticExecutor()
+        with self.assertRaises(ValueError):
+            executor.submit(int, "x").result()
+        with deadline.within(10):
+            self.assertIsNotNone(executor.submit(deadline.remaining).result())
+
+    def test_hedge_answers_first(self):
+        func = self.make_calls((1, "slow"), (0, "fast"))
+        self.assertEqual(retry.hedged_call(func, (), 0.05, bool), "fast")
+
+    def test_rejected_result_waits_for_other_call(self):
+        func = self.make_calls((0.2, "accepted"), (0, ""))
+        self.assertEqual(retry.hedged_call(func, (), 0.05, bool), "accepted")
+
+    async def test_ahedged_call(self):
+        calls = []
+
+        async def func():
+            calls.append(None)
+            await asyncio.sleep(1 if len(calls) == 1 else 0)
+            return len(calls)
+
+        self.assertEqual(await retry.ahedged_call(func, (), 0.05, bool), 2)
+
+    @override_settings(RECAPTCHA_HEDGE=True)
+    @patch("django_recaptcha.client.latencies")
+    @patch("django_recaptcha.client.hedged_call")
+    def test_submit_hedged(self, mocked_hedged_call, mocked_latencies):
+        mocked_latencies.percentile.return_value = 0.3
+        mocked_hedged_call.return_value = RecaptchaResponse(is_valid=True)
+        self.assertTrue(client.submit("token", "somekey", None).is_valid)
+        self.assertEqual(mocked_hedged_call.call_args.args[2], 0.3)
+        accept = mocked_hedged_call.call_args.kwargs["accept"]
+        self.assertFalse(
+            accept(
+                RecaptchaResponse(is_valid=False, error_codes=["timeout-or-duplicate"])
+            )
+        )
+        self.assertTrue(accept(RecaptchaResponse(is_valid=True)))
@@ -0,0 +1,177 @@
+import itertools
+from unittest.mock import patch
+
+from django import forms
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+
+from django_recaptcha import client, fields, logs, retry, shedding, widgets
+from django_recaptcha.client import RecaptchaResponse
+from django_recaptcha.signals import field_validated
+
+
+class DefaultForm(forms.Form):
+    captcha = fields.ReCaptchaField()
+
+
+class NewsletterForm(forms.Form):
+    captcha = fields.ReCaptchaField(widget=widgets.ReCaptchaV3(action="newsletter"))
+
+
+class TestVerificationPolicy(TestCase):
+    def test_sampling(self):
+        policy = shedding.VerificationPolicy(sample_rate=0.25)
+        with patch("django_recaptcha.shedding.random.random", return_value=0.2):
+            self.assertEqual(policy.decide(), shedding.SAMPLED)
+        with patch("django_recaptcha.shedding.random.random", return_value=0.3):
+            self.assertEqual(policy.decide(), (shedding.SKIP, "unsampled"))
+
+    def test_in_flight(self):
+        policy = shedding.VerificationPolicy(max_in_flight=1, shed=shedding.FAIL)
+        self.assertEqual(policy.decide(), shedding.SAMPLED)
+        with client.in_flight:
+            self.assertEqual(policy.decide(), (shedding.FAIL, "in-flight"))
+        self.assertEqual(client.in_flight.count, 0)
+
+    def test_latency(self):
+        policy = shedding.VerificationPolicy(max_latency=1, probe_rate=0)
+        with patch.object(policy, "get_latency", return_value=None):
+            # Too few requests to tell.
+            self.assertEqual(policy.decide(), shedding.SAMPLED)
+        with patch.object(policy, "get_latency", return_value=1.5):
+            self.assertEqual(policy.decide(), (shedding.SKIP, "latency"))
+
+    def test_latency_expires(self):
+        tracker = retry.LatencyTracker()
+        policy = shedding.VerificationPolicy(max_latency=1, probe_rate=0)
+        with patch("django_recaptcha.retry.time.monotonic", return_value=1000):
+            for _ in range(50):
+                tracker.record(2)
+        with patch.object(client, "latencies", tracker):
+            with patch("django_recaptcha.retry.time.monotonic", return_value=1030):
+                self.assertEqual(policy.decide(), (shedding.SKIP, "latency"))
+            # The slow requests are too old to tell anymore.
+            with patch("django_recaptcha.retry.time.monotonic", return_value=1061):
+                self.assertEqual(policy.decide(), shedding.SAMPLED)
+
+    def test_probe(self):
+        policy = shedding.VerificationPolicy(max_latency=1, probe_rate=0.1)
+        with patch.object(policy, "get_latency", return_value=1.5):
+            with patch("django_recaptcha.shedding.random.random", return_value=0.05):
+                self.assertEqual(policy.decide(), shedding.PROBE)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ImproperlyConfigured):
+            shedding.VerificationPolicy(sample_rate=2)
+        with self.assertRaises(ImproperlyConfigured):
+            shedding.VerificationPolicy(shed="verify")
+
+    @override_settings(
+        RECAPTCHA_VERIFICATION_POLICIES={
+            "newsletter": {"sample_rate": 0.1},
+            "*": {"max_in_flight": 20},
+        }
+    )
+    def test_get_policy(self):
+        self.assertEqual(shedding.get_policy("newsletter").sample_rate, 0.1)
+        self.assertEqual(shedding.get_policy("login").max_in_flight, 20)
+        self.assertEqual(shedding.get_policy().max_in_flight, 20)
+        with override_settings(RECAPTCHA_VERIFICATION_POLICIES={}):
+            self.assertIsNone(shedding.get_policy("login"))
+
+
+class TestFieldPolicy(TestCase):
+    def setUp(self):
+        self.outcomes = []
+
+        def receive(sender, outcome, **kwargs):
+            self.outcomes.append(outcome)
+
+        field_validated.connect(receive)
+        self.addCleanup(field_validated.disconnect, receive)
+
+    @override_settings(
+        RECAPTCHA_VERIFICATION_POLICIES={"newsletter": {"sample_rate": 0}}
+    )
+    @patch("django_recaptcha.fields.client.submit")
+    def test_unsampled_accepted(self, mocked_submit):
+        form = NewsletterForm({"captcha": "token"})
+        self.assertTrue(form.is_valid())
+        mocked_submit.assert_not_called()
+        self.assertEqual(self.outcomes, ["unsampled"])
+        self.assertEqual(form.fields["captcha"].decision.reason, "unsampled")
+
+        # Other actions are verified.
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        self.assertTrue(DefaultForm({"g-recaptcha-response": "token"}).is_valid())
+        mocked_submit.assert_called_once()
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_shed(self, mocked_submit):
+        field = DefaultForm.base_fields["captcha"]
+        for shed, valid, outcome in (
+            (shedding.SKIP, True, "shed"),
+            (shedding.FAIL, False, "overloaded"),
+        ):
+            policy = shedding.VerificationPolicy(max_in_flight=0, shed=shed)
+            with patch.object(field, "policy", policy):
+                form = DefaultForm({"g-recaptcha-response": "token"})
+                self.assertEqual(form.is_valid(), valid)
+            self.assertEqual(self.outcomes[-1], outcome)
+            self.assertEqual(form.fields["captcha"].decision, (shed, "in-flight"))
+        mocked_submit.assert_not_called()
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_shedding_stops_once_latency_recovers(self, mocked_submit):
+        tracker = retry.LatencyTracker()
+        for _ in range(50):
+            tracker.record(2)
+
+        def submit(**kwargs):
+            tracker.record(0.1)
+            return RecaptchaResponse(is_valid=True)
+
+        mocked_submit.side_effect = submit
+        field = DefaultForm.base_fields["captcha"]
+        policy = shedding.VerificationPolicy(max_latency=1, probe_rate=0.3)
+        draws = itertools.cycle([0.1, 0.5, 0.9])
+        with patch.object(client, "latencies", tracker), patch.object(
+            field, "policy", policy
+        ), patch("django_recaptcha.shedding.random.random", lambda: next(draws)):
+            for index in range(300):
+                form = DefaultForm({"g-recaptcha-response": "token%d" % index})
+                self.assertTrue(form.is_valid())
+        # Probes brought the median down, after which every value is verified.
+        self.assertEqual(self.outcomes[-10:], ["valid"] * 10)
+        self.assertGreater(mocked_submit.call_count, 100)
+
+    @override_settings(RECAPTCHA_LOG_WINDOW=60, RECAPTCHA_LOG_CAP=2)
+    def test_shed_warnings_capped(self):
+        logs._failure_log = None
+        self.addCleanup(setattr, logs, "_failure_log", None)
+        field = DefaultForm.base_fields["captcha"]
+        policy = shedding.VerificationPolicy(max_in_flight=0)
+        with patch.object(field, "policy", policy):
+            with self.assertLogs("django_recaptcha.fields") as logged:
+                for index in range(10):
+                    DefaultForm({"g-recaptcha-response": "token%d" % index}).is_valid()
+        self.assertEqual(
+            logged.output,
+            [
+                "WARNING:django_recaptcha.fields:ReCAPTCHA validation skipped:"
+                " verification shed (in-flight)."
+            ]
+            * 2,
+        )
+
+    @patch("django_recaptcha.fields.client.asubmit")
+    async def test_averify_follows_decision(self, mocked_asubmit):
+        form = DefaultForm({"g-recaptcha-response": "token"})
+        field = form.fields["captcha"]
+        field.policy = shedding.VerificationPolicy(sample_rate=0.5)
+        with patch("django_recaptcha.shedding.random.random", side_effect=[0.9, 0.1]):
+            await fields.averify_form(form)
+            # The decision is not taken again for the same value.
+            self.assertTrue(form.is_valid())
+        mocked_asubmit.assert_not_called()
+        self.assertEqual(self.outcomes, ["unsampled"])
@@ -0,0 +1,112 @@
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError
+
+from django import forms
+from django.test import TestCase
+
+from django_recaptcha import client, fields, widgets
+from django_recaptcha.client import RecaptchaResponse
+from django_recaptcha.signals import field_validated, verify_request_finished
+
+
+class DefaultForm(forms.Form):
+    captcha = fields.ReCaptchaField()
+
+
+class VThreeForm(forms.Form):
+    captcha = fields.ReCaptchaField(
+        widget=widgets.ReCaptchaV3(action="signup", required_score=0.5)
+    )
+
+
+class TestSignals(TestCase):
+    def connect(self, signal):
+        receiver = MagicMock()
+        signal.connect(receiver)
+        self.addCleanup(signal.disconnect, receiver)
+        return receiver
+
+    @patch("django_recaptcha.client.recaptcha_request")
+    def test_verify_request_finished(self, mocked_request):
+        receiver = self.connect(verify_request_finished)
+        read_mock = MagicMock()
+        read_mock.read.return_value = b'{"success": true}'
+        mocked_request.return_value = read_mock
+        response = client.submit("token", "somekey", None)
+
+        kwargs = receiver.call_args.kwargs
+        self.assertIs(kwargs["response"], response)
+        self.assertIsNone(kwargs["error"])
+        self.assertGreaterEqual(kwargs["duration"], 0)
+
+        error = HTTPError(
+            url="https://www.google.com/recaptcha/api/siteverify",
+            code=500,
+            fp=None,
+            msg="Oops",
+            hdrs="",
+        )
+        mocked_request.side_effect = error
+        with self.assertRaises(HTTPError):
+            client.submit("token", "somekey", None)
+        kwargs = receiver.call_args.kwargs
+        self.assertIsNone(kwargs["response"])
+        self.assertIs(kwargs["error"], error)
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_field_validated(self, mocked_submit):
+        receiver = self.connect(field_validated)
+        response = RecaptchaResponse(
+            is_valid=True, extra_data={"score": 0.9}, action="signup"
+        )
+        mocked_submit.return_value = response
+        form = VThreeForm({"captcha": "PASSED"})
+        self.assertTrue(form.is_valid())
+
+        kwargs = receiver.call_args.kwargs
+        self.assertEqual(receiver.call_args.kwargs["sender"], fields.ReCaptchaField)
+        self.assertIs(kwargs["field"], form.fields["captcha"])
+        self.assertIs(kwargs["form_class"], VThreeForm)
+        self.assertEqual(kwargs["field_name"], "captcha")
+        self.assertEqual(kwargs["outcome"], "valid")
+        self.assertIs(kwargs["response"], response)
+        self.assertGreaterEqual(kwargs["duration"], 0)
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_field_validated_outcomes(self, mocked_submit):
+        receiver = self.connect(field_validated)
+        cases = [
+            ("not a token", RecaptchaResponse(is_valid=True), "malformed"),
+            ("PASSED", RecaptchaResponse(is_valid=False), "invalid"),
+            (
+                "PASSED",
+                RecaptchaResponse(is_valid=True, action="login"),
+                "action-mismatch",
+            ),
+            (
+                "PASSED",
+                RecaptchaResponse(
+                    is_valid=True, extra_data={"score": 0.1}, action="signup"
+                ),
+                "low-score",
+            ),
+        ]
+        for value, response, outcome in cases:
+            with self.subTest(outcome=outcome):
+                mocked_submit.return_value = response
+                self.assertFalse(VThreeForm({"captcha": value}).is_valid())
+                self.assertEqual(receiver.call_args.kwargs["outcome"], outcome)
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_field_validated_error(self, mocked_submit):
+        receiver = self.connect(field_validated)
+        mocked_submit.side_effect = HTTPError(
+            url="https://www.google.com/recaptcha/api/siteverify",
+            code=500,
+            fp=None,
+            msg="Oops",
+            hdrs="",
+        )
+        self.assertFalse(DefaultForm({"g-recaptcha-response": "PASSED"}).is_valid())
+        self.assertEqual(receiver.call_args.kwargs["outcome"], "error")
+        self.assertIsNone(receiver.call_args.kwargs["response"])
@@ -0,0 +1,262 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django import forms
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from django_recaptcha import fields, singleflight
+from django_recaptcha.client import RecaptchaResponse
+
+
+class DefaultForm(forms.Form):
+    captcha = fields.ReCaptchaField()
+
+
+class BlockingCall:
+    """
+    Counts its calls, each of which blocks until released.
+    """
+
+    def __init__(self, result="result", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, *args):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class TestSingleFlight(TestCase):
+    def test_concurrent_calls_share_one(self):
+        group = singleflight.SingleFlight()
+        call = BlockingCall()
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [
+                executor.submit(group.call, "key", call, "arg") for _ in range(5)
+            ]
+            call.started.wait(5)
+            # Let the followers reach the wait before releasing the leader.
+            threading.Event().wait(0.05)
+            call.release.set()
+            results = [future.result() for future in futures]
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(call.calls, 1)
+
+        # Later calls are not coalesced with finished ones.
+        self.assertEqual(group.call("key", lambda: "again"), "again")
+
+    def test_error_shared(self):
+        group = singleflight.SingleFlight()
+        call = BlockingCall(error=ValueError("boom"))
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(group.call, "key", call) for _ in range(3)]
+            call.started.wait(5)
+            threading.Event().wait(0.05)
+            call.release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+        self.assertEqual(call.calls, 1)
+
+    async def test_acall(self):
+        group = singleflight.SingleFlight()
+        calls = []
+
+        async def verify(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value.upper()
+
+        results = await asyncio.gather(
+            *(group.acall("key", verify, "token") for _ in range(5)),
+            group.acall("other", verify, "other"),
+        )
+        self.assertEqual(results, ["TOKEN"] * 5 + ["OTHER"])
+        self.assertEqual(calls, ["token", "other"])
+
+    async def test_acall_waiter_cancelled(self):
+        group = singleflight.SingleFlight()
+        release = asyncio.Event()
+
+        async def verify():
+            await release.wait()
+            return "result"
+
+        leader = asyncio.ensure_future(group.acall("key", verify))
+        follower = asyncio.ensure_future(group.acall("key", verify))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+        # The call goes on for the waiters that are left.
+        self.assertEqual(await follower, "result")
+
+    def test_disabled_by_default(self):
+        self.assertFalse(singleflight.is_enabled())
+        calls = []
+        singleflight.call("key", calls.append, 1)
+        singleflight.call("key", calls.append, 2)
+        self.assertEqual(calls, [1, 2])
+
+
+@override_settings(RECAPTCHA_SINGLE_FLIGHT_CACHE="default")
+class TestCacheLock(TestCase):
+    def setUp(self):
+        self.cache = caches["default"]
+        self.lock_key, self.result_key = singleflight.get_cache_keys("key")
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def test_leader_shares_result(self):
+        results = []
+
+        def verify():
+            # Another process finds this call in progress.
+            results.append(self.cache.get(self.lock_key))
+            return "result"
+
+        self.assertEqual(singleflight.call("key", verify), "result")
+        (flight_id,) = results
+        self.assertEqual(self.cache.get(self.result_key % flight_id), "result")
+        # The lock goes with the call.
+        self.assertIsNone(self.cache.get(self.lock_key))
+
+    def test_later_call_not_shared(self):
+        calls = []
+        for _ in range(3):
+            singleflight.call("key", calls.append, 1)
+        self.assertEqual(calls, [1, 1, 1])
+
+    def test_waits_for_other_process(self):
+        # Another process holds the lock and answers shortly.
+        self.cache.add(self.lock_key, "theirs")
+        timer = threading.Timer(
+            0.1, self.cache.set, (self.result_key % "theirs", "their result")
+        )
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(singleflight.call("key", lambda: "ours"), "their result")
+
+    def test_ignores_result_of_other_call(self):
+        # Stored by a call that finished before this one started.
+        self.cache.set(self.result_key % "earlier", "their result")
+        self.cache.add(self.lock_key, "theirs")
+        timer = threading.Timer(0.1, self.cache.delete, (self.lock_key,))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(singleflight.call("key", lambda: "ours"), "ours")
+
+    def test_takes_over_after_failed_leader(self):
+        self.cache.add(self.lock_key, 1)
+        timer = threading.Timer(0.1, self.cache.delete, (self.lock_key,))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(singleflight.call("key", lambda: "ours"), "ours")
+
+    @override_settings(RECAPTCHA_SINGLE_FLIGHT_TIMEOUT=0.1)
+    def test_gives_up_waiting(self):
+        self.cache.add(self.lock_key, 1, 60)
+        self.assertEqual(singleflight.call("key", lambda: "ours"), "ours")
+
+    def test_error_releases_lock(self):
+        def fail():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            singleflight.call("key", fail)
+        self.assertIsNone(self.cache.get(self.lock_key))
+
+    async def test_acall(self):
+        async def verify():
+            return "result"
+
+        self.assertEqual(await singleflight.acall("key", verify), "result")
+        self.assertIsNone(await self.cache.aget(self.lock_key))
+
+    async def test_acall_waits_for_other_process(self):
+        await self.cache.aadd(self.lock_key, "theirs")
+        timer = threading.Timer(
+            0.1, self.cache.set, (self.result_key % "theirs", "their result")
+        )
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        async def verify():
+            return "ours"
+
+        self.assertEqual(await singleflight.acall("key", verify), "their result")
+
+
+class TestFieldSingleFlight(TestCase):
+    def tearDown(self):
+        caches["default"].clear()
+
+    @override_settings(RECAPTCHA_SINGLE_FLIGHT=True, RECAPTCHA_REPLAY_CACHE="default")
+    @patch("django_recaptcha.fields.client.submit")
+    def test_concurrent_validations_share_verification(self, mocked_submit):
+        started = threading.Barrier(2)
+
+        def submit(**kwargs):
+            # Hold the verification until another validation has started.
+            started.wait(5)
+            threading.Event().wait(0.05)
+            return RecaptchaResponse(is_valid=True)
+
+        mocked_submit.side_effect = submit
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            other = executor.submit(
+                lambda: DefaultForm({"g-recaptcha-response": "token"}).is_valid()
+            )
+            started.wait(5)
+            # Neither this validation nor the replay guard asks again.
+            self.assertTrue(DefaultForm({"g-recaptcha-response": "token"}).is_valid())
+            self.assertTrue(other.result())
+        self.assertEqual(mocked_submit.call_count, 1)
+
+    @override_settings(
+        RECAPTCHA_SINGLE_FLIGHT_CACHE="default", RECAPTCHA_REPLAY_CACHE="default"
+    )
+    @patch("django_recaptcha.fields.client.submit")
+    def test_sequential_validations_not_shared(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        self.assertTrue(DefaultForm({"g-recaptcha-response": "token"}).is_valid())
+        # The replay guard rejects the token, rather than a stored outcome
+        # letting it pass again.
+        for _ in range(2):
+            form = DefaultForm({"g-recaptcha-response": "token"})
+            self.assertFalse(form.is_valid())
+        self.assertEqual(mocked_submit.call_count, 1)
+
+    @override_settings(RECAPTCHA_SINGLE_FLIGHT_CACHE="default")
+    @patch("django_recaptcha.fields.client.submit")
+    def test_sequential_validations_verified(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(
+            is_valid=False, error_codes=["timeout-or-duplicate"]
+        )
+        for _ in range(2):
+            self.assertFalse(DefaultForm({"g-recaptcha-response": "token"}).is_valid())
+        self.assertEqual(mocked_submit.call_count, 2)
+
+    @override_settings(RECAPTCHA_SINGLE_FLIGHT=True)
+    @patch("django_recaptcha.fields.client.asubmit")
+    async def test_concurrent_async_validations(self, mocked_asubmit):
+        async def asubmit(**kwargs):
+            await asyncio.sleep(0.01)
+            return RecaptchaResponse(is_valid=True)
+
+        mocked_asubmit.side_effect = asubmit
+        bound_forms = [DefaultForm({"g-recaptcha-response": "token"}) for _ in range(3)]
+        await asyncio.gather(*(fields.averify_form(form) for form in bound_forms))
+        self.assertEqual(mocked_asubmit.call_count, 1)
+        for form in bound_forms:
+            self.assertTrue(form.is_valid())
@@ -0,0 +1,112 @@
+import random
+from http.client import RemoteDisconnected
+from urllib.error import HTTPError
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from django_recaptcha import client, transports
+from django_recaptcha.exceptions import NetworkError
+from django_recaptcha.siteverify import SiteverifyServer, parse_latency
+
+
+class TestSiteverifyServer(TestCase):
+    def serve(self, **kwargs):
+        server = SiteverifyServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        settings = override_settings(**server.get_settings())
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(lambda: transports.get_transport().close())
+        return server
+
+    def test_valid(self):
+        server = self.serve(score=0.7, action="signup")
+        response = client.submit("token", "somekey", "0.0.0.0")
+        self.assertTrue(response.is_valid)
+        self.assertEqual(response.action, "signup")
+        self.assertEqual(response.extra_data["score"], 0.7)
+        self.assertEqual(response.extra_data["hostname"], "localhost")
+        self.assertEqual(server.stats, {"valid": 1})
+
+    def test_duplicate(self):
+        self.serve()
+        self.assertTrue(client.submit("token", "somekey", "0.0.0.0").is_valid)
+        response = client.submit("token", "somekey", "0.0.0.0")
+        self.assertFalse(response.is_valid)
+        self.assertEqual(response.error_codes, ["timeout-or-duplicate"])
+
+    def test_invalid(self):
+        self.serve(invalid_rate=1, error_codes=["bad-request"])
+        response = client.submit("token", "somekey", "0.0.0.0")
+        self.assertFalse(response.is_valid)
+        self.assertEqual(response.error_codes, ["bad-request"])
+
+    def test_secret(self):
+        self.serve(secret="somekey")
+        self.assertTrue(client.submit("token", "somekey", "0.0.0.0").is_valid)
+        response = client.submit("other", "otherkey", "0.0.0.0")
+        self.assertEqual(response.error_codes, ["invalid-input-secret"])
+
+    def test_error(self):
+        server = self.serve(error_rate=1, error_status=502)
+        with self.assertRaises(HTTPError) as error:
+            client.submit("token", "somekey", "0.0.0.0")
+        self.assertEqual(error.exception.code, 502)
+        self.assertEqual(server.stats, {"error": 1})
+
+    def test_drop(self):
+        self.serve(drop_rate=1)
+        with self.assertRaises(NetworkError) as error:
+            client.submit("token", "somekey", "0.0.0.0")
+        self.assertIsInstance(error.exception.__cause__, RemoteDisconnected)
+
+    def test_urllib_transport(self):
+        with SiteverifyServer() as server, override_settings(
+            RECAPTCHA_TRANSPORT="django_recaptcha.transports.UrllibTransport",
+            **server.get_settings(),
+        ):
+            self.assertTrue(client.submit("token", "somekey", "0.0.0.0").is_valid)
+
+    def test_seed(self):
+        outcomes = []
+        for _ in range(2):
+            server = self.serve(invalid_rate=0.5, seed=1)
+            outcomes.append(
+                [
+                    client.submit(str(token), "somekey", None).is_valid
+                    for token in range(10)
+                ]
+            )
+        self.assertEqual(outcomes[0], outcomes[1])
+        self.assertEqual(sum(server.stats.values()), 10)
+
+    async def test_asubmit(self):
+        with SiteverifyServer() as server:
+            with override_settings(**server.get_settings()):
+                response = await client.asubmit("token", "somekey", "0.0.0.0")
+                # The kept-alive connection is closed with the event loop.
+                transports.get_transport().get_async_pool().clear()
+        self.assertTrue(response.is_valid)
+
+
+class TestParseLatency(TestCase):
+    def test_fixed(self):
+        self.assertEqual(parse_latency(0.5)(random.Random()), 0.5)
+        self.assertEqual(parse_latency("fixed:0.5")(random.Random()), 0.5)
+
+    def test_distributions(self):
+        rng = random.Random(0)
+        self.assertTrue(0.1 <= parse_latency("uniform:0.1,0.2")(rng) <= 0.2)
+        self.assertGreater(parse_latency("lognormal:0.04,0.3")(rng), 0)
+        self.assertGreater(parse_latency("exponential:0.04")(rng), 0)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            parse_latency("normal:1,2")
+
+
+class TestCommand(TestCase):
+    def test_invalid_port(self):
+        with self.assertRaises(CommandError):
+            call_command("recaptcha_siteverify", "127.0.0.1:port")
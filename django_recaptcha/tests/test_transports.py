@@ -0,0 +1,374 @@
+import asyncio
+import os
+import socket
+import ssl
+import sys
+from http.client import RemoteDisconnected
+from io import BytesIO
+from unittest import skipIf
+from unittest.mock import ANY, MagicMock, patch
+from urllib.error import HTTPError, URLError
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+
+from django_recaptcha import client, exceptions, transports
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class RecordingTransport(transports.BaseTransport):
+    def __init__(self, domain, body=b'{"success": true}', **kwargs):
+        super().__init__(domain, **kwargs)
+        self.body = body
+        self.requests = []
+
+    def request(self, path, body, headers):
+        self.requests.append((path, body, headers))
+        return BytesIO(self.body)
+
+
+@override_settings(
+    RECAPTCHA_TRANSPORT="django_recaptcha.tests.test_transports.RecordingTransport"
+)
+class TestTransportSetting(TestCase):
+    def setUp(self):
+        transports.get_transport().requests.clear()
+
+    def test_submit(self):
+        response = client.submit("token", "somekey", "0.0.0.0")
+        self.assertTrue(response.is_valid)
+        path, body, headers = transports.get_transport().requests[0]
+        self.assertEqual(path, "/recaptcha/api/siteverify")
+        self.assertEqual(body, b"secret=somekey&response=token&remoteip=0.0.0.0")
+        self.assertEqual(headers["User-agent"], "reCAPTCHA Django")
+
+    async def test_asubmit_runs_request_in_thread(self):
+        response = await client.asubmit("token", "somekey", "0.0.0.0")
+        self.assertTrue(response.is_valid)
+        self.assertEqual(len(transports.get_transport().requests), 1)
+
+    @override_settings(
+        RECAPTCHA_TRANSPORT_OPTIONS={"body": b'{"success": false}'},
+        RECAPTCHA_DOMAIN="www.recaptcha.net",
+        RECAPTCHA_VERIFY_REQUEST_TIMEOUT=3,
+    )
+    def test_options(self):
+        transport = transports.get_transport()
+        self.assertEqual(transport.domain, "www.recaptcha.net")
+        self.assertEqual(transport.timeout, 3)
+        self.assertFalse(client.submit("token", "somekey", "0.0.0.0").is_valid)
+
+    def test_transport_follows_settings(self):
+        transport = transports.get_transport()
+        self.assertIs(transports.get_transport(), transport)
+        with patch.object(transport, "close") as mocked_close:
+            with override_settings(RECAPTCHA_CONNECTION_POOL_SIZE=2):
+                self.assertEqual(transports.get_transport().pool_size, 2)
+            mocked_close.assert_called_with()
+        self.assertIsNot(transports.get_transport(), transport)
+
+    def test_transport_reset_after_fork(self):
+        transport = transports.get_transport()
+        transports._reset_transport()
+        self.assertIsNot(transports.get_transport(), transport)
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self):
+        transports.get_transport().close()
+
+    def tearDown(self):
+        transports.get_transport().close()
+
+    def mock_connection(self, body=b'{"success": true}', status=200, will_close=False):
+        connection = MagicMock()
+        response = connection.getresponse.return_value
+        response.status = status
+        response.reason = "Reason"
+        response.will_close = will_close
+        response.read.return_value = body
+        return connection
+
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_connection_reused(self, mocked_connection):
+        mocked_connection.return_value = self.mock_connection()
+        client.submit("token", "somekey", "0.0.0.0")
+        client.submit("token", "somekey", "0.0.0.0")
+        self.assertEqual(mocked_connection.call_count, 1)
+        self.assertEqual(mocked_connection.return_value.request.call_count, 2)
+
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_connection_not_reused_when_closed_by_server(self, mocked_connection):
+        mocked_connection.side_effect = [
+            self.mock_connection(will_close=True),
+            self.mock_connection(will_close=True),
+        ]
+        client.submit("token", "somekey", "0.0.0.0")
+        client.submit("token", "somekey", "0.0.0.0")
+        self.assertEqual(mocked_connection.call_count, 2)
+
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_stale_connection_retried(self, mocked_connection):
+        stale = self.mock_connection()
+        fresh = self.mock_connection()
+        mocked_connection.side_effect = [stale, fresh]
+        client.submit("token", "somekey", "0.0.0.0")
+
+        stale.request.side_effect = RemoteDisconnected()
+        response = client.submit("token", "somekey", "0.0.0.0")
+        self.assertTrue(response.is_valid)
+        stale.close.assert_called_with()
+        self.assertEqual(fresh.request.call_count, 1)
+
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_fresh_connection_not_retried(self, mocked_connection):
+        connection = self.mock_connection()
+        connection.request.side_effect = ConnectionResetError()
+        mocked_connection.return_value = connection
+        with self.assertRaises(exceptions.NetworkError) as error:
+            client.submit("token", "somekey", "0.0.0.0")
+        self.assertIsInstance(error.exception.__cause__, ConnectionResetError)
+        self.assertEqual(mocked_connection.call_count, 1)
+
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_error_status_raises_http_error(self, mocked_connection):
+        mocked_connection.return_value = self.mock_connection(status=500)
+        with self.assertRaises(HTTPError) as error:
+            client.submit("token", "somekey", "0.0.0.0")
+        self.assertEqual(error.exception.code, 500)
+
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_pool_size(self, mocked_connection):
+        pool = transports.ConnectionPool("www.google.com", maxsize=1)
+        first, second = MagicMock(), MagicMock()
+        pool.put_connection(first)
+        pool.put_connection(second)
+        second.close.assert_called_with()
+        self.assertEqual(pool.get_connection(), (first, True))
+        self.assertEqual(pool.get_connection(), (mocked_connection.return_value, False))
+
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_ssl_context_shared(self, mocked_connection):
+        pool = transports.ConnectionPool("www.google.com")
+        pool.new_connection()
+        pool.new_connection()
+        contexts = [call.kwargs["context"] for call in mocked_connection.call_args_list]
+        self.assertIsInstance(contexts[0], ssl.SSLContext)
+        self.assertIs(contexts[0], contexts[1])
+
+    def test_async_pool_per_loop(self):
+        transport = transports.PooledTransport("www.google.com")
+
+        async def get_pools():
+            return transport.get_async_pool(), transport.get_async_pool()
+
+        first, same = asyncio.run(get_pools())
+        self.assertIs(first, same)
+        self.assertIs(first.ssl_context, transport.pool.ssl_context)
+        second, _ = asyncio.run(get_pools())
+        self.assertIsNot(second, first)
+        # The pool of the closed loop was dropped.
+        self.assertEqual(list(transport._async_pools.values()), [second])
+
+    def test_pool_follows_settings(self):
+        pool = transports.get_transport().pool
+        with override_settings(RECAPTCHA_VERIFY_REQUEST_TIMEOUT=3):
+            self.assertIsNot(transports.get_transport().pool, pool)
+            self.assertEqual(transports.get_transport().pool.timeout, 3)
+        with override_settings(RECAPTCHA_CONNECTION_POOL_SIZE=2):
+            self.assertEqual(transports.get_transport().pool.maxsize, 2)
+
+
+class TestEnvironmentProxy(TestCase):
+    @patch.dict(os.environ, {"HTTPS_PROXY": "http://proxy.example.com:3128"})
+    def test_environment_proxy(self):
+        transport = transports.PooledTransport("www.google.com")
+        self.assertEqual(transport.pool.proxy, "http://proxy.example.com:3128")
+
+        # A configured proxy wins.
+        transport = transports.PooledTransport(
+            "www.google.com", proxy="http://other.example.com:8080"
+        )
+        self.assertEqual(transport.pool.proxy, "http://other.example.com:8080")
+
+    @patch.dict(
+        os.environ,
+        {"HTTPS_PROXY": "http://proxy.example.com:3128", "NO_PROXY": ".google.com"},
+    )
+    def test_no_proxy(self):
+        self.assertIsNone(transports.PooledTransport("www.google.com").pool.proxy)
+        self.assertEqual(
+            transports.PooledTransport("www.recaptcha.net").pool.proxy,
+            "http://proxy.example.com:3128",
+        )
+
+    @patch.dict(os.environ, {"HTTPS_PROXY": "http://proxy.example.com:3128"})
+    @patch("django_recaptcha.transports.HTTPSConnection")
+    def test_request_tunneled(self, mocked_connection):
+        response = mocked_connection.return_value.getresponse.return_value
+        response.status = 200
+        response.read.return_value = b'{"success": true}'
+        transports.PooledTransport("www.google.com").request(
+            "/recaptcha/api/siteverify", b"", {}
+        )
+        mocked_connection.assert_called_with(
+            "proxy.example.com", 3128, timeout=None, context=ANY
+        )
+        mocked_connection.return_value.set_tunnel.assert_called_with(
+            "www.google.com", headers={}
+        )
+
+
+@override_settings(RECAPTCHA_TRANSPORT="django_recaptcha.transports.UrllibTransport")
+class TestUrllibTransport(TestCase):
+    def setUp(self):
+        # The opener is built with the transport, which must see the patch.
+        transports._reset_transport()
+        self.addCleanup(transports._reset_transport)
+
+    @patch("django_recaptcha.transports.build_opener")
+    def test_request(self, mocked_opener):
+        mocked_opener.return_value.open.return_value = BytesIO(b'{"success": true}')
+        response = client.submit("token", "somekey", "0.0.0.0")
+        self.assertTrue(response.is_valid)
+
+        mocked_opener.assert_called_with()
+        (request,) = mocked_opener.return_value.open.call_args.args
+        self.assertEqual(
+            request.full_url, "https://www.google.com/recaptcha/api/siteverify"
+        )
+        self.assertEqual(
+            request.data, b"secret=somekey&response=token&remoteip=0.0.0.0"
+        )
+        self.assertEqual(
+            mocked_opener.return_value.open.call_args.kwargs, {"timeout": 10}
+        )
+
+    @patch("django_recaptcha.transports.ProxyHandler")
+    @patch("django_recaptcha.transports.build_opener")
+    @override_settings(RECAPTCHA_PROXY={"https": "http://bbbb.com:3128"})
+    def test_proxy(self, mocked_opener, mocked_handler):
+        mocked_opener.return_value.open.return_value = BytesIO(b'{"success": true}')
+        client.submit("token", "somekey", "0.0.0.0")
+        mocked_handler.assert_called_with({"https": "http://bbbb.com:3128"})
+        mocked_opener.assert_called_with(mocked_handler.return_value)
+
+    @patch("django_recaptcha.transports.build_opener")
+    def test_typed_errors(self, mocked_opener):
+        for reason, error_class in (
+            (ConnectionRefusedError("refused"), exceptions.ConnectError),
+            (socket.timeout("timed out"), exceptions.ConnectTimeoutError),
+        ):
+            mocked_opener.return_value.open.side_effect = URLError(reason)
+            with self.assertRaises(error_class) as raised:
+                transports.get_transport().request("/", b"", {})
+            self.assertIsInstance(raised.exception.__cause__, URLError)
+
+    @override_settings(RECAPTCHA_RETRIES=2, RECAPTCHA_RETRY_BACKOFF=0)
+    @patch("django_recaptcha.transports.build_opener")
+    def test_connect_errors_retried(self, mocked_opener):
+        mocked_opener.return_value.open.side_effect = [
+            URLError(ConnectionRefusedError("refused")),
+            BytesIO(b'{"success": true}'),
+        ]
+        response = client.submit("token", "somekey", "0.0.0.0")
+        self.assertTrue(response.is_valid)
+        self.assertEqual(mocked_opener.return_value.open.call_count, 2)
+
+
+class TestHttpxTransport(TestCase):
+    def test_httpx_required(self):
+        with patch.dict(sys.modules, {"httpx": None}):
+            with self.assertRaises(ImproperlyConfigured):
+                transports.HttpxTransport("www.google.com")
+
+
+@skipIf(httpx is None, "httpx is not installed")
+class TestHttpxRequests(TestCase):
+    def serve(self, handler):
+        """
+        Sends the requests of the transport to handler, which returns an
+        httpx.Response or raises.
+        """
+        settings = override_settings(
+            RECAPTCHA_TRANSPORT="django_recaptcha.transports.HttpxTransport",
+            RECAPTCHA_TRANSPORT_OPTIONS={
+                "client_options": {"transport": httpx.MockTransport(handler)}
+            },
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def answer(self, request):
+        self.requests.append(request)
+        return httpx.Response(200, json={"success": True, "hostname": "testkey"})
+
+    def setUp(self):
+        self.requests = []
+
+    def test_request(self):
+        self.serve(self.answer)
+        response = client.submit("token", "somekey", "0.0.0.0")
+        self.assertTrue(response.is_valid)
+        self.assertEqual(response.extra_data, {"hostname": "testkey"})
+        (request,) = self.requests
+        self.assertEqual(
+            str(request.url), "https://www.google.com/recaptcha/api/siteverify"
+        )
+        self.assertEqual(
+            request.content, b"secret=somekey&response=token&remoteip=0.0.0.0"
+        )
+        self.assertEqual(request.headers["User-agent"], "reCAPTCHA Django")
+
+    async def test_arequest(self):
+        self.serve(self.answer)
+        response = await client.asubmit("token", "somekey", "0.0.0.0")
+        self.assertTrue(response.is_valid)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_error_status(self):
+        self.serve(lambda request: httpx.Response(503, text="Unavailable"))
+        with self.assertRaises(exceptions.HTTPStatusError) as error:
+            client.submit("token", "somekey", "0.0.0.0")
+        self.assertEqual(error.exception.code, 503)
+        self.assertIsInstance(error.exception, HTTPError)
+
+    def test_errors(self):
+        for httpx_error, error_class in (
+            (httpx.ConnectTimeout, exceptions.ConnectTimeoutError),
+            (httpx.ConnectError, exceptions.ConnectError),
+            (httpx.ReadTimeout, exceptions.ReadTimeoutError),
+            (httpx.RemoteProtocolError, exceptions.NetworkError),
+        ):
+
+            def fail(request):
+                raise httpx_error("failed", request=request)
+
+            with self.subTest(error=httpx_error):
+                self.serve(fail)
+                with self.assertRaises(error_class) as error:
+                    client.submit("token", "somekey", "0.0.0.0")
+                self.assertIs(type(error.exception), error_class)
+                self.assertIsInstance(error.exception.__cause__, httpx_error)
+
+    async def test_async_errors(self):
+        def fail(request):
+            raise httpx.ConnectError("failed", request=request)
+
+        self.serve(fail)
+        with self.assertRaises(exceptions.ConnectError):
+            await client.asubmit("token", "somekey", "0.0.0.0")
+
+    def test_proxy(self):
+        transport = transports.HttpxTransport("www.google.com")
+        self.assertNotIn("proxy", transport.client_options)
+        transport = transports.HttpxTransport(
+            "www.google.com", proxy="http://proxy.example.com:3128"
+        )
+        self.assertEqual(
+            transport.client_options["proxy"], "http://proxy.example.com:3128"
+        )
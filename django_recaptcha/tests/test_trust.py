@@ -0,0 +1,256 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django import forms
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from django_recaptcha import fields, trust, widgets
+from django_recaptcha.client import RecaptchaResponse
+from django_recaptcha.middleware import RecaptchaRequestMiddleware
+from django_recaptcha.signals import field_validated
+
+
+class DefaultForm(forms.Form):
+    captcha = fields.ReCaptchaField(trust_window=600)
+
+
+class OtherForm(forms.Form):
+    captcha = fields.ReCaptchaField(trust_window=600, trust_scope="form")
+
+
+class SignupForm(forms.Form):
+    captcha = fields.ReCaptchaField(
+        widget=widgets.ReCaptchaV3(action="signup"), trust_window=600
+    )
+
+
+def make_request(user_pk=1):
+    request = RequestFactory().post("/")
+    request.session = SessionStore()
+    request.user = SimpleNamespace(is_authenticated=user_pk is not None, pk=user_pk)
+    return request
+
+
+class TestTrust(TestCase):
+    def test_grant(self):
+        request = make_request(user_pk=1)
+        self.assertFalse(trust.is_trusted(request, "any"))
+        trust.grant(request, "any", 60)
+        self.assertTrue(trust.is_trusted(request, "any"))
+        self.assertFalse(trust.is_trusted(request, "action:signup"))
+
+        # Kept in the session, for the next requests.
+        later = make_request(user_pk=1)
+        later.session = request.session
+        self.assertTrue(trust.is_trusted(later, "any"))
+
+    def test_expiry(self):
+        request = make_request()
+        with patch("django_recaptcha.trust.time.time", return_value=1000):
+            trust.grant(request, "any", 60)
+            trust.grant(request, "action:signup", 600)
+        with patch("django_recaptcha.trust.time.time", return_value=1059):
+            self.assertTrue(trust.is_trusted(request, "any"))
+        with patch("django_recaptcha.trust.time.time", return_value=1061):
+            self.assertFalse(trust.is_trusted(request, "any"))
+            self.assertTrue(trust.is_trusted(request, "action:signup"))
+            trust.grant(request, "form:x", 60)
+        # Expired scopes are dropped from the marker.
+        self.assertEqual(set(trust.load(request)), {"action:signup", "form:x"})
+
+    def test_bound_to_user(self):
+        request = make_request(user_pk=1)
+        trust.grant(request, "any", 60)
+        request.user = SimpleNamespace(is_authenticated=True, pk=2)
+        self.assertFalse(trust.is_trusted(request, "any"))
+        request.user = SimpleNamespace(is_authenticated=False, pk=None)
+        self.assertFalse(trust.is_trusted(request, "any"))
+
+    def test_anonymous_not_trusted(self):
+        request = make_request(user_pk=None)
+        trust.grant(request, "any", 60)
+        self.assertFalse(trust.is_trusted(request, "any"))
+        self.assertNotIn(trust.SESSION_KEY, request.session)
+
+        # Nor are markers forged for anonymous visitors honored.
+        request.session[trust.SESSION_KEY] = signing.dumps(
+            {"user": "", "scopes": {"any": time.time() + 60}}, salt=trust.SALT
+        )
+        self.assertFalse(trust.is_trusted(request, "any"))
+
+    @override_settings(RECAPTCHA_TRUST_STORAGE="cookie")
+    def test_anonymous_no_cookie(self):
+        def view(request):
+            request.user = SimpleNamespace(is_authenticated=False, pk=None)
+            trust.grant(request, "any", 60)
+            return HttpResponse()
+
+        response = RecaptchaRequestMiddleware(view)(RequestFactory().post("/"))
+        self.assertNotIn(trust.DEFAULT_TRUST_COOKIE_NAME, response.cookies)
+
+    def test_tampered_marker(self):
+        request = make_request()
+        request.session[trust.SESSION_KEY] = "forged"
+        self.assertFalse(trust.is_trusted(request, "any"))
+        self.assertEqual(trust.load(request), {})
+
+    def test_session_needed(self):
+        request = RequestFactory().post("/")
+        request.user = SimpleNamespace(is_authenticated=True, pk=1)
+        with self.assertRaises(ImproperlyConfigured):
+            trust.grant(request, "any", 60)
+
+    @override_settings(RECAPTCHA_TRUST_STORAGE="cookie")
+    def test_cookie_storage(self):
+        def view(request):
+            trust.grant(request, "any", 60)
+            return HttpResponse()
+
+        response = RecaptchaRequestMiddleware(view)(make_request())
+        cookie = response.cookies[trust.DEFAULT_TRUST_COOKIE_NAME]
+        self.assertEqual(cookie["max-age"], 61)
+        self.assertTrue(cookie["httponly"])
+        self.assertEqual(cookie["samesite"], "Lax")
+
+        request = make_request()
+        request.COOKIES[trust.DEFAULT_TRUST_COOKIE_NAME] = cookie.value
+        self.assertTrue(trust.is_trusted(request, "any"))
+        # Presented by anyone else, the cookie is not honored.
+        request.user = SimpleNamespace(is_authenticated=False, pk=None)
+        self.assertFalse(trust.is_trusted(request, "any"))
+
+        # Nothing is set for requests that were not granted trust.
+        response = RecaptchaRequestMiddleware(lambda request: HttpResponse())(
+            RequestFactory().post("/")
+        )
+        self.assertNotIn(trust.DEFAULT_TRUST_COOKIE_NAME, response.cookies)
+
+
+class TestFieldTrust(TestCase):
+    def setUp(self):
+        self.outcomes = []
+        field_validated.connect(self.record)
+        self.addCleanup(field_validated.disconnect, self.record)
+
+    def record(self, outcome, **kwargs):
+        self.outcomes.append(outcome)
+
+    def validate(self, form_class, request, value="token"):
+        # The V3 widget reads the value by the field's name.
+        form = form_class({"g-recaptcha-response": value, "captcha": value})
+        form.fields["captcha"].request = request
+        return form.is_valid()
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_skips_verification_within_window(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        request = make_request(user_pk=1)
+        self.assertTrue(self.validate(DefaultForm, request, "first"))
+        self.assertTrue(self.validate(DefaultForm, request, "second"))
+        # Templates may leave out the widget, so no value is needed either.
+        self.assertTrue(self.validate(DefaultForm, request, ""))
+        self.assertEqual(mocked_submit.call_count, 1)
+        self.assertEqual(self.outcomes, ["valid", "trusted", "trusted"])
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_anonymous_verified_every_time(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        request = make_request(user_pk=None)
+        self.assertTrue(self.validate(DefaultForm, request, "first"))
+        self.assertTrue(self.validate(DefaultForm, request, "second"))
+        self.assertFalse(self.validate(DefaultForm, request, ""))
+        self.assertEqual(mocked_submit.call_count, 2)
+        self.assertNotIn(trust.SESSION_KEY, request.session)
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_failed_verification_not_trusted(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=False)
+        request = make_request()
+        self.assertFalse(self.validate(DefaultForm, request, "first"))
+        self.assertFalse(self.validate(DefaultForm, request, "second"))
+        self.assertEqual(mocked_submit.call_count, 2)
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_low_score_not_trusted(self, mocked_submit):
+        class ScoreForm(forms.Form):
+            captcha = fields.ReCaptchaField(
+                widget=widgets.ReCaptchaV3(action="signup", required_score=0.5),
+                trust_window=600,
+            )
+
+        mocked_submit.return_value = RecaptchaResponse(
+            is_valid=True, action="signup", extra_data={"score": 0.1}
+        )
+        request = make_request()
+        self.assertFalse(self.validate(ScoreForm, request))
+        self.assertFalse(ScoreForm().fields["captcha"].is_trusted())
+        self.assertEqual(trust.load(request), {})
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_scopes(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        request = make_request()
+        self.assertTrue(self.validate(DefaultForm, request, "first"))
+        # Another action, and a field trusting only itself, are verified.
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True, action="signup")
+        self.assertTrue(self.validate(SignupForm, request, "second"))
+        self.assertTrue(self.validate(OtherForm, request, "third"))
+        self.assertEqual(mocked_submit.call_count, 3)
+        self.assertEqual(
+            set(trust.load(request)),
+            {
+                "form:django_recaptcha.tests.test_trust.DefaultForm.captcha",
+                "action:signup",
+                "form:django_recaptcha.tests.test_trust.OtherForm.captcha",
+            },
+        )
+        self.assertTrue(self.validate(OtherForm, request, ""))
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_disabled_by_default(self, mocked_submit):
+        class PlainForm(forms.Form):
+            captcha = fields.ReCaptchaField()
+
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        request = make_request()
+        self.assertTrue(self.validate(PlainForm, request, "first"))
+        self.assertTrue(self.validate(PlainForm, request, "second"))
+        self.assertEqual(mocked_submit.call_count, 2)
+        self.assertNotIn(trust.SESSION_KEY, request.session)
+
+        with override_settings(RECAPTCHA_TRUST_WINDOW=600):
+            self.assertTrue(self.validate(PlainForm, request, "third"))
+            self.assertTrue(self.validate(PlainForm, request, "fourth"))
+        self.assertEqual(mocked_submit.call_count, 3)
+
+    def test_invalid_scope(self):
+        with self.assertRaises(ImproperlyConfigured):
+            fields.ReCaptchaField(trust_scope="page")
+        # V2 widgets and V3 widgets without an action have none to share.
+        with self.assertRaises(ImproperlyConfigured):
+            fields.ReCaptchaField(trust_scope="action")
+        with self.assertRaises(ImproperlyConfigured):
+            fields.ReCaptchaField(widget=widgets.ReCaptchaV3(), trust_scope="action")
+
+    def test_default_scope(self):
+        self.assertEqual(DefaultForm().fields["captcha"].trust_scope, "form")
+        self.assertEqual(SignupForm().fields["captcha"].trust_scope, "action")
+        field = fields.ReCaptchaField(widget=widgets.ReCaptchaV3())
+        self.assertEqual(field.trust_scope, "form")
+
+    @patch("django_recaptcha.fields.client.asubmit")
+    async def test_averify_trusted(self, mocked_asubmit):
+        request = make_request()
+        trust.grant(
+            request, "form:django_recaptcha.tests.test_trust.DefaultForm.captcha", 600
+        )
+        form = DefaultForm({"g-recaptcha-response": "token"})
+        form.fields["captcha"].request = request
+        await fields.averify_form(form)
+        mocked_asubmit.assert_not_called()
+        self.assertTrue(form.is_valid())
@@ -0,0 +1,178 @@
+from unittest.mock import patch
+
+from django import forms
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from django_recaptcha import fields, widgets
+from django_recaptcha.client import RecaptchaResponse
+from django_recaptcha.verification import (
+    RecaptchaVerificationMiddleware,
+    RequestVerifier,
+    verify_recaptcha,
+)
+
+
+class DefaultForm(forms.Form):
+    captcha = fields.ReCaptchaField()
+
+
+class LoginForm(forms.Form):
+    captcha = fields.ReCaptchaField(
+        widget=widgets.ReCaptchaV3(action="login", required_score=0.5)
+    )
+
+
+def form_view(request):
+    form = DefaultForm(request.POST)
+    return HttpResponse("valid" if form.is_valid() else "invalid")
+
+
+def failure_view(request, error):
+    return HttpResponse("custom failure", status=400)
+
+
+class TestRequestVerifier(TestCase):
+    @patch("django_recaptcha.fields.client.submit")
+    def test_verify(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        request = RequestFactory().post("/", {"g-recaptcha-response": "token"})
+        RequestVerifier().verify(request)
+        self.assertIs(request.recaptcha_response, mocked_submit.return_value)
+        self.assertEqual(mocked_submit.call_args.kwargs["remoteip"], "127.0.0.1")
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_missing_and_malformed_tokens(self, mocked_submit):
+        verifier = RequestVerifier()
+        for data in ({}, {"g-recaptcha-response": "<script>"}):
+            request = RequestFactory().post("/", data)
+            with self.assertRaises(forms.ValidationError):
+                verifier.verify(request)
+            self.assertIsNone(request.recaptcha_response)
+        mocked_submit.assert_not_called()
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_v3_score_and_action(self, mocked_submit):
+        verifier = RequestVerifier(param="captcha", action="login", required_score=0.5)
+        mocked_submit.return_value = RecaptchaResponse(
+            is_valid=True, action="login", extra_data={"score": 0.1}
+        )
+        request = RequestFactory().post("/", {"captcha": "token"})
+        with self.assertRaises(forms.ValidationError):
+            verifier.verify(request)
+        # The response is still available to tell why.
+        self.assertEqual(request.recaptcha_response.extra_data["score"], 0.1)
+
+        mocked_submit.return_value = RecaptchaResponse(
+            is_valid=True, action="login", extra_data={"score": 0.9}
+        )
+        verifier.verify(RequestFactory().post("/", {"captcha": "other"}))
+
+
+class TestVerifyRecaptcha(TestCase):
+    @patch("django_recaptcha.fields.client.submit")
+    def test_form_reuses_outcome(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        view = verify_recaptcha(form_view)
+        request = RequestFactory().post("/", {"g-recaptcha-response": "token"})
+        self.assertEqual(view(request).content, b"valid")
+        mocked_submit.assert_called_once()
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_rejected_before_view(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=False)
+        calls = []
+        view = verify_recaptcha(calls.append)
+        response = view(RequestFactory().post("/", {"g-recaptcha-response": "x"}))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(calls, [])
+
+        response = verify_recaptcha(on_failure=failure_view)(calls.append)(
+            RequestFactory().post("/", {"g-recaptcha-response": "y"})
+        )
+        self.assertEqual(response.content, b"custom failure")
+
+        with override_settings(
+            RECAPTCHA_FAILURE_VIEW=(
+                "django_recaptcha.tests.test_verification.failure_view"
+            )
+        ):
+            response = view(RequestFactory().post("/", {"g-recaptcha-response": "z"}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(calls, [])
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_safe_methods_not_verified(self, mocked_submit):
+        view = verify_recaptcha(lambda request: HttpResponse("page"))
+        self.assertEqual(view(RequestFactory().get("/")).content, b"page")
+        mocked_submit.assert_not_called()
+
+    @patch("django_recaptcha.fields.client.asubmit")
+    async def test_async_view(self, mocked_asubmit):
+        mocked_asubmit.return_value = RecaptchaResponse(
+            is_valid=True, action="login", extra_data={"score": 0.9}
+        )
+
+        @verify_recaptcha(param="captcha", action="login", required_score=0.5)
+        async def view(request):
+            form = LoginForm(request.POST)
+            return HttpResponse("valid" if form.is_valid() else "invalid")
+
+        response = await view(RequestFactory().post("/", {"captcha": "token"}))
+        self.assertEqual(response.content, b"valid")
+        mocked_asubmit.assert_called_once()
+
+
+@override_settings(
+    RECAPTCHA_VERIFY_URLS=[
+        r"^/login/$",
+        (r"^/signup/", {"param": "captcha", "action": "signup"}),
+    ]
+)
+class TestRecaptchaVerificationMiddleware(TestCase):
+    @patch("django_recaptcha.fields.client.submit")
+    def test_configured_urls(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=False)
+        middleware = RecaptchaVerificationMiddleware(form_view)
+        factory = RequestFactory()
+
+        response = middleware(factory.post("/login/", {"g-recaptcha-response": "x"}))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(mocked_submit.call_count, 1)
+
+        # Other paths and safe methods are left to the view.
+        response = middleware(factory.post("/other/", {"g-recaptcha-response": "y"}))
+        self.assertEqual(response.content, b"invalid")
+        self.assertEqual(middleware(factory.get("/login/")).content, b"invalid")
+
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True, action="signup")
+        response = middleware(factory.post("/signup/", {"captcha": "z"}))
+        # The view's form posts no g-recaptcha-response, so it is invalid,
+        # but the request got through.
+        self.assertEqual(response.content, b"invalid")
+        self.assertEqual(mocked_submit.call_count, 3)
+
+    @patch("django_recaptcha.fields.client.submit")
+    def test_form_reuses_outcome(self, mocked_submit):
+        mocked_submit.return_value = RecaptchaResponse(is_valid=True)
+        middleware = RecaptchaVerificationMiddleware(form_view)
+        response = middleware(
+            RequestFactory().post("/login/", {"g-recaptcha-response": "token"})
+        )
+        self.assertEqual(response.content, b"valid")
+        mocked_submit.assert_called_once()
+
+    @patch("django_recaptcha.fields.client.asubmit")
+    async def test_async(self, mocked_asubmit):
+        mocked_asubmit.return_value = RecaptchaResponse(is_valid=False)
+
+        async def view(request):
+            return HttpResponse("view")
+
+        middleware = RecaptchaVerificationMiddleware(view)
+        response = await middleware(
+            RequestFactory().post("/login/", {"g-recaptcha-response": "x"})
+        )
+        self.assertEqual(response.status_code, 403)
+        response = await middleware(RequestFactory().post("/other/"))
+        self.assertEqual(response.content, b"view")
@@ -0,0 +1,798 @@
+import asyncio
+import os
+import socket
+import ssl
+import threading
+import weakref
+from base64 import b64encode
+from http.client import (
+    HTTPConnection,
+    HTTPSConnection,
+    RemoteDisconnected,
+    parse_headers,
+)
+from io import BytesIO
+from urllib.error import HTTPError, URLError
+from urllib.parse import unquote, urlsplit
+from urllib.request import (
+    ProxyHandler,
+    Request,
+    build_opener,
+    getproxies,
+    proxy_bypass,
+)
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from django_recaptcha import deadline, exceptions
+from django_recaptcha.constants import DEFAULT_RECAPTCHA_DOMAIN
+
+DEFAULT_TRANSPORT = "django_recaptcha.transports.PooledTransport"
+
+# Errors raised when a kept-alive connection was closed by the server while
+# it sat idle in the pool. The request never reached the server, so it is
+# safe to send it again on a fresh connection.
+STALE_CONNECTION_ERRORS = (RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+def parse_proxy(proxy):
+    """
+    Returns the host, port and CONNECT headers for a proxy URL. Like urllib's
+    ProxyHandler, the scheme is optional and credentials are taken from the
+    URL.
+    """
+    proxy = urlsplit(proxy if "//" in proxy else "//" + proxy)
+    tunnel_headers = {}
+    if proxy.username:
+        credentials = "%s:%s" % (
+            unquote(proxy.username),
+            unquote(proxy.password or ""),
+        )
+        tunnel_headers["Proxy-Authorization"] = "Basic %s" % b64encode(
+            credentials.encode("utf-8")
+        ).decode("ascii")
+    return proxy.hostname, proxy.port, tunnel_headers
+
+
+def get_environment_proxy(host):
+    """
+    Returns the URL of the proxy set in the environment (HTTPS_PROXY or
+    https_proxy) for HTTPS requests to host, or None, honoring NO_PROXY like
+    urllib does.
+    """
+    proxy = getproxies().get("https")
+    if not proxy or proxy_bypass(urlsplit("//" + host).hostname):
+        return None
+    return proxy
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of keep-alive HTTPS connections to a single host.
+
+    host -- the host connections are made to, optionally with a port
+    timeout -- timeout in seconds for connecting, and for reading answers
+        unless read_timeout is set
+    proxy -- optional proxy URL, requests are tunneled through it with CONNECT
+    maxsize -- the maximum number of idle connections kept for reuse
+    secure -- whether to use HTTPS, only plain HTTP is used if not
+    read_timeout -- timeout in seconds for reading answers
+    ssl_context -- the SSLContext of HTTPS connections, by default one
+        created for the pool and shared by all its connections, as creating
+        one takes tens of milliseconds
+
+    The pool never blocks: when no idle connection is available a new one is
+    opened, and connections returned to a full pool are closed. Timeouts are
+    shortened to the deadline for verification, if any.
+    """
+
+    def __init__(
+        self,
+        host,
+        timeout=None,
+        proxy=None,
+        maxsize=10,
+        secure=True,
+        read_timeout=None,
+        ssl_context=None,
+    ):
+        self.host = host
+        self.timeout = timeout
+        self.proxy = proxy
+        self.maxsize = maxsize
+        self.secure = secure
+        self.read_timeout = read_timeout if read_timeout is not None else timeout
+        if secure and ssl_context is None:
+            ssl_context = ssl.create_default_context()
+        self.ssl_context = ssl_context
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def new_connection(self):
+        if self.secure:
+            connection_class = HTTPSConnection
+            options = {"timeout": self.timeout, "context": self.ssl_context}
+        else:
+            connection_class = HTTPConnection
+            options = {"timeout": self.timeout}
+        if not self.proxy:
+            return connection_class(self.host, **options)
+
+        proxy_host, proxy_port, tunnel_headers = parse_proxy(self.proxy)
+        connection = connection_class(proxy_host, proxy_port, **options)
+        connection.set_tunnel(self.host, headers=tunnel_headers)
+        return connection
+
+    def get_connection(self):
+        """
+        Returns a tuple of a connection and whether it was reused from the
+        pool.
+        """
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self.new_connection(), False
+
+    def connect(self, connection):
+        """
+        Opens connection within the connect timeout unless it is open, and
+        sets the read timeout of its socket. Raises ConnectError, or
+        ConnectTimeoutError, if no connection could be made.
+        """
+        if connection.sock is None:
+            connection.timeout = deadline.bound(self.timeout)
+            try:
+                connection.connect()
+            except exceptions.TIMEOUT_ERRORS as error:
+                error_class = (
+                    exceptions.DeadlineExceededError
+                    if deadline.passed()
+                    else exceptions.ConnectTimeoutError
+                )
+                raise error_class("Connecting to %s timed out." % self.host) from error
+            except OSError as error:
+                raise exceptions.ConnectError(str(error)) from error
+        connection.sock.settimeout(deadline.bound(self.read_timeout))
+
+    def send(self, connection, method, path, body, headers):
+        self.connect(connection)
+        connection.request(method, path, body=body, headers=headers)
+        return connection.getresponse()
+
+    def put_connection(self, connection):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def urlopen(self, method, path, body=None, headers=None):
+        """
+        Sends a request over a pooled connection and returns the response
+        body as a file-like object. Raises HTTPError for error responses.
+        """
+        connection, reused = self.get_connection()
+        try:
+            try:
+                response = self.send(connection, method, path, body, headers or {})
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                connection.close()
+                connection = self.new_connection()
+                response = self.send(connection, method, path, body, headers or {})
+            data = response.read()
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self.put_connection(connection)
+
+        if response.status >= 400:
+            raise HTTPError(
+                "%s://%s%s" % ("https" if self.secure else "http", self.host, path),
+                response.status,
+                response.reason,
+                response.headers,
+                BytesIO(data),
+            )
+        return BytesIO(data)
+
+
+async def _aopen_tunnel(proxy, host, port):
+    """
+    Opens a non-blocking socket to proxy and asks it to tunnel to host:port.
+    """
+    loop = asyncio.get_running_loop()
+    proxy_host, proxy_port, tunnel_headers = parse_proxy(proxy)
+    family, sock_type, proto, _, address = (
+        await loop.getaddrinfo(proxy_host, proxy_port or 443, type=socket.SOCK_STREAM)
+    )[0]
+    sock = socket.socket(family, sock_type, proto)
+    sock.setblocking(False)
+    try:
+        await loop.sock_connect(sock, address)
+        lines = ["CONNECT %s:%d HTTP/1.1" % (host, port), "Host: %s:%d" % (host, port)]
+        lines.extend("%s: %s" % header for header in tunnel_headers.items())
+        await loop.sock_sendall(sock, ("\r\n".join(lines) + "\r\n\r\n").encode())
+        reply = b""
+        while b"\r\n\r\n" not in reply:
+            chunk = await loop.sock_recv(sock, 4096)
+            if not chunk:
+                raise RemoteDisconnected("Proxy closed connection without response")
+            reply += chunk
+        status_line = reply.split(b"\r\n", 1)[0].decode("latin-1")
+        if status_line.split(None, 2)[1:2] != ["200"]:
+            raise OSError("Tunnel connection failed: %s" % status_line)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+async def _aopen_connection(host, proxy=None, secure=True, ssl_context=None):
+    """
+    Opens a connection to host, which may include a port, optionally through
+    a tunnel to proxy. HTTPS connections use ssl_context, or a default
+    SSLContext created for the connection.
+    """
+    netloc = urlsplit("//" + host)
+    hostname, port = netloc.hostname, netloc.port or (443 if secure else 80)
+    if secure and ssl_context is None:
+        ssl_context = ssl.create_default_context()
+    elif not secure:
+        ssl_context = None
+    if not proxy:
+        return await asyncio.open_connection(hostname, port, ssl=ssl_context)
+    sock = await _aopen_tunnel(proxy, hostname, port)
+    return await asyncio.open_connection(
+        sock=sock, ssl=ssl_context, server_hostname=hostname if secure else None
+    )
+
+
+def _parse_int(value, what, base=10):
+    """
+    Returns value, from the head of a response, as a non-negative integer,
+    raising NetworkError if it is not one.
+    """
+    try:
+        number = int(value, base)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise exceptions.NetworkError(
+            "The verify endpoint answered with a malformed %s: %r." % (what, value)
+        )
+    return number
+
+
+async def _aread_body(reader, headers):
+    """
+    Returns the body of a response and whether the connection must be closed
+    after it, because the body ran up to the end of the connection.
+    """
+    if headers.get("Transfer-Encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            line = await reader.readline()
+            size = _parse_int(line.split(b";", 1)[0], "chunk size", 16)
+            if not size:
+                # Skip any trailers up to the final empty line.
+                while (await reader.readline()).strip():
+                    pass
+                return b"".join(chunks), False
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+    if headers.get("Content-Length") is not None:
+        length = _parse_int(headers["Content-Length"], "Content-Length")
+        return await reader.readexactly(length), False
+    return await reader.read(), True
+
+
+async def _aconnect(host, proxy, secure, timeout, ssl_context=None):
+    """
+    Opens a connection to host within timeout, raising ConnectError, or
+    ConnectTimeoutError, if none could be made.
+    """
+    timeout = deadline.bound(timeout)
+    try:
+        return await asyncio.wait_for(
+            _aopen_connection(host, proxy, secure=secure, ssl_context=ssl_context),
+            timeout,
+        )
+    except exceptions.TIMEOUT_ERRORS as error:
+        error_class = (
+            exceptions.DeadlineExceededError
+            if deadline.passed()
+            else exceptions.ConnectTimeoutError
+        )
+        raise error_class("Connecting to %s timed out." % host) from error
+    except OSError as error:
+        raise exceptions.ConnectError(str(error)) from error
+
+
+async def _aexchange(reader, writer, host, path, body, headers):
+    """
+    Sends a request over an open keep-alive connection. Returns the status,
+    reason, headers and body of the response, and whether the connection must
+    be closed after it.
+    """
+    lines = [
+        "POST %s HTTP/1.1" % path,
+        "Host: %s" % host,
+        "Content-Length: %d" % len(body),
+    ]
+    lines.extend("%s: %s" % header for header in headers.items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+    status_line = (await reader.readline()).decode("latin-1")
+    if not status_line:
+        raise RemoteDisconnected("Remote end closed connection without response")
+    version, status, reason = (status_line.rstrip("\r\n").split(None, 2) + [""])[:3]
+    status = _parse_int(status, "status")
+    header_lines = []
+    while True:
+        line = await reader.readline()
+        header_lines.append(line)
+        if line in (b"\r\n", b"\n", b""):
+            break
+    response_headers = parse_headers(BytesIO(b"".join(header_lines)))
+    data, will_close = await _aread_body(reader, response_headers)
+    connection = response_headers.get("Connection", "").lower()
+    will_close = (
+        will_close
+        or connection == "close"
+        or (version == "HTTP/1.0" and connection != "keep-alive")
+    )
+    return status, reason, response_headers, data, will_close
+
+
+class AsyncConnectionPool:
+    """
+    Pool of keep-alive connections to a single host for the event loop it is
+    used on, the async counterpart of ConnectionPool. Connections are pairs
+    of asyncio streams.
+
+    host -- the host connections are made to, optionally with a port
+    timeout -- timeout in seconds for connecting, and for reading answers
+        unless read_timeout is set
+    proxy -- optional proxy URL, requests are tunneled through it with CONNECT
+    maxsize -- the maximum number of idle connections kept for reuse
+    secure -- whether to use HTTPS, only plain HTTP is used if not
+    read_timeout -- timeout in seconds for reading answers
+    ssl_context -- the SSLContext of HTTPS connections
+    """
+
+    def __init__(
+        self,
+        host,
+        timeout=None,
+        proxy=None,
+        maxsize=10,
+        secure=True,
+        read_timeout=None,
+        ssl_context=None,
+    ):
+        self.host = host
+        self.timeout = timeout
+        self.proxy = proxy
+        self.maxsize = maxsize
+        self.secure = secure
+        self.read_timeout = read_timeout if read_timeout is not None else timeout
+        self.ssl_context = ssl_context
+        self._idle = []
+
+    async def new_connection(self):
+        return await _aconnect(
+            self.host, self.proxy, self.secure, self.timeout, self.ssl_context
+        )
+
+    async def get_connection(self):
+        """
+        Returns a tuple of a connection and whether it was reused from the
+        pool.
+        """
+        while self._idle:
+            reader, writer = self._idle.pop()
+            # Closed by the server while it sat idle.
+            if not reader.at_eof() and not writer.is_closing():
+                return (reader, writer), True
+            writer.close()
+        return await self.new_connection(), False
+
+    def put_connection(self, connection):
+        if len(self._idle) < self.maxsize:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+
+    def clear(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    async def send(self, connection, path, body, headers):
+        reader, writer = connection
+        return await asyncio.wait_for(
+            _aexchange(reader, writer, self.host, path, body, headers),
+            deadline.bound(self.read_timeout),
+        )
+
+    async def urlopen(self, path, body, headers):
+        """
+        Sends a POST request over a pooled connection and returns the
+        response body as a file-like object. Raises HTTPError for error
+        responses.
+        """
+        connection, reused = await self.get_connection()
+        try:
+            try:
+                response = await self.send(connection, path, body, headers)
+            except STALE_CONNECTION_ERRORS + (asyncio.IncompleteReadError,):
+                if not reused:
+                    raise
+                connection[1].close()
+                connection = await self.new_connection()
+                response = await self.send(connection, path, body, headers)
+        except BaseException:
+            # Including cancellation, after which the connection is unusable.
+            connection[1].close()
+            raise
+        status, reason, response_headers, data, will_close = response
+
+        if will_close:
+            connection[1].close()
+        else:
+            self.put_connection(connection)
+
+        if status >= 400:
+            raise HTTPError(
+                "%s://%s%s" % ("https" if self.secure else "http", self.host, path),
+                status,
+                reason,
+                response_headers,
+                BytesIO(data),
+            )
+        return BytesIO(data)
+
+
+class BaseTransport:
+    """
+    Sends verification requests to the verify endpoint over HTTPS.
+
+    domain -- the host of the verify endpoint
+    timeout -- timeout in seconds for a request
+    proxy -- optional URL of the proxy HTTPS requests are sent through
+    pool_size -- the number of connections kept open for reuse, for
+        transports that keep any
+    base_url -- optional scheme and host requests are sent to instead of
+        https://<domain>, for example the URL of a SiteverifyServer
+    connect_timeout, read_timeout -- timeouts in seconds for connecting and
+        for reading the answer, for transports that tell them apart;
+        default to timeout
+
+    Subclasses implement request(), and arequest() if they can make requests
+    without blocking. Both return the response body as a file-like object and
+    raise urllib's HTTPError for error responses, so that retries and the
+    circuit breaker work the same whatever the transport. Other failures
+    raise OSError or, better, one of the errors of django_recaptcha.exceptions.
+    Timeouts are to be shortened to the deadline of django_recaptcha.deadline.
+    """
+
+    def __init__(
+        self,
+        domain,
+        timeout=None,
+        proxy=None,
+        pool_size=10,
+        base_url=None,
+        connect_timeout=None,
+        read_timeout=None,
+    ):
+        self.domain = domain
+        self.timeout = timeout
+        self.proxy = proxy
+        self.pool_size = pool_size
+        self.base_url = (base_url or "https://%s" % domain).rstrip("/")
+        self.connect_timeout = (
+            connect_timeout if connect_timeout is not None else timeout
+        )
+        self.read_timeout = read_timeout if read_timeout is not None else timeout
+
+    def request(self, path, body, headers):
+        raise NotImplementedError(
+            "subclasses of BaseTransport must provide a request() method"
+        )
+
+    async def arequest(self, path, body, headers):
+        """
+        Coroutine version of request(). Defaults to running request() in a
+        thread.
+        """
+        return await sync_to_async(self.request, thread_sensitive=False)(
+            path, body, headers
+        )
+
+    def close(self):
+        """
+        Releases any connections kept open, called when the transport is
+        replaced.
+        """
+
+
+class PooledTransport(BaseTransport):
+    """
+    The default transport. Reuses keep-alive connections from a
+    ConnectionPool, and for async requests from an AsyncConnectionPool per
+    event loop, whose connections use non-blocking sockets. All connections
+    share one SSLContext. Like urllib, it uses the proxy set in the
+    environment unless a proxy is configured.
+    """
+
+    def __init__(self, domain, **kwargs):
+        super().__init__(domain, **kwargs)
+        url = urlsplit(self.base_url)
+        self.host = url.netloc
+        self.secure = url.scheme == "https"
+        if not self.proxy and self.secure:
+            self.proxy = get_environment_proxy(self.host)
+        self.ssl_context = ssl.create_default_context() if self.secure else None
+        self.pool = ConnectionPool(**self.get_pool_options())
+        # Async connections are bound to the event loop they were opened on.
+        # Their streams refer to the loop, so the pools are not weakly keyed
+        # but dropped once their loop is closed.
+        self._async_pools = {}
+        self._async_pools_lock = threading.Lock()
+
+    def get_pool_options(self):
+        return {
+            "host": self.host,
+            "timeout": self.connect_timeout,
+            "proxy": self.proxy,
+            "maxsize": self.pool_size,
+            "secure": self.secure,
+            "read_timeout": self.read_timeout,
+            "ssl_context": self.ssl_context,
+        }
+
+    def get_async_pool(self):
+        """
+        Returns the AsyncConnectionPool of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._async_pools.get(loop)
+        if pool is not None:
+            return pool
+        with self._async_pools_lock:
+            # The sockets of dropped pools are closed as they are collected.
+            for closed in [other for other in self._async_pools if other.is_closed()]:
+                del self._async_pools[closed]
+            pool = self._async_pools[loop] = AsyncConnectionPool(
+                **self.get_pool_options()
+            )
+        return pool
+
+    def request(self, path, body, headers):
+        return self.pool.urlopen("POST", path, body=body, headers=headers)
+
+    async def arequest(self, path, body, headers):
+        return await self.get_async_pool().urlopen(path, body, headers)
+
+    def close(self):
+        self.pool.clear()
+        with self._async_pools_lock:
+            pools, self._async_pools = self._async_pools, {}
+        for loop, pool in pools.items():
+            # Streams may only be closed from the thread running their loop.
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(pool.clear)
+
+
+class UrllibTransport(BaseTransport):
+    """
+    Opens a new connection with urllib for every request. Proxies from the
+    environment are used unless a proxy is configured. urllib has a single
+    timeout for connecting and reading, so connect_timeout and read_timeout
+    are not told apart. The URLError urllib raises when it could not send a
+    request is raised as the matching error of django_recaptcha.exceptions,
+    so that failures to connect are retried.
+    """
+
+    def __init__(self, domain, **kwargs):
+        super().__init__(domain, **kwargs)
+        opener_args = []
+        if self.proxy:
+            opener_args = [ProxyHandler({"https": self.proxy})]
+        self.opener = build_opener(*opener_args)
+
+    def request(self, path, body, headers):
+        request_object = Request(url=self.base_url + path, data=body, headers=headers)
+        try:
+            return self.opener.open(
+                request_object, timeout=deadline.bound(self.timeout)
+            )
+        except HTTPError:
+            raise
+        except URLError as error:
+            raise exceptions.translate(error, deadline.passed()) from error
+
+
+class HttpxTransport(BaseTransport):
+    """
+    Sends requests with httpx, which must be installed. Connections are kept
+    open for reuse, and with http2=True (which needs httpx[http2]) requests
+    are multiplexed over HTTP/2. Like urllib, httpx uses the proxies set in
+    the environment unless a proxy is configured, which needs httpx 0.26 or
+    later.
+
+    http2 -- whether to use HTTP/2
+    client_options -- more keyword arguments for httpx.Client and
+        httpx.AsyncClient, for example a transport
+    """
+
+    def __init__(self, domain, http2=False, client_options=None, **kwargs):
+        super().__init__(domain, **kwargs)
+        try:
+            import httpx
+        except ImportError as error:
+            raise ImproperlyConfigured(
+                "HttpxTransport requires httpx to be installed."
+            ) from error
+        self.httpx = httpx
+        self.client_options = {
+            "base_url": self.base_url,
+            "timeout": httpx.Timeout(
+                self.timeout, connect=self.connect_timeout, read=self.read_timeout
+            ),
+            "limits": httpx.Limits(max_keepalive_connections=self.pool_size),
+            "http2": http2,
+        }
+        if self.proxy:
+            # Only passed when set, as httpx before 0.26 has no proxy argument.
+            self.client_options["proxy"] = self.proxy
+        self.client_options.update(client_options or {})
+        self.client = httpx.Client(**self.client_options)
+        # Async connections are bound to the event loop they were opened on.
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def get_async_client(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_clients:
+            self._async_clients[loop] = self.httpx.AsyncClient(**self.client_options)
+        return self._async_clients[loop]
+
+    def to_body(self, response):
+        if response.status_code >= 400:
+            raise HTTPError(
+                str(response.url),
+                response.status_code,
+                response.reason_phrase,
+                response.headers,
+                BytesIO(response.content),
+            )
+        return BytesIO(response.content)
+
+    def get_timeout(self):
+        # Shortened to the deadline, if any.
+        return self.httpx.Timeout(
+            deadline.bound(self.timeout),
+            connect=deadline.bound(self.connect_timeout),
+            read=deadline.bound(self.read_timeout),
+        )
+
+    def to_error(self, error):
+        """
+        Returns the RecaptchaError standing for an httpx TransportError.
+        """
+        if isinstance(error, self.httpx.TimeoutException) and deadline.passed():
+            return exceptions.DeadlineExceededError(str(error))
+        if isinstance(error, self.httpx.ConnectTimeout):
+            return exceptions.ConnectTimeoutError(str(error))
+        if isinstance(error, self.httpx.ConnectError):
+            return exceptions.ConnectError(str(error))
+        if isinstance(error, self.httpx.TimeoutException):
+            return exceptions.ReadTimeoutError(str(error))
+        return exceptions.NetworkError(str(error) or error.__class__.__name__)
+
+    def request(self, path, body, headers):
+        try:
+            response = self.client.post(
+                path, content=body, headers=headers, timeout=self.get_timeout()
+            )
+        except self.httpx.TransportError as error:
+            raise self.to_error(error) from error
+        return self.to_body(response)
+
+    async def arequest(self, path, body, headers):
+        try:
+            response = await self.get_async_client().post(
+                path, content=body, headers=headers, timeout=self.get_timeout()
+            )
+        except self.httpx.TransportError as error:
+            raise self.to_error(error) from error
+        return self.to_body(response)
+
+    def close(self):
+        self.client.close()
+
+
+# A (settings key, transport) tuple, swapped as a whole so readers never see
+# a transport paired with the wrong key.
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """
+    Returns the process-wide transport configured by the RECAPTCHA_TRANSPORT
+    setting. The transport is replaced when the settings it was created from
+    change.
+    """
+    global _transport
+
+    proxies = getattr(settings, "RECAPTCHA_PROXY", {})
+    key = (
+        getattr(settings, "RECAPTCHA_TRANSPORT", DEFAULT_TRANSPORT),
+        getattr(settings, "RECAPTCHA_TRANSPORT_OPTIONS", {}),
+        getattr(settings, "RECAPTCHA_DOMAIN", DEFAULT_RECAPTCHA_DOMAIN),
+        getattr(settings, "RECAPTCHA_VERIFY_REQUEST_TIMEOUT", 10),
+        getattr(settings, "RECAPTCHA_CONNECT_TIMEOUT", None),
+        getattr(settings, "RECAPTCHA_READ_TIMEOUT", None),
+        # The verify endpoint is always requested over HTTPS.
+        proxies.get("https"),
+        getattr(settings, "RECAPTCHA_CONNECTION_POOL_SIZE", 10),
+    )
+    current = _transport
+    if current is not None and current[0] == key:
+        return current[1]
+
+    with _transport_lock:
+        if _transport is None or _transport[0] != key:
+            if _transport is not None:
+                _transport[1].close()
+            (
+                path,
+                options,
+                domain,
+                timeout,
+                connect_timeout,
+                read_timeout,
+                proxy,
+                pool_size,
+            ) = key
+            transport = import_string(path)(
+                domain,
+                timeout=timeout,
+                proxy=proxy,
+                pool_size=pool_size,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+                **options,
+            )
+            _transport = (key, transport)
+        return _transport[1]
+
+
+def _reset_transport():
+    # A forked child must never share sockets (or a held lock) with its
+    # parent, so it starts over with a transport of its own.
+    global _transport, _transport_lock
+    _transport = None
+    _transport_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_transport)
@@ -0,0 +1,133 @@
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_TRUST_COOKIE_NAME = "recaptcha_trust"
+SESSION_KEY = "_recaptcha_trust"
+SALT = "django_recaptcha.trust"
+
+
+def get_storage():
+    """
+    Returns where trust markers are kept: "session" (the default) or
+    "cookie".
+    """
+    return getattr(settings, "RECAPTCHA_TRUST_STORAGE", "session")
+
+
+def get_cookie_name():
+    return getattr(settings, "RECAPTCHA_TRUST_COOKIE_NAME", DEFAULT_TRUST_COOKIE_NAME)
+
+
+def get_user_key(request):
+    """
+    Returns the key of the logged in user of request, or None for anonymous
+    visitors, who are never trusted: their marker would be a bearer token
+    that any client presenting it could replay.
+    """
+    # Markers are bound to the user they were granted to, so that they stop
+    # applying on logging in or out, and cannot be handed to another user.
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return str(user.pk)
+    return None
+
+
+def can_trust(request):
+    """
+    Returns whether request may be granted trust, that is whether its user
+    is logged in.
+    """
+    return get_user_key(request) is not None
+
+
+def get_marker(request):
+    marker = getattr(request, "_recaptcha_trust_marker", None)
+    if marker is not None:
+        # Granted earlier while handling this request.
+        return marker
+    if get_storage() == "cookie":
+        return request.COOKIES.get(get_cookie_name())
+    session = getattr(request, "session", None)
+    if session is not None:
+        return session.get(SESSION_KEY)
+
+
+def load(request):
+    """
+    Returns the scopes request's trust marker holds, as a dict of scope to
+    the time its trust expires, or an empty dict if it has no valid marker.
+    """
+    user_key = get_user_key(request)
+    marker = get_marker(request)
+    if user_key is None or not marker:
+        return {}
+    try:
+        data = signing.loads(marker, salt=SALT)
+    except signing.BadSignature:
+        return {}
+    if not isinstance(data, dict) or data.get("user") != user_key:
+        return {}
+    scopes = data.get("scopes")
+    return scopes if isinstance(scopes, dict) else {}
+
+
+def is_trusted(request, scope):
+    """
+    Returns whether request holds an unexpired trust marker for scope.
+    """
+    expires = load(request).get(scope)
+    return isinstance(expires, (int, float)) and time.time() < expires
+
+
+def grant(request, scope, window):
+    """
+    Trusts request for scope during the next window seconds, keeping the
+    other unexpired scopes of its marker. With cookie storage, the cookie is
+    set on the response by RecaptchaRequestMiddleware. Does nothing for
+    anonymous visitors.
+    """
+    if not can_trust(request):
+        return
+    now = time.time()
+    scopes = {
+        name: expires
+        for name, expires in load(request).items()
+        if isinstance(expires, (int, float)) and expires > now
+    }
+    scopes[scope] = now + window
+    marker = signing.dumps(
+        {"user": get_user_key(request), "scopes": scopes}, salt=SALT, compress=True
+    )
+    request._recaptcha_trust_marker = marker
+    if get_storage() == "cookie":
+        request._recaptcha_trust_max_age = int(max(scopes.values()) - now) + 1
+        return
+    session = getattr(request, "session", None)
+    if session is None:
+        raise ImproperlyConfigured(
+            "Trust markers are kept in the session by default, which needs"
+            " SessionMiddleware. Set RECAPTCHA_TRUST_STORAGE to 'cookie' to"
+            " keep them in a cookie instead."
+        )
+    session[SESSION_KEY] = marker
+
+
+def set_cookie(request, response):
+    """
+    Sets the trust cookie on response, if trust was granted to request with
+    cookie storage.
+    """
+    max_age = getattr(request, "_recaptcha_trust_max_age", None)
+    if max_age is None:
+        return
+    response.set_cookie(
+        get_cookie_name(),
+        request._recaptcha_trust_marker,
+        max_age=max_age,
+        secure=request.is_secure(),
+        httponly=True,
+        samesite="Lax",
+    )
@@ -0,0 +1,201 @@
+import copy
+import re
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import HttpResponseForbidden
+from django.utils.module_loading import import_string
+
+from django_recaptcha import trust
+from django_recaptcha.fields import ReCaptchaField
+from django_recaptcha.middleware import RecaptchaRequestMiddleware, _current_request
+from django_recaptcha.widgets import ReCaptchaV2Checkbox, ReCaptchaV3
+
+# Requests with these methods change nothing, so they are never verified.
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+
+def verification_failed(request, error):
+    """
+    Default view for requests failing verification before their view runs.
+    """
+    return HttpResponseForbidden(" ".join(error.messages))
+
+
+def get_failure_view():
+    path = getattr(settings, "RECAPTCHA_FAILURE_VIEW", None)
+    return import_string(path) if path else verification_failed
+
+
+class RequestVerifier:
+    """
+    Verifies the token posted with a request with the same logic as
+    ReCaptchaField, before any form is built. The outcome is memoized on the
+    request, so the form's ReCaptchaField reuses it instead of verifying the
+    token again.
+
+    param -- the name of the POST parameter holding the token: the name of
+        the field for reCAPTCHA V3
+    action -- the reCAPTCHA V3 action the token must have been issued for
+    required_score -- the minimum reCAPTCHA V3 score
+    public_key, private_key -- as for ReCaptchaField
+    """
+
+    def __init__(
+        self,
+        param="g-recaptcha-response",
+        action=None,
+        required_score=None,
+        public_key=None,
+        private_key=None,
+    ):
+        self.param = param
+        if action is not None or required_score is not None:
+            widget = ReCaptchaV3(action=action, required_score=required_score)
+        else:
+            widget = ReCaptchaV2Checkbox()
+        self.field = ReCaptchaField(public_key, private_key, widget=widget)
+
+    def get_field(self, request):
+        field = copy.deepcopy(self.field)
+        field.request = request
+        return field
+
+    def get_value(self, request):
+        return request.POST.get(self.param)
+
+    def verify(self, request):
+        """
+        Verifies request's token, raising ValidationError if it fails. The
+        RecaptchaResponse, if any, is set as request.recaptcha_response.
+        """
+        field = self.get_field(request)
+        try:
+            field.clean(self.get_value(request))
+        finally:
+            request.recaptcha_response = field.recaptcha_response
+
+    async def averify(self, request):
+        """
+        Coroutine version of verify().
+        """
+        field = self.get_field(request)
+        value = self.get_value(request)
+        try:
+            await field.avalidate(field.to_python(value))
+        finally:
+            request.recaptcha_response = field.recaptcha_response
+
+
+def verify_recaptcha(view=None, *, on_failure=None, **kwargs):
+    """
+    Decorates a view to verify the token posted with unsafe requests before
+    it runs, answering them with on_failure(request, error) when that fails,
+    by default RECAPTCHA_FAILURE_VIEW or a 403 response. Other keyword
+    arguments are those of RequestVerifier.
+
+        @verify_recaptcha
+        def login(request): ...
+
+        @verify_recaptcha(param="captcha", action="login", required_score=0.5)
+        def login(request): ...
+
+    The view's form then reuses the outcome, as the request is also made
+    available to ReCaptchaField as with RecaptchaRequestMiddleware, which the
+    decorator stands in for.
+    """
+    if view is None:
+        return lambda view: verify_recaptcha(view, on_failure=on_failure, **kwargs)
+
+    verifier = RequestVerifier(**kwargs)
+
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            token = _current_request.set(request)
+            try:
+                if request.method not in SAFE_METHODS:
+                    try:
+                        await verifier.averify(request)
+                    except ValidationError as error:
+                        return (on_failure or get_failure_view())(request, error)
+                response = await view(request, *args, **kwargs)
+            finally:
+                _current_request.reset(token)
+            trust.set_cookie(request, response)
+            return response
+
+    else:
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            token = _current_request.set(request)
+            try:
+                if request.method not in SAFE_METHODS:
+                    try:
+                        verifier.verify(request)
+                    except ValidationError as error:
+                        return (on_failure or get_failure_view())(request, error)
+                response = view(request, *args, **kwargs)
+            finally:
+                _current_request.reset(token)
+            trust.set_cookie(request, response)
+            return response
+
+    return wrapper
+
+
+def get_url_verifiers():
+    """
+    Returns the (compiled pattern, RequestVerifier) pairs of the
+    RECAPTCHA_VERIFY_URLS setting, whose entries are path regexes or
+    (path regex, RequestVerifier arguments) pairs.
+    """
+    verifiers = []
+    for entry in getattr(settings, "RECAPTCHA_VERIFY_URLS", []):
+        pattern, options = (entry, {}) if isinstance(entry, str) else entry
+        verifiers.append((re.compile(pattern), RequestVerifier(**options)))
+    return verifiers
+
+
+class RecaptchaVerificationMiddleware(RecaptchaRequestMiddleware):
+    """
+    Verifies the token posted with unsafe requests to the paths matching
+    RECAPTCHA_VERIFY_URLS before any view runs, and answers those failing
+    with RECAPTCHA_FAILURE_VIEW or a 403 response. Also does the work of
+    RecaptchaRequestMiddleware, which it replaces.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.verifiers = get_url_verifiers()
+
+    def get_verifier(self, request):
+        if request.method in SAFE_METHODS:
+            return None
+        for pattern, verifier in self.verifiers:
+            if pattern.search(request.path_info):
+                return verifier
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        verifier = self.get_verifier(request)
+        if verifier is not None:
+            try:
+                verifier.verify(request)
+            except ValidationError as error:
+                return get_failure_view()(request, error)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        verifier = self.get_verifier(request)
+        if verifier is not None:
+            try:
+                await verifier.averify(request)
+            except ValidationError as error:
+                return get_failure_view()(request, error)
+        return await super().__acall__(request)
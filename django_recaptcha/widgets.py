@@ -3,9 +3,141 @@ import warnings
 from urllib.parse import urlencode
 
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.forms import widgets
+from django.forms.renderers import get_default_renderer
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
 
-from django_recaptcha.constants import DEFAULT_RECAPTCHA_DOMAIN
+from django_recaptcha.constants import (
+    DEFAULT_RECAPTCHA_DOMAIN,
+    RECAPTCHA_STATIC_DOMAIN,
+)
+from django_recaptcha.middleware import get_current_request
+
+# Incremented whenever settings change, which invalidates the context and
+# markup widgets have cached.
+_settings_generation = 0
+
+
+@receiver(setting_changed)
+def invalidate_widget_caches(**kwargs):
+    global _settings_generation
+    _settings_generation += 1
+
+
+# The JavaScript templates the widget templates include, eagerly and lazily
+# loading api.js, and the markup they render after it, by widget template
+# name. With RECAPTCHA_FAST_RENDER the markup is rendered from these instead,
+# without the template engine, and the JavaScript is rendered once and
+# cached. Widgets with other templates are unaffected.
+FAST_RENDER_TEMPLATES = {
+    "django_recaptcha/widget_v2_checkbox.html": (
+        "django_recaptcha/includes/js_v2_checkbox.html",
+        "django_recaptcha/includes/js_v2_checkbox_lazy.html",
+        "<div\n    %(attrs)s\n>\n</div>",
+    ),
+    "django_recaptcha/widget_v2_invisible.html": (
+        "django_recaptcha/includes/js_v2_invisible.html",
+        "django_recaptcha/includes/js_v2_invisible_lazy.html",
+        "<div\n    %(attrs)s\n>\n</div>",
+    ),
+    "django_recaptcha/widget_v3.html": (
+        "django_recaptcha/includes/js_v3.html",
+        "django_recaptcha/includes/js_v3_lazy.html",
+        '<input\n    type="hidden"\n    name="%(name)s"\n    %(attrs)s\n>',
+    ),
+}
+
+
+def flatten_attrs(attrs):
+    # Renders attrs exactly like the attribute loop of the widget templates.
+    return "".join(
+        (
+            " %s" % conditional_escape(name)
+            if value is True
+            else ' %s="%s"' % (conditional_escape(name), conditional_escape(value))
+        )
+        for name, value in attrs.items()
+        if value is not False
+    )
+
+
+def uses_shared_loader():
+    return getattr(settings, "RECAPTCHA_SHARED_LOADER", False)
+
+
+def render_loader(request=None, api_params=None, renderer=None):
+    """
+    Returns the script loading api.js for all widgets on the page, or an
+    empty string if it was already rendered for request.
+
+    request -- the request being responded to, if known
+    api_params -- parameters appended to the api.js URL
+    renderer -- the form renderer to render the template with
+    """
+    if request is not None:
+        if getattr(request, "_recaptcha_loader_rendered", False):
+            return ""
+        request._recaptcha_loader_rendered = True
+    renderer = renderer or get_default_renderer()
+    return mark_safe(
+        renderer.render(
+            "django_recaptcha/includes/loader.html",
+            {
+                "api_params": urlencode(api_params or {}),
+                "recaptcha_domain": getattr(
+                    settings, "RECAPTCHA_DOMAIN", DEFAULT_RECAPTCHA_DOMAIN
+                ),
+            },
+        )
+    )
+
+
+def get_resource_hints(recaptcha_widgets=None):
+    """
+    Returns the (rel, url) resource hints for the hosts api.js is loaded
+    from, for recaptcha_widgets or, if None, for widgets loading it with the
+    page. Hosts are preconnected to if any widget loads api.js with the page,
+    and only looked up if all of them load it lazily.
+    """
+    if recaptcha_widgets is None:
+        lazy = False
+    elif not recaptcha_widgets:
+        return []
+    else:
+        lazy = all(widget.lazy for widget in recaptcha_widgets)
+    hints = []
+    for domain in (
+        getattr(settings, "RECAPTCHA_DOMAIN", DEFAULT_RECAPTCHA_DOMAIN),
+        RECAPTCHA_STATIC_DOMAIN,
+    ):
+        url = "https://%s" % domain
+        if not lazy:
+            hints.append(("preconnect", url))
+        # Also for browsers that do not support preconnect.
+        hints.append(("dns-prefetch", url))
+    return hints
+
+
+def render_resource_hints(recaptcha_widgets=None, renderer=None):
+    """
+    Returns the <link> tags hinting the browser to connect to the hosts
+    api.js is loaded from, see get_resource_hints().
+
+    recaptcha_widgets -- the widgets on the page, if known
+    renderer -- the form renderer to render the template with
+    """
+    hints = get_resource_hints(recaptcha_widgets)
+    if not hints:
+        return ""
+    renderer = renderer or get_default_renderer()
+    return mark_safe(
+        renderer.render(
+            "django_recaptcha/includes/resource_hints.html", {"hints": hints}
+        )
+    )
 
 
 class ReCaptchaBase(widgets.Widget):
@@ -14,14 +146,20 @@ class ReCaptchaBase(widgets.Widget):
 
     public_key -- String value: can optionally be passed to not make use of the
         project wide Google Site Key.
+    lazy -- Boolean value: load api.js only once the form holding the widget
+        is first interacted with, instead of with the page.
     """
 
     recaptcha_response_name = "g-recaptcha-response"
 
-    def __init__(self, api_params=None, *args, **kwargs):
+    def __init__(self, api_params=None, *args, lazy=False, **kwargs):
         super().__init__(*args, **kwargs)
         self.uuid = uuid.uuid4().hex
         self.api_params = api_params or {}
+        self.lazy = lazy
+        # Shared by the copies made of the widget for every form instance, so
+        # what one of them caches is used by all.
+        self._cache = {}
 
         self.attrs.setdefault("class", "g-recaptcha")
         if not "g-recaptcha" in self.attrs["class"]:
@@ -30,21 +168,99 @@ class ReCaptchaBase(widgets.Widget):
     def value_from_datadict(self, data, files, name):
         return data.get(self.recaptcha_response_name, None)
 
+    def get_static_key(self):
+        """
+        Returns what the static context depends on besides the widget's
+        uuid, compared to find out whether the cached one is still valid.
+        """
+        # api_params is copied, so that changes made to it later are noticed.
+        return (
+            _settings_generation,
+            self.attrs["data-sitekey"],
+            dict(self.api_params),
+            self.lazy,
+        )
+
+    def get_cached(self, name, compute):
+        key = self.get_static_key()
+        cached = self._cache.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, compute())
+            self._cache[name] = cached
+        return cached[1]
+
+    def get_static_context(self):
+        """
+        Returns the part of the template context that only depends on the
+        widget's configuration and settings. It is computed once and cached
+        until either changes.
+        """
+        return self.get_cached("context", self.compute_static_context)
+
+    def get_api_url(self, params=None):
+        """
+        Returns the URL of api.js with the widget's api_params, preceded by
+        params if given.
+        """
+        query = urlencode({**(params or {}), **self.api_params})
+        return "https://%s/recaptcha/api.js%s" % (
+            getattr(settings, "RECAPTCHA_DOMAIN", DEFAULT_RECAPTCHA_DOMAIN),
+            "?" + query if query else "",
+        )
+
+    def compute_static_context(self):
+        return {
+            "public_key": self.attrs["data-sitekey"],
+            "widget_uuid": self.uuid,
+            "api_params": urlencode(self.api_params),
+            "api_url": self.get_api_url(),
+            "lazy": self.lazy,
+            "recaptcha_domain": getattr(
+                settings, "RECAPTCHA_DOMAIN", DEFAULT_RECAPTCHA_DOMAIN
+            ),
+        }
+
+    def get_loader(self, renderer=None):
+        """
+        Returns the shared loader, unless it was already rendered for the
+        current request.
+        """
+        return render_loader(get_current_request(), self.api_params, renderer)
+
     def get_context(self, name, value, attrs):
         context = super().get_context(name, value, attrs)
-        params = urlencode(self.api_params)
-        context.update(
-            {
-                "public_key": self.attrs["data-sitekey"],
-                "widget_uuid": self.uuid,
-                "api_params": params,
-                "recaptcha_domain": getattr(
-                    settings, "RECAPTCHA_DOMAIN", DEFAULT_RECAPTCHA_DOMAIN
-                ),
-            }
-        )
+        context.update(self.get_static_context())
+        if uses_shared_loader():
+            context.update({"shared_loader": True, "loader": self.get_loader()})
         return context
 
+    def render_js(self, template_name, renderer=None):
+        """
+        Returns the rendered JavaScript template, which only depends on the
+        static context and is cached with it.
+        """
+        renderer = renderer or get_default_renderer()
+        return self.get_cached(
+            "js",
+            lambda: renderer.render(template_name, self.get_static_context()),
+        )
+
+    def render(self, name, value, attrs=None, renderer=None):
+        templates = FAST_RENDER_TEMPLATES.get(self.template_name)
+        if templates is None or not getattr(settings, "RECAPTCHA_FAST_RENDER", False):
+            return super().render(name, value, attrs, renderer)
+        js_template_name, lazy_js_template_name, element_format = templates
+        element = element_format % {
+            "name": conditional_escape(name),
+            "attrs": flatten_attrs(self.build_attrs(self.attrs, attrs)),
+        }
+        if uses_shared_loader():
+            loader = self.get_loader(renderer)
+            return mark_safe(loader + "\n" + element if loader else element)
+        if self.lazy:
+            js_template_name = lazy_js_template_name
+        return mark_safe(self.render_js(js_template_name, renderer) + "\n\n" + element)
+
     def build_attrs(self, base_attrs, extra_attrs=None):
         attrs = super().build_attrs(base_attrs, extra_attrs)
         attrs["data-widget-uuid"] = self.uuid
@@ -54,6 +270,9 @@ class ReCaptchaBase(widgets.Widget):
             "data-callback", "onSubmit_%s" % self.uuid
         )
         attrs["data-size"] = base_attrs.get("data-size", "normal")
+        if self.lazy and uses_shared_loader():
+            # The shared loader defers loading if every widget has this.
+            attrs["data-lazy"] = True
         return attrs
 
 
@@ -75,13 +294,34 @@ class ReCaptchaV2Invisible(ReCaptchaBase):
 
 
 class ReCaptchaV3(ReCaptchaBase):
+    """
+    Widget for reCAPTCHA V3, fetching a token when the form is submitted.
+
+    prefetch -- Boolean value: fetch a token ahead of time instead, and
+        refresh it every token_refresh_interval seconds before it expires,
+        so that submitting the form does not wait for one. Refreshes pause
+        while the page is hidden and stop after max_token_refreshes without
+        interaction with the form, until the next one.
+    """
+
     input_type = "hidden"
     template_name = "django_recaptcha/widget_v3.html"
+    # Tokens expire after two minutes.
+    token_refresh_interval = 90
+    # Refreshes made for an idle form, before the token is left to expire.
+    max_token_refreshes = 5
 
     def __init__(
-        self, api_params=None, action=None, required_score=None, *args, **kwargs
+        self,
+        api_params=None,
+        action=None,
+        required_score=None,
+        *args,
+        prefetch=False,
+        **kwargs,
     ):
         super().__init__(api_params=api_params, *args, **kwargs)
+        self.prefetch = prefetch
         self.required_score = required_score or getattr(
             settings, "RECAPTCHA_REQUIRED_SCORE", None
         )
@@ -101,12 +341,29 @@ class ReCaptchaV3(ReCaptchaBase):
 
     def build_attrs(self, base_attrs, extra_attrs=None):
         attrs = super().build_attrs(base_attrs, extra_attrs)
+        if uses_shared_loader():
+            # The shared loader reads these from the element.
+            if self.action:
+                attrs["data-action"] = self.action
+            if self.prefetch:
+                attrs["data-prefetch"] = self.get_token_refresh_ms()
+                attrs["data-prefetch-limit"] = self.max_token_refreshes
         return attrs
 
+    def get_token_refresh_ms(self):
+        return int(self.token_refresh_interval * 1000)
+
     def value_from_datadict(self, data, files, name):
         return data.get(name)
 
-    def get_context(self, name, value, attrs):
-        context = super().get_context(name, value, attrs)
-        context.update({"action": self.action})
+    def get_static_key(self):
+        return (self.action, self.prefetch) + super().get_static_key()
+
+    def compute_static_context(self):
+        context = super().compute_static_context()
+        context["action"] = self.action
+        context["prefetch"] = self.prefetch
+        context["token_refresh_ms"] = self.get_token_refresh_ms()
+        context["token_refresh_limit"] = self.max_token_refreshes
+        context["api_url"] = self.get_api_url({"render": self.attrs["data-sitekey"]})
         return context